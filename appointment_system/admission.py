@@ -0,0 +1,216 @@
+"""
+Admission control and load shedding
+Each worker admits at most ADMISSION_MAX_CONCURRENT requests at a time (by
+default the size of the database pool, so requests wait here instead of on a
+pool connection). Excess requests wait in a bounded queue per route class;
+a freed slot goes to queued writes first, then reads, then reports. Requests
+are shed early with 503 when their queue is full or their wait exceeds the
+class deadline.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+from metrics import Counter, Gauge, Histogram
+
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True').lower() == 'true'
+
+def _default_max_concurrent() -> int:
+    from database import engine
+    pool = engine.pool
+    size = getattr(pool, "size", lambda: 5)()
+    overflow = getattr(pool, "_max_overflow", 0)
+    return max(1, size + max(overflow, 0))
+
+# Paths that are never queued (probes, scrapes, static files)
+EXEMPT_PREFIXES = ("/health", "/metrics", "/static/", "/favicon.ico")
+
+# Expensive read-only pages that yield to everything else
+REPORT_PATHS = ("/admin/monthly-report", "/api/appointments/stats/summary")
+
+admission_requests_total = Counter(
+    "admission_requests_total", "Requests by route class and admission outcome",
+    ("route_class", "outcome")
+)
+admission_queue_wait_seconds = Histogram(
+    "admission_queue_wait_seconds", "Time requests waited for admission",
+    ("route_class",), buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+class RouteClass:
+    """Concurrency limit, queue bound and queue-wait deadline of one kind of request"""
+
+    def __init__(self, name: str, priority: int, limit: int, queue: int, deadline: float):
+        self.name = name
+        self.priority = priority  # lower is served first
+        self.limit = int(os.getenv(f"ADMISSION_{name.upper()}_LIMIT", str(limit)))
+        self.max_queue = int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", str(queue)))
+        self.deadline = float(os.getenv(f"ADMISSION_{name.upper()}_DEADLINE_MS", str(deadline * 1000))) / 1000
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+class AdmissionController:
+    """Per-process slots shared by all route classes, handed out by priority"""
+
+    def __init__(self, max_concurrent: Optional[int] = None):
+        self.max_concurrent = max_concurrent or int(os.getenv('ADMISSION_MAX_CONCURRENT', str(_default_max_concurrent())))
+        # Reads may not take the last few slots, so booking writes always get through
+        write_reserve = int(os.getenv('ADMISSION_WRITE_RESERVE', '2'))
+        self.classes: Dict[str, RouteClass] = {
+            "write": RouteClass("write", 0, self.max_concurrent, queue=100, deadline=5.0),
+            "read": RouteClass("read", 1, max(1, self.max_concurrent - write_reserve), queue=200, deadline=2.0),
+            "report": RouteClass("report", 2, 2, queue=10, deadline=1.0),
+        }
+        self._by_priority = sorted(self.classes.values(), key=lambda route_class: route_class.priority)
+        self.in_flight = 0
+
+    def _has_room(self, route_class: RouteClass) -> bool:
+        return self.in_flight < self.max_concurrent and route_class.in_flight < route_class.limit
+
+    def _take(self, route_class: RouteClass):
+        self.in_flight += 1
+        route_class.in_flight += 1
+
+    def _dispatch(self):
+        """Hand free slots to the oldest waiters of the most important classes"""
+        for route_class in self._by_priority:
+            while route_class.waiters and self._has_room(route_class):
+                waiter = route_class.waiters.popleft()
+                if not waiter.done():
+                    self._take(route_class)
+                    waiter.set_result(True)
+
+    def _can_admit_now(self, route_class: RouteClass) -> bool:
+        # Never overtake a waiter of the same or a more important class
+        for other in self._by_priority:
+            if other.priority > route_class.priority:
+                break
+            if other.waiters:
+                return False
+        return self._has_room(route_class)
+
+    async def acquire(self, route_class: RouteClass) -> Optional[str]:
+        """Wait for a slot; returns None when admitted, else the reason for shedding"""
+        if self._can_admit_now(route_class):
+            self._take(route_class)
+            admission_requests_total.inc(route_class=route_class.name, outcome="admitted")
+            return None
+
+        if len(route_class.waiters) >= route_class.max_queue:
+            admission_requests_total.inc(route_class=route_class.name, outcome="queue_full")
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), route_class.deadline)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted just as the deadline passed; keep the slot
+                pass
+            else:
+                waiter.cancel()
+                route_class.waiters.remove(waiter)
+                # Lower-priority waiters may have been held back only by this one
+                self._dispatch()
+                admission_queue_wait_seconds.observe(time.perf_counter() - started, route_class=route_class.name)
+                admission_requests_total.inc(route_class=route_class.name, outcome="deadline")
+                return "deadline"
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if waiter.done():
+                self.release(route_class)
+            else:
+                waiter.cancel()
+                route_class.waiters.remove(waiter)
+                self._dispatch()
+            raise
+
+        admission_queue_wait_seconds.observe(time.perf_counter() - started, route_class=route_class.name)
+        admission_requests_total.inc(route_class=route_class.name, outcome="queued")
+        return None
+
+    def release(self, route_class: RouteClass):
+        self.in_flight -= 1
+        route_class.in_flight -= 1
+        self._dispatch()
+
+    def classify(self, scope: Scope) -> Optional[RouteClass]:
+        path = scope["path"]
+        if path.startswith(EXEMPT_PREFIXES):
+            return None
+        if path in REPORT_PATHS:
+            return self.classes["report"]
+        if scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return self.classes["read"]
+        return self.classes["write"]
+
+    def in_flight_by_class(self) -> Dict[tuple, float]:
+        return {(name,): route_class.in_flight for name, route_class in self.classes.items()}
+
+    def queued_by_class(self) -> Dict[tuple, float]:
+        return {(name,): len(route_class.waiters) for name, route_class in self.classes.items()}
+
+_controller: Optional[AdmissionController] = None
+
+def get_controller() -> AdmissionController:
+    """Get the process-wide admission controller"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+admission_in_flight = Gauge(
+    "admission_in_flight", "Admitted requests being served, by route class", ("route_class",),
+    callback=lambda: get_controller().in_flight_by_class()
+)
+admission_queued = Gauge(
+    "admission_queued", "Requests waiting for admission, by route class", ("route_class",),
+    callback=lambda: get_controller().queued_by_class()
+)
+
+async def _send_overloaded(send: Send, reason: str, retry_after: int):
+    body = json.dumps({"detail": "Server is busy, please retry shortly", "reason": reason}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(retry_after).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """Queue or shed requests before they reach the app"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not ADMISSION_CONTROL_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        controller = get_controller()
+        route_class = controller.classify(scope)
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        rejected = await controller.acquire(route_class)
+        if rejected:
+            await _send_overloaded(send, rejected, max(1, math.ceil(route_class.deadline)))
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(route_class)
@@ -1,10 +1,18 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, select, union_all
+from sqlalchemy.orm import aliased
 from datetime import date, time, datetime, timedelta
 from typing import List
-from models import Appointment, DoctorProfile, User, DoctorTimeslot, AppointmentStatus
+from models import Appointment, AppointmentArchive, DoctorProfile, User, DoctorTimeslot, AppointmentStatus
 from schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse
 from fastapi import HTTPException
+from serialization import rows_to_dicts
+from outbox import record_event
+from cache_utils import LRUCache
+from cache_bus import track
+
+# doctor profile id -> [(start_time, end_time)] of available slots; timeslot writers publish changes
+doctor_timeslot_cache = track(LRUCache("doctor_timeslots", maxsize=10000))
 
 class AppointmentService:
     @staticmethod
@@ -53,6 +61,8 @@ class AppointmentService:
         )
 
         db.add(db_appointment)
+        db.flush()
+        record_event(db, db_appointment, "created")
         db.commit()
         db.refresh(db_appointment)
 
@@ -64,23 +74,33 @@ class AppointmentService:
         Check if doctor has available time slots for the requested time
         """
         # Get doctor's available time slots
-        timeslots = db.query(DoctorTimeslot).filter(
-            and_(
-                DoctorTimeslot.doctor_id == doctor_id,
-                DoctorTimeslot.is_available == True
-            )
-        ).all()
+        timeslots = AppointmentService._available_timeslots(db, doctor_id)
 
         # Convert appointment time to string for comparison
         appointment_time_str = appointment_time.strftime("%H:%M")
 
         # Check if appointment time falls within any available slot
-        for slot in timeslots:
-            if slot.start_time <= appointment_time_str < slot.end_time:
+        for start_time, end_time in timeslots:
+            if start_time <= appointment_time_str < end_time:
                 return True
 
         return False
 
+    @staticmethod
+    def _available_timeslots(db: Session, doctor_id: int) -> List[tuple]:
+        """(start_time, end_time) of the doctor's available slots, cached per doctor"""
+        timeslots = doctor_timeslot_cache.get(doctor_id)
+        if timeslots is None:
+            generation = doctor_timeslot_cache.generation
+            timeslots = [tuple(row) for row in db.query(DoctorTimeslot.start_time, DoctorTimeslot.end_time).filter(
+                and_(
+                    DoctorTimeslot.doctor_id == doctor_id,
+                    DoctorTimeslot.is_available == True
+                )
+            ).all()]
+            doctor_timeslot_cache.set(doctor_id, timeslots, generation)
+        return timeslots
+
     @staticmethod
     def _has_conflicting_appointment(db: Session, doctor_id: int, appointment_date: date, appointment_time: time) -> bool:
         """
@@ -98,17 +118,40 @@ class AppointmentService:
         return existing_appointment is not None
 
     @staticmethod
-    def get_appointment_by_id(db: Session, appointment_id: int, user_id: int = None) -> AppointmentResponse:
+    def _appointment_source(history: bool = False):
         """
-        Get appointment by ID with related information
+        Appointment, or with history the live and archived appointments together
+        Without history only the live partitions are read
         """
-        from sqlalchemy.orm import aliased
+        if not history:
+            return Appointment
 
+        columns = [column.name for column in Appointment.__table__.columns]
+        combined = union_all(
+            select(*[Appointment.__table__.c[name] for name in columns]),
+            select(*[AppointmentArchive.__table__.c[name] for name in columns])
+        ).subquery("appointments_history")
+        return aliased(Appointment, combined, adapt_on_names=True)
+
+    @staticmethod
+    def _appointment_rows_query(db: Session, Appointment=Appointment):
+        """
+        Column-level query for appointment responses
+        Rows map 1:1 onto AppointmentResponse fields, so no ORM objects are built
+        """
         PatientUser = aliased(User)
         DoctorUser = aliased(User)
 
-        query = db.query(
-            Appointment,
+        return db.query(
+            Appointment.id,
+            Appointment.patient_id,
+            Appointment.doctor_id,
+            Appointment.appointment_date,
+            Appointment.appointment_time,
+            Appointment.notes,
+            Appointment.status,
+            Appointment.created_at,
+            Appointment.updated_at,
             PatientUser.full_name.label('patient_name'),
             PatientUser.email.label('patient_email'),
             PatientUser.mobile_number.label('patient_mobile'),
@@ -121,7 +164,15 @@ class AppointmentService:
             DoctorProfile, Appointment.doctor_id == DoctorProfile.id
         ).join(
             DoctorUser, DoctorProfile.user_id == DoctorUser.id
-        ).filter(
+        )
+
+    @staticmethod
+    def get_appointment_row(db: Session, appointment_id: int, user_id: int = None, history: bool = False) -> dict:
+        """
+        Get appointment by ID with related information, as a plain dict
+        """
+        Appointment = AppointmentService._appointment_source(history)
+        query = AppointmentService._appointment_rows_query(db, Appointment).filter(
             Appointment.id == appointment_id
         )
 
@@ -136,28 +187,19 @@ class AppointmentService:
         if not result:
             raise HTTPException(status_code=404, detail="Appointment not found")
 
-        appointment, patient_name, patient_email, patient_mobile, doctor_name, doctor_license, consultation_fee = result
-
-        return AppointmentResponse(
-            id=appointment.id,
-            patient_id=appointment.patient_id,
-            doctor_id=appointment.doctor_id,
-            appointment_date=appointment.appointment_date,
-            appointment_time=appointment.appointment_time,
-            notes=appointment.notes,
-            status=appointment.status,
-            created_at=appointment.created_at,
-            updated_at=appointment.updated_at,
-            patient_name=patient_name,
-            patient_email=patient_email,
-            patient_mobile=patient_mobile,
-            doctor_name=doctor_name,
-            doctor_license=doctor_license,
-            consultation_fee=consultation_fee
-        )
+        return dict(result._mapping)
 
     @staticmethod
-    def get_appointments(
+    def get_appointment_by_id(db: Session, appointment_id: int, user_id: int = None) -> AppointmentResponse:
+        """
+        Get appointment by ID with related information
+        """
+        row = AppointmentService.get_appointment_row(db, appointment_id, user_id)
+        # Rows come straight from the database, so skip re-validation
+        return AppointmentResponse.model_construct(**row)
+
+    @staticmethod
+    def get_appointment_rows(
         db: Session,
         skip: int = 0,
         limit: int = 100,
@@ -165,31 +207,15 @@ class AppointmentService:
         doctor_user_id: int = None,
         status: AppointmentStatus = None,
         date_from: date = None,
-        date_to: date = None
-    ) -> List[AppointmentResponse]:
+        date_to: date = None,
+        history: bool = False
+    ) -> List[dict]:
         """
-        Get appointments with filtering options
+        Get appointments with filtering options, as plain dicts
+        Archived appointments are included only with history
         """
-        from sqlalchemy.orm import aliased
-
-        PatientUser = aliased(User)
-        DoctorUser = aliased(User)
-
-        query = db.query(
-            Appointment,
-            PatientUser.full_name.label('patient_name'),
-            PatientUser.email.label('patient_email'),
-            PatientUser.mobile_number.label('patient_mobile'),
-            DoctorUser.full_name.label('doctor_name'),
-            DoctorProfile.license_number.label('doctor_license'),
-            DoctorProfile.consultation_fee.label('consultation_fee')
-        ).join(
-            PatientUser, Appointment.patient_id == PatientUser.id
-        ).join(
-            DoctorProfile, Appointment.doctor_id == DoctorProfile.id
-        ).join(
-            DoctorUser, DoctorProfile.user_id == DoctorUser.id
-        )
+        Appointment = AppointmentService._appointment_source(history)
+        query = AppointmentService._appointment_rows_query(db, Appointment)
 
         # Apply filters
         if patient_id:
@@ -210,30 +236,27 @@ class AppointmentService:
         # Order by appointment date and time
         query = query.order_by(Appointment.appointment_date, Appointment.appointment_time)
 
-        results = query.offset(skip).limit(limit).all()
-
-        appointments = []
-        for result in results:
-            appointment, patient_name, patient_email, patient_mobile, doctor_name, doctor_license, consultation_fee = result
-            appointments.append(AppointmentResponse(
-                id=appointment.id,
-                patient_id=appointment.patient_id,
-                doctor_id=appointment.doctor_id,
-                appointment_date=appointment.appointment_date,
-                appointment_time=appointment.appointment_time,
-                notes=appointment.notes,
-                status=appointment.status,
-                created_at=appointment.created_at,
-                updated_at=appointment.updated_at,
-                patient_name=patient_name,
-                patient_email=patient_email,
-                patient_mobile=patient_mobile,
-                doctor_name=doctor_name,
-                doctor_license=doctor_license,
-                consultation_fee=consultation_fee
-            ))
-
-        return appointments
+        return rows_to_dicts(query.offset(skip).limit(limit).all())
+
+    @staticmethod
+    def get_appointments(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        patient_id: int = None,
+        doctor_user_id: int = None,
+        status: AppointmentStatus = None,
+        date_from: date = None,
+        date_to: date = None
+    ) -> List[AppointmentResponse]:
+        """
+        Get appointments with filtering options
+        """
+        rows = AppointmentService.get_appointment_rows(
+            db, skip, limit, patient_id, doctor_user_id, status, date_from, date_to
+        )
+        # Rows come straight from the database, so skip re-validation
+        return [AppointmentResponse.model_construct(**row) for row in rows]
 
     @staticmethod
     def update_appointment(
@@ -277,14 +300,18 @@ class AppointmentService:
             appointment.appointment_time = appointment_data.appointment_time
         if appointment_data.notes is not None:
             appointment.notes = appointment_data.notes
+        event_type = "updated"
         if appointment_data.status is not None:
             # Only doctors can change status to CONFIRMED/COMPLETED, patients can only CANCEL
             if is_doctor or (is_patient and appointment_data.status == AppointmentStatus.CANCELLED):
+                if appointment_data.status != appointment.status and appointment_data.status != AppointmentStatus.PENDING:
+                    event_type = appointment_data.status.value.lower()
                 appointment.status = appointment_data.status
             else:
                 raise HTTPException(status_code=403, detail="Not authorized to change appointment status")
 
         appointment.updated_at = datetime.now()
+        record_event(db, appointment, event_type)
         db.commit()
         db.refresh(appointment)
 
@@ -312,6 +339,7 @@ class AppointmentService:
 
         appointment.status = AppointmentStatus.CANCELLED
         appointment.updated_at = datetime.now()
+        record_event(db, appointment, "cancelled")
         db.commit()
         db.refresh(appointment)
 
@@ -323,12 +351,7 @@ class AppointmentService:
         Get available time slots for a doctor on a specific date
         """
         # Get doctor's available time slots
-        timeslots = db.query(DoctorTimeslot).filter(
-            and_(
-                DoctorTimeslot.doctor_id == doctor_id,
-                DoctorTimeslot.is_available == True
-            )
-        ).all()
+        timeslots = AppointmentService._available_timeslots(db, doctor_id)
 
         # Get existing appointments for that date
         booked_times = db.query(Appointment.appointment_time).filter(
@@ -342,10 +365,10 @@ class AppointmentService:
         booked_time_strings = {time.strftime("%H:%M") for time, in booked_times}
 
         available_slots = []
-        for slot in timeslots:
+        for start_time, end_time in timeslots:
             # Generate 30-minute slots within each time range
-            start_hour, start_minute = map(int, slot.start_time.split(':'))
-            end_hour, end_minute = map(int, slot.end_time.split(':'))
+            start_hour, start_minute = map(int, start_time.split(':'))
+            end_hour, end_minute = map(int, end_time.split(':'))
 
             current_time = datetime.combine(appointment_date, time(start_hour, start_minute))
             end_time = datetime.combine(appointment_date, time(end_hour, end_minute))
@@ -0,0 +1,210 @@
+"""
+Static asset pipeline: minified, content-hashed and precompressed JS/CSS
+Run `python assets.py` at build time; the app also builds on startup when
+the manifest is missing or older than the sources
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import stat
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import anyio
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+STATIC_DIR = Path(__file__).parent / "static"
+STATIC_URL = "/static"
+
+# Fingerprinted files live under static/build/ and are safe to cache forever
+BUILD_PREFIX = "build/"
+BUILD_DIR = STATIC_DIR / "build"
+MANIFEST_PATH = BUILD_DIR / "manifest.json"
+
+# Source directories (relative to static/) that go through the pipeline
+ASSET_DIRS = ("css", "js")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Content-Encoding -> suffix of the precompressed file, in order of preference
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Dynamic compression of API/HTML responses; static files and images are skipped
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1000'))
+UNCOMPRESSED_PATH_MARKERS = (f"{STATIC_URL}/", "/profile-image")
+
+_manifest: Dict[str, str] = {}
+
+def minify(source: str, suffix: str) -> str:
+    """Minify JS/CSS when rjsmin/rcssmin are installed, otherwise return the source unchanged"""
+    if suffix == ".js" and rjsmin is not None:
+        return rjsmin.jsmin(source)
+    if suffix == ".css" and rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+def fingerprinted_name(path: str, content: bytes) -> str:
+    """css/style.css -> build/css/style.<hash>.css"""
+    stem, suffix = os.path.splitext(path)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{BUILD_PREFIX}{stem}.{digest}{suffix}"
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Several workers may build at once; readers must never see partial files
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+def _source_files():
+    for directory in ASSET_DIRS:
+        for path in sorted((STATIC_DIR / directory).rglob("*")):
+            if path.is_file() and path.suffix in (".js", ".css"):
+                yield path
+
+def build_assets() -> Dict[str, str]:
+    """
+    Minify, fingerprint and precompress every asset, then write the manifest
+    Returns the manifest (source path -> fingerprinted path, relative to static/)
+    """
+    manifest = {}
+    for source in _source_files():
+        relative = source.relative_to(STATIC_DIR).as_posix()
+        content = minify(source.read_text(encoding="utf-8"), source.suffix).encode("utf-8")
+        name = fingerprinted_name(relative, content)
+        target = STATIC_DIR / name
+
+        if not target.is_file():
+            _write_atomic(target, content)
+            _write_atomic(target.with_name(target.name + ".gz"), gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target.with_name(target.name + ".br"), brotli.compress(content, quality=11))
+
+        manifest[relative] = name
+
+    _write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return manifest
+
+def _manifest_is_stale() -> bool:
+    if not MANIFEST_PATH.is_file():
+        return True
+    built_at = MANIFEST_PATH.stat().st_mtime
+    return any(source.stat().st_mtime > built_at for source in _source_files())
+
+def load_assets(rebuild_if_stale: bool = True) -> Dict[str, str]:
+    """Load the asset manifest (called on startup), building it first if needed"""
+    global _manifest
+    if rebuild_if_stale and _manifest_is_stale():
+        _manifest = build_assets()
+        print(f"Built {len(_manifest)} static assets")
+    else:
+        _manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    return _manifest
+
+def asset_url(path: str) -> str:
+    """
+    URL of a static asset, e.g. asset_url('css/style.css')
+    Falls back to the unprocessed file when the asset is not in the manifest
+    """
+    return f"{STATIC_URL}/{_manifest.get(path, path)}"
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Parse an Accept-Encoding header into the set of acceptable codings"""
+    encodings = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+class AssetStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves fingerprinted assets with year-long immutable caching
+    and picks a precompressed (.br/.gz) variant based on Accept-Encoding
+    """
+
+    async def _lookup_precompressed(self, path: str, scope: Scope) -> Optional[Tuple[str, str, os.stat_result]]:
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                return encoding, full_path, stat_result
+        return None
+
+    async def get_response(self, path: str, scope: Scope):
+        if not path.startswith(BUILD_PREFIX):
+            return await super().get_response(path, scope)
+
+        precompressed = await self._lookup_precompressed(path, scope)
+        if precompressed is None:
+            response = await super().get_response(path, scope)
+        else:
+            encoding, full_path, stat_result = precompressed
+            response = self.file_response(full_path, stat_result, scope)
+            # The content type comes from the original name, not the .br/.gz suffix
+            response.headers["content-type"] = self._media_type(path)
+            if response.status_code != 304:
+                response.headers["content-encoding"] = encoding
+
+        if response.status_code in (200, 304):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            response.headers.add_vary_header("Accept-Encoding")
+        return response
+
+    @staticmethod
+    def _media_type(path: str) -> str:
+        if path.endswith(".css"):
+            return "text/css; charset=utf-8"
+        if path.endswith(".js"):
+            return "text/javascript; charset=utf-8"
+        return "application/octet-stream"
+
+class CompressionMiddleware:
+    """
+    Gzip negotiated by Accept-Encoding for API and page responses
+    Static files (already precompressed) and images (already compressed) pass through
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=6)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and not any(marker in scope["path"] for marker in UNCOMPRESSED_PATH_MARKERS):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+if __name__ == "__main__":
+    built = build_assets()
+    for source, target in built.items():
+        print(f"{source} -> {target}")
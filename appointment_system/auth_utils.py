@@ -4,11 +4,13 @@ Utility functions for user registration and authentication
 
 import base64
 import hashlib
+import os
 import secrets
 from typing import Tuple, Optional, Dict, Any
-from PIL import Image
-import io
 from datetime import datetime, timedelta
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from cache_utils import LRUCache
+from cache_bus import publish, track
 
 try:
     import jwt
@@ -33,6 +35,11 @@ SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# jti -> revoked?, so authenticated requests skip the blacklist query; logout publishes the change
+token_revocation_cache = track(LRUCache(
+    "token_revocations", maxsize=100000, ttl=float(os.getenv('TOKEN_REVOCATION_CACHE_TTL', '300'))
+))
+
 def hash_password(password: str) -> str:
     """
     Hash a password using a salt and SHA-256
@@ -58,54 +65,21 @@ def verify_password(password: str, hashed_password: str) -> bool:
 
 def process_profile_image(base64_image: str, filename: str) -> Tuple[str, str]:
     """
-    Process and validate profile image, save to static directory
+    Process and validate profile image, save all size variants to static directory
+    Decoding and resizing run in the image process pool (see image_utils)
     Returns: (saved_filename, content_type)
     """
-    import uuid
-    import os
-    from pathlib import Path
+    from image_utils import store_profile_image, MAX_IMAGE_BYTES
 
     # Decode base64 image
     image_data = base64.b64decode(base64_image)
 
     # Check file size (max 5MB)
-    if len(image_data) > 5 * 1024 * 1024:
+    if len(image_data) > MAX_IMAGE_BYTES:
         raise ValueError("Image size must be less than 5MB")
 
-    # Validate image format and get content type
     try:
-        image = Image.open(io.BytesIO(image_data))
-
-        # Check if it's JPEG or PNG
-        if image.format not in ['JPEG', 'PNG']:
-            raise ValueError("Image must be JPEG or PNG format")
-
-        # Determine content type
-        content_type = f"image/{image.format.lower()}"
-        if content_type == "image/jpeg":
-            content_type = "image/jpeg"
-
-        # Resize image if too large (optional: resize to max 800x800)
-        max_size = (800, 800)
-        if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-        # Generate unique filename to prevent conflicts
-        file_extension = ".jpg" if image.format == "JPEG" else ".png"
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-
-        # Get the directory of the current file and construct path to static/profiles
-        current_dir = Path(__file__).parent
-        profiles_dir = current_dir / "static" / "profiles"
-        profiles_dir.mkdir(parents=True, exist_ok=True)
-
-        file_path = profiles_dir / unique_filename
-
-        # Save image to file
-        image.save(file_path, format=image.format)
-
-        return unique_filename, content_type
-
+        return store_profile_image(image_data)
     except Exception as e:
         raise ValueError(f"Invalid image format: {str(e)}")
 
@@ -183,8 +157,13 @@ def is_token_blacklisted(jti: str, db) -> bool:
     Check if a token is blacklisted
     """
     from models import TokenBlacklist
-    blacklisted_token = db.query(TokenBlacklist).filter(TokenBlacklist.token_jti == jti).first()
-    return blacklisted_token is not None
+    revoked = token_revocation_cache.get(jti)
+    if revoked is None:
+        # A logout committed while we read would evict before our fill lands; the generation check drops it
+        generation = token_revocation_cache.generation
+        revoked = db.query(TokenBlacklist.id).filter(TokenBlacklist.token_jti == jti).first() is not None
+        token_revocation_cache.set(jti, revoked, generation)
+    return revoked
 
 def blacklist_token(token: str, user_id: int, db) -> bool:
     """
@@ -213,9 +192,12 @@ def blacklist_token(token: str, user_id: int, db) -> bool:
         )
 
         db.add(blacklist_entry)
+        publish(db, "token_revocations", jti)
         db.commit()
         return True
 
+    except PoolTimeoutError:
+        raise
     except Exception:
         db.rollback()
         return False
@@ -0,0 +1,135 @@
+"""
+Per-row serialization cost of list endpoints, before and after the fast path
+
+Before: build response models field by field, then let FastAPI validate them
+against response_model and encode with the stdlib JSON encoder.
+After: plain dict rows rendered by FastJSONResponse (orjson), and ORM users
+validated and dumped to JSON inside pydantic-core.
+
+Usage (from appointment_system/):
+    python -m benchmarks.bench_serialization --rows 1000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+
+import models
+from schemas import AppointmentResponse, NotificationResponse, User as UserSchema
+from serialization import FastJSONResponse, orm_list_response
+
+def appointment_rows(count: int) -> List[dict]:
+    created = datetime(2025, 1, 1, 9, 30, tzinfo=timezone.utc)
+    return [{
+        "id": i,
+        "patient_id": 1000 + i,
+        "doctor_id": i % 50,
+        "appointment_date": date(2025, 1, 1) + timedelta(days=i % 365),
+        "appointment_time": dt_time(9 + i % 8, 30 * (i % 2)),
+        "notes": "Headache and mild fever for two days",
+        "status": models.AppointmentStatus.PENDING,
+        "created_at": created,
+        "updated_at": None,
+        "patient_name": f"Patient {i}",
+        "patient_email": f"patient{i}@example.com",
+        "patient_mobile": f"+880170000{i:04d}",
+        "doctor_name": f"Doctor {i % 50}",
+        "doctor_license": f"DOC-20250101-{i % 50:06X}",
+        "consultation_fee": 500.0,
+    } for i in range(count)]
+
+def notification_rows(count: int) -> List[dict]:
+    created = datetime(2025, 1, 1, 9, 30, tzinfo=timezone.utc)
+    return [{
+        "id": i,
+        "user_id": 1,
+        "is_read": True,
+        "created_at": created,
+        "user_name": "Patient 1",
+        "user_email": "patient1@example.com",
+    } for i in range(count)]
+
+def doctor_users(count: int) -> List[models.User]:
+    """Transient ORM objects shaped like the /api/doctors/ result"""
+    division = models.Division(id=1, name="Dhaka")
+    district = models.District(id=1, name="Dhaka", division_id=1)
+    thana = models.Thana(id=1, name="Dhanmondi", district_id=1)
+    users = []
+    for i in range(count):
+        profile = models.DoctorProfile(
+            id=i, user_id=i, license_number=f"DOC-{i:06d}", experience_years=i % 30, consultation_fee=500.0
+        )
+        profile.available_timeslots = [
+            models.DoctorTimeslot(id=i * 2, doctor_id=i, start_time="10:00", end_time="12:00", is_available=True),
+            models.DoctorTimeslot(id=i * 2 + 1, doctor_id=i, start_time="16:00", end_time="18:00", is_available=True),
+        ]
+        user = models.User(
+            id=i, full_name=f"Doctor {i}", email=f"doctor{i}@example.com", mobile_number=f"+880170000{i:04d}",
+            user_type=models.UserType.DOCTOR, division_id=1, district_id=1, thana_id=1,
+            created_at=datetime(2025, 1, 1, tzinfo=timezone.utc)
+        )
+        user.division, user.district, user.thana, user.doctor_profile = division, district, thana, profile
+        users.append(user)
+    return users
+
+def fastapi_response(field, content) -> bytes:
+    """What FastAPI does with a handler result when response_model is set"""
+    serialized = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(serialized).body
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    appointment_field = create_model_field("Response", List[AppointmentResponse], mode="serialization")
+    notification_field = create_model_field("Response", List[NotificationResponse], mode="serialization")
+    user_field = create_model_field("Response", List[UserSchema], mode="serialization")
+    user_adapter = TypeAdapter(List[UserSchema])
+
+    appointments = appointment_rows(args.rows)
+    notifications = notification_rows(args.rows)
+    doctors = doctor_users(args.rows)
+
+    cases = [
+        (
+            "appointments",
+            lambda: fastapi_response(appointment_field, [AppointmentResponse(**row) for row in appointments]),
+            lambda: FastJSONResponse(appointments).body,
+        ),
+        (
+            "notifications",
+            lambda: fastapi_response(notification_field, [NotificationResponse(**row) for row in notifications]),
+            lambda: FastJSONResponse(notifications).body,
+        ),
+        (
+            "doctors",
+            lambda: fastapi_response(user_field, doctors),
+            lambda: orm_list_response(user_adapter, doctors).body,
+        ),
+    ]
+
+    print(f"{'endpoint':<15}{'before us/row':>15}{'after us/row':>15}{'speedup':>10}")
+    for name, before, after in cases:
+        before_time = best_of(args.repeat, before) / args.rows * 1e6
+        after_time = best_of(args.repeat, after) / args.rows * 1e6
+        print(f"{name:<15}{before_time:>15.2f}{after_time:>15.2f}{before_time / after_time:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Throughput scaling across gunicorn worker counts
+
+For each worker count, starts `gunicorn -c gunicorn_conf.py main:app` with
+WEB_CONCURRENCY set, waits for /health/ready, and drives it for --duration
+seconds with --clients load generator processes (processes, not threads, so the
+client is not limited by one GIL). Reports requests/s per worker count and the
+scaling efficiency: throughput(n) / (n * throughput(1)).
+
+The load generator needs CPU too: run it where the server's cores are not shared
+with the clients (or give it at least as many spare cores as --clients), and
+pick a path that is CPU-bound in the app rather than in the database.
+
+Usage (from appointment_system/):
+    python -m benchmarks.worker_scaling --workers 1 2 4 --clients 16 --duration 20
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from gunicorn_conf import available_cpus
+
+def _client(base_url: str, path: str, deadline: float) -> tuple:
+    session = requests.Session()
+    completed = errors = 0
+    while time.time() < deadline:
+        try:
+            response = session.get(f"{base_url}{path}", timeout=10)
+            if response.status_code == 200:
+                completed += 1
+            else:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+    return completed, errors
+
+def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float):
+    started = time.time()
+    while time.time() - started < timeout:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with code {server.returncode}")
+        try:
+            if requests.get(f"{base_url}/health/ready", timeout=1).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"Server not ready after {timeout}s")
+
+def measure(workers: int, args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(args.port), ACCESS_LOG="", LOG_LEVEL="warning")
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"], env=env)
+    try:
+        _wait_ready(base_url, server, args.timeout)
+        # Every worker must have booted before timing starts
+        time.sleep(args.warmup)
+
+        deadline = time.time() + args.duration
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(_client, [(base_url, args.path, deadline)] * args.clients)
+        completed = sum(result[0] for result in results)
+        errors = sum(result[1] for result in results)
+        return {
+            "workers": workers,
+            "requests_per_second": round(completed / args.duration, 1),
+            "errors": errors,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", help="worker counts to compare (default: 1, 2, 4 ... CPUs)")
+    parser.add_argument("--clients", type=int, default=16, help="load generator processes")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--path", default="/api/locations/divisions")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    worker_counts = args.workers
+    if not worker_counts:
+        cpus = available_cpus()
+        worker_counts = sorted({1, cpus} | {2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus})
+
+    runs = []
+    print(f"{'workers':>8}{'req/s':>12}{'efficiency':>12}{'errors':>8}")
+    for workers in worker_counts:
+        run = measure(workers, args)
+        baseline = runs[0]["requests_per_second"] / runs[0]["workers"] if runs else run["requests_per_second"] / workers
+        run["efficiency"] = round(run["requests_per_second"] / (workers * baseline), 2) if baseline else 0.0
+        runs.append(run)
+        print(f"{workers:>8}{run['requests_per_second']:>12.1f}{run['efficiency']:>12.2f}{run['errors']:>8}")
+
+    report = {"path": args.path, "clients": args.clients, "duration_s": args.duration, "cpus": available_cpus(), "runs": runs}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Blob storage backends for uploaded files (profile images)
+Select the backend with BLOB_STORAGE_BACKEND=local (default) or s3
+"""
+
+import asyncio
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+class BlobStorage:
+    """
+    Base class for blob storage backends
+    Writes during request processing are synchronous (they run in the threadpool);
+    reads are async streams so responses never block the event loop
+    """
+
+    def write(self, key: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def iter_chunks(self, key: str) -> Iterator[bytes]:
+        """Blocking chunked read, raises FileNotFoundError for missing keys"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of a blob, if the backend keeps files on local disk"""
+        return None
+
+    async def open_stream(self, key: str) -> AsyncIterator[bytes]:
+        """
+        Open a blob as an async stream of chunks
+        Missing keys raise FileNotFoundError here, before any bytes are sent
+        """
+        iterator = await asyncio.to_thread(self.iter_chunks, key)
+        return self._drain(iterator)
+
+    @staticmethod
+    async def _drain(iterator: Iterator[bytes]) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, None)
+            if chunk is None:
+                break
+            yield chunk
+
+    async def read(self, key: str) -> bytes:
+        """Read a whole blob into memory"""
+        stream = await self.open_stream(key)
+        return b"".join([chunk async for chunk in stream])
+
+class LocalBlobStorage(BlobStorage):
+    """Stores blobs as files under a local directory"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    def write(self, key: str, data: bytes, content_type: str):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see partial files; its name
+        # is unique per call, as threads of one process may write the same key at once
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def iter_chunks(self, key: str) -> Iterator[bytes]:
+        handle = open(self._path(key), "rb")
+
+        def chunks():
+            with handle:
+                while True:
+                    chunk = handle.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return chunks()
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+class S3BlobStorage(BlobStorage):
+    """
+    Stores blobs in an S3-compatible bucket (AWS S3, MinIO, ...)
+    Requires boto3; credentials come from the usual AWS_* environment variables
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("The s3 blob storage backend requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def write(self, key: str, data: bytes, content_type: str):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data, ContentType=content_type)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            # Anything but a missing key (403, throttling, ...) must not look like "render it again"
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def iter_chunks(self, key: str) -> Iterator[bytes]:
+        from botocore.exceptions import ClientError
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            raise FileNotFoundError(key) from e
+        return response["Body"].iter_chunks(CHUNK_SIZE)
+
+def create_storage() -> BlobStorage:
+    """Build the storage backend configured by environment variables"""
+    backend = os.getenv('BLOB_STORAGE_BACKEND', 'local')
+
+    if backend == "local":
+        root = os.getenv('BLOB_STORAGE_ROOT', str(Path(__file__).parent / "static"))
+        return LocalBlobStorage(Path(root))
+
+    if backend == "s3":
+        bucket = os.getenv('S3_BUCKET')
+        if not bucket:
+            raise RuntimeError("S3_BUCKET must be set for the s3 blob storage backend")
+        return S3BlobStorage(
+            bucket=bucket,
+            prefix=os.getenv('S3_PREFIX', ''),
+            endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+            region=os.getenv('S3_REGION')
+        )
+
+    raise RuntimeError(f"Unknown blob storage backend: {backend}")
+
+_storage: Optional[BlobStorage] = None
+
+def get_storage() -> BlobStorage:
+    """Get the process-wide storage backend"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+def set_storage(storage: Optional[BlobStorage]):
+    """Replace the process-wide storage backend"""
+    global _storage
+    _storage = storage
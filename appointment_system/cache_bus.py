@@ -0,0 +1,172 @@
+"""
+Cross-process cache invalidation over PostgreSQL LISTEN/NOTIFY
+Writers call publish(db, cache_name, key) in the transaction that changes the
+data. Once it commits, the entry is evicted from this process's cache and a
+NOTIFY on CACHE_BUS_CHANNEL tells every other worker (and container) to evict it
+too; a rolled-back transaction evicts nothing. key=None clears the whole cache.
+
+Each app process runs a listener thread on a connection of its own. Messages sent
+while it is disconnected are lost, so after reconnecting it clears every cache
+registered with track(). Only tracked caches should hold data other processes
+can change; without PostgreSQL, eviction is local only and no listener runs.
+Readers should fill these caches with set(key, value, generation), passing the
+cache's generation from before the database read: a value read just before a
+concurrent write committed is then dropped instead of outliving the eviction.
+"""
+
+import json
+import logging
+import os
+import select
+import threading
+from typing import Hashable, Optional, Set
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from cache_utils import LRUCache, get_cache
+from metrics import Counter
+
+_logger = logging.getLogger(__name__)
+
+CACHE_BUS_CHANNEL = os.getenv('CACHE_BUS_CHANNEL', 'cache_invalidation')
+
+# Longest wait between reconnect attempts (doubling from 1 second)
+CACHE_BUS_RECONNECT_MAX = float(os.getenv('CACHE_BUS_RECONNECT_MAX', '30'))
+
+cache_bus_messages_total = Counter(
+    "cache_bus_messages_total", "Cache invalidations by cache and direction (published/received)",
+    ("cache", "direction")
+)
+cache_bus_reconnects_total = Counter(
+    "cache_bus_reconnects_total", "Listener reconnects, each followed by a flush of the tracked caches"
+)
+
+_tracked: Set[str] = set()
+
+def track(cache: LRUCache) -> LRUCache:
+    """Mark a cache as invalidated through the bus (flushed after a listener reconnect)"""
+    _tracked.add(cache.name)
+    return cache
+
+def evict(cache_name: str, key: Optional[Hashable] = None):
+    """Evict one key (or everything, for None) from a cache in this process"""
+    cache = get_cache(cache_name)
+    if cache is None:
+        return
+    if key is None:
+        cache.clear()
+    else:
+        cache.invalidate(key)
+
+def publish(db: Session, cache_name: str, key: Optional[Hashable] = None):
+    """Evict `key` from `cache_name` in every process once the session's transaction commits"""
+    db.info.setdefault("cache_bus_pending", set()).add((cache_name, key))
+    cache_bus_messages_total.inc(cache=cache_name, direction="published")
+    if db.get_bind().dialect.name == "postgresql":
+        # Delivered by PostgreSQL on commit, dropped on rollback
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {
+            "channel": CACHE_BUS_CHANNEL,
+            "payload": json.dumps({"cache": cache_name, "key": key}),
+        })
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed(session: Session):
+    for cache_name, key in session.info.pop("cache_bus_pending", ()):
+        evict(cache_name, key)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session):
+    session.info.pop("cache_bus_pending", None)
+
+def _handle(payload: str):
+    try:
+        message = json.loads(payload)
+        key = message.get("key")
+        # JSON turns tuple keys into lists
+        evict(message["cache"], tuple(key) if isinstance(key, list) else key)
+    except (ValueError, KeyError, TypeError) as e:
+        _logger.warning(f"Ignoring malformed cache bus message {payload!r}: {e}")
+        return
+    cache_bus_messages_total.inc(cache=message["cache"], direction="received")
+
+def flush_tracked():
+    for cache_name in _tracked:
+        evict(cache_name)
+
+class CacheBusListener:
+    """Thread that LISTENs on CACHE_BUS_CHANNEL and evicts what other processes publish"""
+
+    def __init__(self, engine, poll_interval: float = 1.0):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self):
+        # A dedicated DBAPI connection: it is held for the life of the process, outside the pool
+        dialect = self.engine.dialect
+        cargs, cparams = dialect.create_connect_args(self.engine.url)
+        conn = dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{CACHE_BUS_CHANNEL}"')
+        return conn
+
+    def _listen(self, conn):
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                _handle(conn.notifies.pop(0).payload)
+
+    def _run(self):
+        delay, missed = 1.0, False
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if missed:
+                    cache_bus_reconnects_total.inc()
+                    flush_tracked()
+                    _logger.info("Cache bus listener reconnected; flushed tracked caches")
+                missed, delay = False, 1.0
+                self._listen(conn)
+            except Exception as e:
+                # Anything published from now until the next LISTEN is lost
+                missed = True
+                _logger.warning(f"Cache bus listener disconnected, retrying in {delay:.0f}s: {e}")
+                self._stopping.wait(delay)
+                delay = min(delay * 2, CACHE_BUS_RECONNECT_MAX)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="cache-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+_listener: Optional[CacheBusListener] = None
+
+def start_listener():
+    """Listen for invalidations from other processes (PostgreSQL only)"""
+    global _listener
+    from database import engine
+
+    if engine.dialect.name == "postgresql" and _listener is None:
+        _listener = CacheBusListener(engine)
+        _listener.start()
+
+def stop_listener(timeout: float = 5):
+    global _listener
+    if _listener is not None:
+        _listener.stop(timeout)
+        _listener = None
@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
 from sqlalchemy.ext.declarative import declarative_base
 import os
 from urllib.parse import quote_plus
+from sql_instrumentation import instrument_engine
 
 # Database connection settings for PostgreSQL
 # Get database URL from environment variable or use default
@@ -28,9 +31,18 @@ def get_database_url():
 
 SQLALCHEMY_DATABASE_URI = get_database_url()
 engine = create_engine(SQLALCHEMY_DATABASE_URI)
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional streaming replica for heavy read-only endpoints (see db_routing.py)
+READ_REPLICA_URL = os.getenv('DATABASE_READ_URL')
+read_engine = create_engine(READ_REPLICA_URL) if READ_REPLICA_URL else None
+if read_engine is not None:
+    instrument_engine(read_engine)
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine is not None else None
+
 Base = declarative_base()
 
 def get_db():
@@ -39,4 +51,36 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+class QueryCounter:
+    """Number of SQL statements seen by count_queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+@contextmanager
+def begin(bind):
+    """
+    Connection in a transaction: a new one committed on exit for an engine, or
+    the given connection inside the transaction its owner (e.g. a session) commits
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            yield conn
+    else:
+        yield bind
+
+@contextmanager
+def count_queries(bind=None):
+    """Count SQL statements executed on an engine inside the block"""
+    bind = bind if bind is not None else engine
+    counter = QueryCounter()
+    event.listen(bind, "before_cursor_execute", counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", counter._on_execute)
@@ -0,0 +1,174 @@
+"""
+Read-replica routing
+Endpoints that depend on get_read_db send safe (GET/HEAD) requests to the replica
+configured with DATABASE_READ_URL, except:
+  - for READ_YOUR_WRITES_SECONDS after the same user's last successful write
+    (tracked by a cookie and, per worker, by user id), so users see their own changes
+  - while the replica lags more than REPLICA_MAX_LAG seconds behind the primary
+Without DATABASE_READ_URL every session comes from the primary.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from fastapi import Request
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth_utils import verify_access_token
+from database import ReadSessionLocal, SessionLocal, read_engine
+from metrics import Counter, Gauge
+
+_logger = logging.getLogger(__name__)
+
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '5'))
+
+# Replica lag is measured at most this often per worker
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', '1'))
+
+STICKY_COOKIE = "db_primary_until"
+
+SAFE_METHODS = ("GET", "HEAD")
+
+db_read_routing_total = Counter(
+    "db_read_routing_total", "Sessions opened by get_read_db by target and reason",
+    ("target", "reason")
+)
+db_replica_lag_seconds = Gauge("db_replica_lag_seconds", "Replica replay lag at the last check")
+
+# Zero when the replica has replayed everything it received (an idle primary is not lag)
+_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+class ReplicaLagMonitor:
+    """Cached replica lag; an unreachable replica counts as infinitely behind"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lag = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _measure(self) -> float:
+        if self.engine.dialect.name != "postgresql":
+            return 0.0
+        try:
+            with self.engine.connect() as conn:
+                return float(conn.exec_driver_sql(_LAG_QUERY).scalar() or 0)
+        except SQLAlchemyError as e:
+            _logger.warning(f"Replica lag check failed, reading from the primary: {e}")
+            return float("inf")
+
+    def lag(self) -> float:
+        now = time.monotonic()
+        if now - self._checked_at >= REPLICA_LAG_CHECK_INTERVAL and self._lock.acquire(blocking=False):
+            try:
+                self._lag = self._measure()
+                self._checked_at = now
+                db_replica_lag_seconds.set(self._lag)
+            finally:
+                self._lock.release()
+        return self._lag
+
+lag_monitor = ReplicaLagMonitor(read_engine) if read_engine is not None else None
+
+class WriteTracker:
+    """Until when each user's reads stay on the primary (this worker only)"""
+
+    def __init__(self):
+        self._until: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: int, until: float):
+        with self._lock:
+            self._until[user_id] = until
+            if len(self._until) > 10000:
+                now = time.time()
+                self._until = {user: expiry for user, expiry in self._until.items() if expiry > now}
+
+    def is_sticky(self, user_id: Optional[int], now: float) -> bool:
+        return user_id is not None and self._until.get(user_id, 0) > now
+
+write_tracker = WriteTracker()
+
+def _user_id(headers: Headers) -> Optional[int]:
+    """User id from the bearer token or admin cookie, signature-checked only"""
+    token = None
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    else:
+        for cookie in headers.get("cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "admin_token":
+                token = value
+    payload = verify_access_token(token) if token else None
+    return payload.get("user_id") if payload else None
+
+def _route(request: Request) -> str:
+    """Reason this request reads from the primary, or "replica" """
+    if request.method not in SAFE_METHODS:
+        return "unsafe_method"
+
+    now = time.time()
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > now:
+            return "read_your_writes"
+    except ValueError:
+        pass
+    if write_tracker.is_sticky(_user_id(request.headers), now):
+        return "read_your_writes"
+
+    if lag_monitor.lag() > REPLICA_MAX_LAG:
+        return "replica_lag"
+    return "replica"
+
+def get_read_db(request: Request):
+    """FastAPI dependency: a session on the replica when it is safe, else on the primary"""
+    if ReadSessionLocal is None:
+        db = SessionLocal()
+    else:
+        reason = _route(request)
+        if reason == "replica":
+            db_read_routing_total.inc(target="replica", reason=reason)
+            db = ReadSessionLocal()
+        else:
+            db_read_routing_total.inc(target="primary", reason=reason)
+            db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+class ReadYourWritesMiddleware:
+    """After a successful write, pin the user's reads to the primary for a while"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or read_engine is None or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                user_id = _user_id(Headers(scope=scope))
+                if user_id is not None:
+                    write_tracker.mark(user_id, until)
+                MutableHeaders(scope=message).append(
+                    "Set-Cookie",
+                    f"{STICKY_COOKIE}={int(until) + 1}; Max-Age={READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
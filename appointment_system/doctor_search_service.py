@@ -0,0 +1,189 @@
+"""
+Doctor directory search backed by the denormalized doctor_search table
+"""
+
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import insert, func
+from sqlalchemy.orm import Session
+from serialization import rows_to_dicts
+from models import DoctorSearchEntry, DoctorProfile, DoctorTimeslot, User, Division, District, Thana
+
+SORT_OPTIONS = ("name", "fee", "experience", "earliest_slot")
+
+class DoctorSearchService:
+
+    @staticmethod
+    def _normalize_time(value: str) -> str:
+        """Timeslots allow "9:00"; store "09:00" so string order is time order"""
+        return datetime.strptime(value, "%H:%M").strftime("%H:%M")
+
+    @staticmethod
+    def _source_query(db: Session):
+        return db.query(
+            DoctorProfile.id.label('doctor_id'),
+            User.id.label('user_id'),
+            User.full_name,
+            DoctorProfile.license_number,
+            DoctorProfile.experience_years,
+            DoctorProfile.consultation_fee,
+            User.division_id,
+            User.district_id,
+            User.thana_id,
+            Division.name.label('division_name'),
+            District.name.label('district_name'),
+            Thana.name.label('thana_name'),
+            User.profile_image_filename
+        ).join(
+            User, DoctorProfile.user_id == User.id
+        ).outerjoin(
+            Division, User.division_id == Division.id
+        ).outerjoin(
+            District, User.district_id == District.id
+        ).outerjoin(
+            Thana, User.thana_id == Thana.id
+        )
+
+    @staticmethod
+    def _entry_values(row, slot_starts: List[str]) -> dict:
+        values = dict(row._mapping)
+        values["name_key"] = values["full_name"].lower()
+        values["earliest_slot_start"] = min(slot_starts) if slot_starts else None
+        return values
+
+    @staticmethod
+    def refresh_doctor(db: Session, doctor_id: int):
+        """
+        Recompute the search entry of one doctor (doctor_profiles.id)
+        Call inside the transaction that changed the doctor, after a flush
+        """
+        row = DoctorSearchService._source_query(db).filter(DoctorProfile.id == doctor_id).first()
+        entry = db.get(DoctorSearchEntry, doctor_id)
+
+        if row is None:
+            if entry is not None:
+                db.delete(entry)
+            return
+
+        slot_starts = [
+            DoctorSearchService._normalize_time(start_time)
+            for start_time, in db.query(DoctorTimeslot.start_time).filter(
+                DoctorTimeslot.doctor_id == doctor_id,
+                DoctorTimeslot.is_available == True
+            ).all()
+        ]
+        values = DoctorSearchService._entry_values(row, slot_starts)
+
+        if entry is None:
+            db.add(DoctorSearchEntry(**values))
+        else:
+            for key, value in values.items():
+                setattr(entry, key, value)
+
+    @staticmethod
+    def remove_doctor(db: Session, doctor_id: int):
+        """Drop a doctor from the directory (before deleting the profile)"""
+        db.query(DoctorSearchEntry).filter(DoctorSearchEntry.doctor_id == doctor_id).delete(synchronize_session=False)
+
+    @staticmethod
+    def rebuild_index(db: Session) -> int:
+        """Rebuild the whole directory from the source tables, returns the number of entries"""
+        slot_starts = {}
+        for doctor_id, start_time in db.query(DoctorTimeslot.doctor_id, DoctorTimeslot.start_time).filter(
+            DoctorTimeslot.is_available == True
+        ).all():
+            slot_starts.setdefault(doctor_id, []).append(DoctorSearchService._normalize_time(start_time))
+
+        entries = [
+            DoctorSearchService._entry_values(row, slot_starts.get(row.doctor_id, []))
+            for row in DoctorSearchService._source_query(db).all()
+        ]
+
+        db.query(DoctorSearchEntry).delete(synchronize_session=False)
+        if entries:
+            db.execute(insert(DoctorSearchEntry), entries)
+        db.commit()
+        return len(entries)
+
+    @staticmethod
+    def ensure_index(db: Session):
+        """Backfill the directory if it is out of step with doctor_profiles (e.g. first start)"""
+        indexed = db.query(func.count(DoctorSearchEntry.doctor_id)).scalar()
+        doctors = db.query(func.count(DoctorProfile.id)).scalar()
+        if indexed != doctors:
+            count = DoctorSearchService.rebuild_index(db)
+            print(f"Rebuilt doctor search index with {count} doctors")
+
+    @staticmethod
+    def search(
+        db: Session,
+        division_id: Optional[int] = None,
+        district_id: Optional[int] = None,
+        thana_id: Optional[int] = None,
+        min_fee: Optional[float] = None,
+        max_fee: Optional[float] = None,
+        min_experience: Optional[int] = None,
+        name: Optional[str] = None,
+        sort: str = "name",
+        skip: int = 0,
+        limit: int = 20
+    ) -> List[dict]:
+        """
+        Search the doctor directory
+        Returns flat rows shaped like schemas.DoctorCard
+        """
+        if sort not in SORT_OPTIONS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_OPTIONS)}")
+
+        query = db.query(
+            DoctorSearchEntry.user_id.label('id'),
+            DoctorSearchEntry.doctor_id,
+            DoctorSearchEntry.full_name,
+            DoctorSearchEntry.license_number,
+            DoctorSearchEntry.experience_years,
+            DoctorSearchEntry.consultation_fee,
+            DoctorSearchEntry.division_name,
+            DoctorSearchEntry.district_name,
+            DoctorSearchEntry.thana_name,
+            DoctorSearchEntry.profile_image_filename,
+            DoctorSearchEntry.earliest_slot_start
+        )
+
+        # Apply filters
+        if division_id:
+            query = query.filter(DoctorSearchEntry.division_id == division_id)
+
+        if district_id:
+            query = query.filter(DoctorSearchEntry.district_id == district_id)
+
+        if thana_id:
+            query = query.filter(DoctorSearchEntry.thana_id == thana_id)
+
+        if min_fee is not None:
+            query = query.filter(DoctorSearchEntry.consultation_fee >= min_fee)
+
+        if max_fee is not None:
+            query = query.filter(DoctorSearchEntry.consultation_fee <= max_fee)
+
+        if min_experience is not None:
+            query = query.filter(DoctorSearchEntry.experience_years >= min_experience)
+
+        if name:
+            prefix = name.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.filter(DoctorSearchEntry.name_key.like(f"{prefix}%", escape="\\"))
+
+        # Sort (doctor_id breaks ties so pagination is stable)
+        if sort == "fee":
+            query = query.order_by(DoctorSearchEntry.consultation_fee, DoctorSearchEntry.doctor_id)
+        elif sort == "experience":
+            query = query.order_by(DoctorSearchEntry.experience_years.desc(), DoctorSearchEntry.doctor_id)
+        elif sort == "earliest_slot":
+            query = query.order_by(
+                DoctorSearchEntry.earliest_slot_start.is_(None),
+                DoctorSearchEntry.earliest_slot_start,
+                DoctorSearchEntry.doctor_id
+            )
+        else:
+            query = query.order_by(DoctorSearchEntry.name_key, DoctorSearchEntry.doctor_id)
+
+        return rows_to_dicts(query.offset(skip).limit(limit).all())
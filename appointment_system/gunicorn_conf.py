@@ -0,0 +1,58 @@
+"""
+Production server: gunicorn pre-forking uvicorn workers
+
+    gunicorn -c gunicorn_conf.py main:app
+
+The app is imported and warmed (templates, schema check, location cache) once in
+the master, then forked; workers only open their own database connections.
+Workers are recycled after MAX_REQUESTS (+ jitter) requests to cap memory growth.
+"""
+
+import gc
+import os
+
+def available_cpus() -> int:
+    """CPUs this container may use: affinity mask, capped by a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Async workers: one per core (WEB_CONCURRENCY overrides)
+workers = int(os.getenv('WEB_CONCURRENCY', str(available_cpus())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = True
+
+# Recycle workers gracefully; the jitter keeps them from restarting together
+max_requests = int(os.getenv('MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', str(max_requests // 10)))
+
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.getenv('WORKER_TIMEOUT', '60'))
+keepalive = int(os.getenv('KEEPALIVE', '5'))
+
+accesslog = os.getenv('ACCESS_LOG') or None
+errorlog = "-"
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+def when_ready(server):
+    """Warm shared state in the master before the first fork"""
+    import startup
+
+    startup.prepare_shared()
+    startup.release_connections()
+    # Keep the collector out of the inherited objects so their pages stay shared
+    gc.freeze()
+    server.log.info("Shared state warmed in %s; starting %s workers", startup.state.steps, workers)
@@ -0,0 +1,38 @@
+"""
+HTTP caching helpers shared by the image, page and static file responses
+"""
+
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from starlette.requests import Request
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Evaluate If-None-Match against an ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def http_date(timestamp: float) -> str:
+    """Format a Unix timestamp for Last-Modified"""
+    return formatdate(timestamp, usegmt=True)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """
+    True if the client's cached copy is still current
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    """
+    if request.headers.get("if-none-match"):
+        return etag_matches(request, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
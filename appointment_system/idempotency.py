@@ -0,0 +1,248 @@
+"""
+Idempotency-Key support for appointment creation and status changes
+The first response to a (user, key) pair is stored in the idempotency_keys table;
+retries with the same key get it back after one primary-key lookup, without
+running the endpoint again. A retry that arrives while the first request is
+still running gets 409, and a key reused for a different request gets 422.
+"""
+
+import hashlib
+import os
+import random
+import re
+import time
+from typing import Optional, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from auth_utils import verify_access_token
+from metrics import Counter
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+
+# How long a stored response is replayed
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))
+
+# A first request that has not finished after this long is presumed dead and may be retried
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '60'))
+
+# Larger responses are not stored (the key is released instead)
+IDEMPOTENCY_MAX_BODY = 64 * 1024
+
+# POST endpoints that honour the header
+IDEMPOTENT_ROUTES = re.compile(r"^/api/appointments/(\d+/(confirm|complete))?$")
+
+PURGE_PROBABILITY = 0.001
+
+idempotency_requests_total = Counter(
+    "idempotency_requests_total", "Requests carrying an Idempotency-Key by outcome",
+    ("outcome",)
+)
+
+class IdempotencyStore:
+    """idempotency_keys rows, accessed with short transactions of their own"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def begin(self, user_id: int, key: str, endpoint: str, request_hash: str) -> Tuple[str, Optional[object]]:
+        """
+        Claim the key or find its stored response
+        Returns ("proceed", None), ("replay", record), ("in_progress", None) or ("mismatch", None)
+        """
+        from models import IdempotencyRecord
+
+        now = time.time()
+        try:
+            with self.engine.begin() as conn:
+                record = conn.execute(
+                    select(IdempotencyRecord.__table__).where(
+                        IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key
+                    ).with_for_update()
+                ).first()
+
+                if record is not None and record.expires_at < now:
+                    conn.execute(delete(IdempotencyRecord.__table__).where(
+                        IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key
+                    ))
+                    record = None
+
+                if record is None:
+                    conn.execute(IdempotencyRecord.__table__.insert().values(
+                        user_id=user_id, key=key, endpoint=endpoint, request_hash=request_hash,
+                        locked_at=now, expires_at=now + IDEMPOTENCY_TTL
+                    ))
+                    if random.random() < PURGE_PROBABILITY:
+                        conn.execute(delete(IdempotencyRecord.__table__).where(IdempotencyRecord.expires_at < now))
+                    return "proceed", None
+
+                if record.endpoint != endpoint or record.request_hash != request_hash:
+                    return "mismatch", None
+
+                if record.status_code is not None:
+                    return "replay", record
+
+                if record.locked_at < now - IDEMPOTENCY_LOCK_TIMEOUT:
+                    conn.execute(update(IdempotencyRecord.__table__).where(
+                        IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key
+                    ).values(locked_at=now))
+                    return "proceed", None
+
+                return "in_progress", None
+        except IntegrityError:
+            # A concurrent request with the same key inserted first
+            return "in_progress", None
+
+    def complete(self, user_id: int, key: str, status_code: int, content_type: Optional[str], body: bytes):
+        from models import IdempotencyRecord
+
+        with self.engine.begin() as conn:
+            conn.execute(update(IdempotencyRecord.__table__).where(
+                IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key
+            ).values(status_code=status_code, content_type=content_type, response_body=body))
+
+    def release(self, user_id: int, key: str):
+        """Forget a claim whose request failed, so a retry runs it again"""
+        from models import IdempotencyRecord
+
+        with self.engine.begin() as conn:
+            conn.execute(delete(IdempotencyRecord.__table__).where(
+                IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key,
+                IdempotencyRecord.status_code.is_(None)
+            ))
+
+    @staticmethod
+    def purge_expired(conn, now: float) -> int:
+        """Delete every record whose replay window has passed, in the connection's transaction"""
+        from models import IdempotencyRecord
+
+        return conn.execute(delete(IdempotencyRecord.__table__).where(IdempotencyRecord.expires_at < now)).rowcount
+
+def _user_id(headers: Headers) -> Optional[int]:
+    """User id from the bearer token's signature-checked claims (no database access)"""
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    payload = verify_access_token(authorization[7:])
+    return payload.get("user_id") if payload else None
+
+async def _send_json(send: Send, status_code: int, body: bytes, extra_headers: list = ()):
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class IdempotencyMiddleware:
+    """Store and replay responses of POSTs sent with an Idempotency-Key"""
+
+    def __init__(self, app: ASGIApp, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self._store = store
+
+    @property
+    def store(self) -> IdempotencyStore:
+        if self._store is None:
+            from database import engine
+            self._store = IdempotencyStore(engine)
+        return self._store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not IDEMPOTENT_ROUTES.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        user_id = _user_id(headers) if key else None
+        if not key or user_id is None:
+            # Without a key (or a valid token, which the endpoint will reject) nothing is stored
+            await self.app(scope, receive, send)
+            return
+
+        if len(key) > 255:
+            await _send_json(send, 400, b'{"detail":"Idempotency-Key must be at most 255 characters"}')
+            return
+
+        # Buffer the body to fingerprint it, then hand it to the app unchanged
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        endpoint = f"POST {scope['path']}"
+        outcome, record = await run_in_threadpool(
+            self.store.begin, user_id, key, endpoint, hashlib.sha256(body).hexdigest()
+        )
+        idempotency_requests_total.inc(outcome=outcome)
+
+        if outcome == "replay":
+            await send({
+                "type": "http.response.start",
+                "status": record.status_code,
+                "headers": [
+                    (b"content-type", (record.content_type or "application/json").encode("latin-1")),
+                    (b"content-length", str(len(record.response_body or b"")).encode("latin-1")),
+                    (b"idempotent-replayed", b"true"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": record.response_body or b""})
+            return
+        if outcome == "in_progress":
+            await _send_json(send, 409, b'{"detail":"A request with this Idempotency-Key is still being processed"}',
+                             [(b"retry-after", b"1")])
+            return
+        if outcome == "mismatch":
+            await _send_json(send, 422, b'{"detail":"Idempotency-Key was already used for a different request"}')
+            return
+
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        content_type = None
+        response_chunks = []
+        response_size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, content_type, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+                if response_size <= IDEMPOTENCY_MAX_BODY:
+                    response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        except BaseException:
+            await run_in_threadpool(self.store.release, user_id, key)
+            raise
+
+        # Server errors are not final: let the client's retry run the request again
+        if status_code >= 500 or response_size > IDEMPOTENCY_MAX_BODY:
+            await run_in_threadpool(self.store.release, user_id, key)
+        else:
+            await run_in_threadpool(
+                self.store.complete, user_id, key, status_code, content_type, b"".join(response_chunks)
+            )
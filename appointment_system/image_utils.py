@@ -0,0 +1,259 @@
+"""
+Profile image processing: variant rendering in a worker process pool
+Each upload is stored once per content hash as a fixed set of resized variants
+"""
+
+import hashlib
+import io
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from PIL import Image
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+from blob_storage import get_storage
+from cache_utils import LRUCache
+from http_utils import etag_matches
+from metrics import observe_job
+
+# Variant sizes (longest edge, in pixels) rendered for every upload
+VARIANT_SIZES = (800, 200, 64)
+DEFAULT_VARIANT_SIZE = 800
+WEBP_QUALITY = 80
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+# Blob storage key prefix for profile images
+PROFILES_PREFIX = "profiles/"
+PROFILES_URL = "/api/users/profile-images"
+
+# When set (e.g. "/protected-profiles/"), image bytes are served by the reverse
+# proxy through an X-Accel-Redirect header instead of by the application
+PROFILE_IMAGE_ACCEL_PREFIX = os.getenv('PROFILE_IMAGE_ACCEL_PREFIX')
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Number of worker processes used for decoding/resizing/encoding
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+
+# Source format -> (file extension, content type)
+IMAGE_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+}
+
+# Hot thumbnails (everything below the default size) are kept in memory
+thumbnail_cache = LRUCache("profile_thumbnails", maxsize=int(os.getenv('THUMBNAIL_CACHE_SIZE', '2048')))
+
+IMAGE_FORMATS_BY_TYPE = {content_type: extension for extension, content_type in IMAGE_FORMATS.values()}
+
+# Filenames produced by this module: <digest>_<size>.<ext>
+HASHED_FILENAME = re.compile(r"^(?P<digest>[0-9a-f]{32})_(?P<size>\d+)(?P<ext>\.(?:jpg|png|webp))$")
+
+# Filenames of uploads stored before variants existed: <uuid>.<ext>, one file, no variants
+LEGACY_FILENAME = re.compile(r"^[0-9A-Za-z-]+\.(?:jpg|jpeg|png)$")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Get the shared image processing pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+def shutdown_image_pool():
+    """Stop the image processing pool (called on application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+def content_digest(image_data: bytes) -> str:
+    """Content hash used to name and deduplicate stored images"""
+    return hashlib.sha256(image_data).hexdigest()[:32]
+
+def variant_filename(digest: str, size: int, extension: str) -> str:
+    """Build the stored filename of a single variant"""
+    return f"{digest}_{size}{extension}"
+
+def storage_key(filename: str) -> str:
+    """Blob storage key of a stored profile image"""
+    return f"{PROFILES_PREFIX}{filename}"
+
+def find_existing_variants(digest: str) -> Optional[Tuple[str, str]]:
+    """
+    Return (filename, content_type) if this content was already processed
+    """
+    storage = get_storage()
+    for extension, content_type in IMAGE_FORMATS.values():
+        filename = variant_filename(digest, DEFAULT_VARIANT_SIZE, extension)
+        if storage.exists(storage_key(filename)):
+            return filename, content_type
+    return None
+
+def _encode(image: Image.Image, image_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+def render_variants(image_data: bytes, digest: str) -> Tuple[List[Tuple[str, bytes, str]], str]:
+    """
+    Decode, validate and encode every variant of an image
+    Runs inside a pool worker process
+    Returns: ([(filename, encoded_bytes, content_type), ...], content_type)
+    """
+    image = Image.open(io.BytesIO(image_data))
+
+    if image.format not in IMAGE_FORMATS:
+        raise ValueError("Image must be JPEG or PNG format")
+
+    source_format = image.format
+    extension, content_type = IMAGE_FORMATS[source_format]
+
+    image.load()
+    webp_mode = "RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB"
+
+    # Sizes are rendered largest first so each step downsamples the previous variant
+    variants = []
+    variant = image
+    for size in VARIANT_SIZES:
+        variant = variant.copy()
+        if variant.size[0] > size or variant.size[1] > size:
+            variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        variants.append((variant_filename(digest, size, extension), _encode(variant, source_format), content_type))
+
+        webp_variant = variant if variant.mode == webp_mode else variant.convert(webp_mode)
+        variants.append((
+            variant_filename(digest, size, ".webp"),
+            _encode(webp_variant, "WEBP", quality=WEBP_QUALITY),
+            "image/webp"
+        ))
+
+    return variants, content_type
+
+def _render_variants_job(image_data: bytes, digest: str, queued_at: float):
+    """Pool entry point: render_variants plus the time the job waited for a worker"""
+    started_at = time.time()
+    variants, content_type = render_variants(image_data, digest)
+    return variants, content_type, started_at - queued_at, time.time() - started_at
+
+def store_profile_image(image_data: bytes) -> Tuple[str, str]:
+    """
+    Store an uploaded image as content-addressed variants
+    Identical uploads are deduplicated without being decoded again
+    Returns: (saved_filename, content_type)
+    """
+    if len(image_data) > MAX_IMAGE_BYTES:
+        raise ValueError("Image size must be less than 5MB")
+
+    digest = content_digest(image_data)
+    existing = find_existing_variants(digest)
+    if existing:
+        return existing
+
+    future = get_image_pool().submit(_render_variants_job, image_data, digest, time.time())
+    variants, content_type, lag, duration = future.result()
+    observe_job("profile_image", lag, duration)
+
+    # The default variant is written last: its presence marks the set as complete
+    storage = get_storage()
+    for filename, data, variant_content_type in reversed(variants):
+        storage.write(storage_key(filename), data, variant_content_type)
+
+    return variant_filename(digest, DEFAULT_VARIANT_SIZE, IMAGE_FORMATS_BY_TYPE[content_type]), content_type
+
+def profile_image_variant_filename(filename: Optional[str], size: int = DEFAULT_VARIANT_SIZE, webp: bool = False) -> Optional[str]:
+    """
+    Resolve the stored filename of a variant
+    Legacy (pre-variant) filenames only exist in one size, so they are returned unchanged
+    """
+    if not filename:
+        return None
+
+    match = HASHED_FILENAME.match(filename)
+    if not match:
+        return filename
+
+    if size not in VARIANT_SIZES:
+        raise ValueError(f"Unsupported image size: {size}")
+
+    extension = ".webp" if webp else match.group("ext")
+    return variant_filename(match.group("digest"), size, extension)
+
+def profile_image_urls(filename: Optional[str]) -> Dict[str, str]:
+    """
+    Map variant names (e.g. "200", "200_webp") to image URLs
+    """
+    if not filename:
+        return {}
+
+    urls = {}
+    is_hashed = is_content_addressed(filename)
+    for size in sorted(VARIANT_SIZES):
+        urls[str(size)] = f"{PROFILES_URL}/{profile_image_variant_filename(filename, size)}"
+        if is_hashed:
+            urls[f"{size}_webp"] = f"{PROFILES_URL}/{profile_image_variant_filename(filename, size, webp=True)}"
+    return urls
+
+def is_content_addressed(filename: str) -> bool:
+    """True for filenames produced by this module (safe to cache forever)"""
+    return HASHED_FILENAME.match(filename) is not None
+
+def is_legacy(filename: str) -> bool:
+    """True for single-file uploads from before content addressing (served, but revalidated)"""
+    return not is_content_addressed(filename) and LEGACY_FILENAME.match(filename) is not None
+
+def media_type_for(filename: str) -> str:
+    """Content type of a stored file, from its extension"""
+    if filename.endswith(".webp"):
+        return "image/webp"
+    if filename.endswith(".png"):
+        return "image/png"
+    return "image/jpeg"
+
+def _is_thumbnail(filename: str) -> bool:
+    match = HASHED_FILENAME.match(filename)
+    return match is not None and int(match.group("size")) < DEFAULT_VARIANT_SIZE
+
+async def image_response(request: Request, filename: str, immutable: bool) -> Response:
+    """
+    Build a conditional response for a stored image
+    Returns 304 when the client already has this exact file
+    Raises FileNotFoundError if the image is missing from storage
+    """
+    etag = f'"{filename}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = media_type_for(filename)
+    storage = get_storage()
+    key = storage_key(filename)
+    local_path = storage.local_path(key)
+
+    if local_path is not None and PROFILE_IMAGE_ACCEL_PREFIX:
+        headers["X-Accel-Redirect"] = f"{PROFILE_IMAGE_ACCEL_PREFIX.rstrip('/')}/{filename}"
+        return Response(media_type=media_type, headers=headers)
+
+    if _is_thumbnail(filename):
+        content = thumbnail_cache.get(filename)
+        if content is None:
+            content = await storage.read(key)
+            thumbnail_cache.set(filename, content)
+        return Response(content=content, media_type=media_type, headers=headers)
+
+    if local_path is not None:
+        if not local_path.is_file():
+            raise FileNotFoundError(filename)
+        return FileResponse(path=str(local_path), media_type=media_type, headers=headers)
+
+    stream = await storage.open_stream(key)
+    return StreamingResponse(stream, media_type=media_type, headers=headers)
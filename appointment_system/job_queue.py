@@ -0,0 +1,308 @@
+"""
+Background job queue stored in the jobs table
+Request handlers add jobs with enqueue(db, name, payload), which joins the
+caller's transaction, and return. Worker threads claim ready jobs with
+UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED), so any number of
+worker processes can share the table without claiming the same job twice.
+
+A failed job is retried after an exponential backoff (JOB_BACKOFF_BASE seconds,
+doubling per attempt, with jitter, at most JOB_BACKOFF_MAX). After max_attempts
+it is kept as "dead" for inspection; `retry-dead` queues dead jobs again. Jobs
+whose worker died are requeued after JOB_LOCK_TIMEOUT seconds.
+
+The worker and admin commands are in jobs.py (python jobs.py --help).
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from metrics import Counter, Gauge, observe_job
+
+_logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_BACKOFF_BASE = float(os.getenv('JOB_BACKOFF_BASE', '5'))
+JOB_BACKOFF_MAX = float(os.getenv('JOB_BACKOFF_MAX', '3600'))
+
+# A running job not finished after this long is presumed orphaned by a dead worker
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', '600'))
+
+# How long an idle worker thread sleeps between polls
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+
+# Worker threads started inside each app process; production runs `python jobs.py worker` instead
+_PRODUCTION = os.getenv('APP_ENV', 'development').lower() == 'production'
+EMBEDDED_JOB_WORKERS = int(os.getenv('EMBEDDED_JOB_WORKERS', '0' if _PRODUCTION else '2'))
+
+REAP_INTERVAL = 60
+
+job_queue_jobs_total = Counter(
+    "job_queue_jobs_total", "Jobs run by worker threads, by job and outcome",
+    ("job", "outcome")
+)
+
+class JobHandler:
+    """A registered job: the function run with (db, payload) and its attempt limit"""
+
+    def __init__(self, name: str, func: Callable[[Session, dict], None], max_attempts: int):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+_handlers: Dict[str, JobHandler] = {}
+
+def job(name: str, max_attempts: Optional[int] = None):
+    """Decorator registering a job handler under `name`"""
+    def register(func: Callable[[Session, dict], None]):
+        _handlers[name] = JobHandler(name, func, max_attempts or JOB_MAX_ATTEMPTS)
+        return func
+    return register
+
+def get_handler(name: str) -> Optional[JobHandler]:
+    return _handlers.get(name)
+
+def enqueue(db: Session, name: str, payload: Optional[dict] = None, delay: float = 0,
+            priority: int = 0, max_attempts: Optional[int] = None):
+    """Add a job to the session; it becomes visible to workers when the caller commits"""
+    from models import Job
+
+    handler = _handlers.get(name)
+    job_row = Job(
+        name=name,
+        payload=payload or {},
+        status="queued",
+        priority=priority,
+        max_attempts=max_attempts or (handler.max_attempts if handler else JOB_MAX_ATTEMPTS),
+    )
+    if delay:
+        job_row.run_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+    db.add(job_row)
+    return job_row
+
+def backoff(attempts: int) -> float:
+    """Seconds before retry number `attempts` (1-based), with +-50% jitter"""
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite hands back naive UTC timestamps
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+class JobQueue:
+    """jobs rows, accessed with short transactions of their own"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def claim(self, worker_id: str, limit: int = 1, names: Optional[Sequence[str]] = None) -> list:
+        """Mark up to `limit` ready jobs as running by this worker and return them"""
+        from models import Job
+
+        jobs = Job.__table__
+        ready = select(jobs.c.id).where(jobs.c.status == "queued", jobs.c.run_at <= func.now())
+        if names:
+            ready = ready.where(jobs.c.name.in_(names))
+        ready = ready.order_by(jobs.c.priority, jobs.c.run_at).limit(limit).with_for_update(skip_locked=True)
+
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(jobs).where(jobs.c.id.in_(ready.scalar_subquery())).values(
+                    status="running", locked_at=func.now(), locked_by=worker_id, attempts=jobs.c.attempts + 1
+                ).returning(jobs.c.id, jobs.c.name, jobs.c.payload, jobs.c.attempts, jobs.c.max_attempts, jobs.c.run_at)
+            ).all()
+
+    def succeed(self, job_id: int):
+        from models import Job
+
+        with self.engine.begin() as conn:
+            conn.execute(delete(Job.__table__).where(Job.__table__.c.id == job_id))
+
+    def fail(self, job_id: int, attempts: int, max_attempts: int, error: str) -> str:
+        """Schedule a retry, or dead-letter the job when it has no attempts left; returns the outcome"""
+        from models import Job
+
+        jobs = Job.__table__
+        if attempts >= max_attempts:
+            outcome, values = "dead", {"status": "dead"}
+        else:
+            outcome = "retried"
+            values = {"status": "queued", "run_at": datetime.now(timezone.utc) + timedelta(seconds=backoff(attempts))}
+        with self.engine.begin() as conn:
+            conn.execute(update(jobs).where(jobs.c.id == job_id).values(
+                locked_at=None, locked_by=None, last_error=error[:4000], **values
+            ))
+        return outcome
+
+    def requeue_stale(self) -> int:
+        """Release jobs held by workers that died; those out of attempts become dead"""
+        from models import Job
+
+        jobs = Job.__table__
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_LOCK_TIMEOUT)
+        with self.engine.begin() as conn:
+            return conn.execute(update(jobs).where(
+                jobs.c.status == "running", jobs.c.locked_at < cutoff
+            ).values(
+                status=case((jobs.c.attempts >= jobs.c.max_attempts, "dead"), else_="queued"),
+                locked_at=None, locked_by=None, last_error="worker lock timed out"
+            )).rowcount
+
+    def retry_dead(self, name: Optional[str] = None) -> int:
+        from models import Job
+
+        jobs = Job.__table__
+        statement = update(jobs).where(jobs.c.status == "dead")
+        if name:
+            statement = statement.where(jobs.c.name == name)
+        with self.engine.begin() as conn:
+            return conn.execute(statement.values(status="queued", attempts=0, run_at=func.now())).rowcount
+
+    def counts(self) -> Dict[tuple, float]:
+        """Number of jobs by (name, status)"""
+        from models import Job
+
+        jobs = Job.__table__
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(jobs.c.name, jobs.c.status, func.count()).group_by(jobs.c.name, jobs.c.status)
+            ).all()
+        return {(name, status): count for name, status, count in rows}
+
+def _job_counts() -> Dict[tuple, float]:
+    from database import engine
+    try:
+        return JobQueue(engine).counts()
+    except SQLAlchemyError:
+        return {}
+
+job_queue_jobs = Gauge(
+    "job_queue_jobs", "Jobs in the jobs table by job and status (read at scrape time)",
+    ("job", "status"), callback=_job_counts
+)
+
+class Worker:
+    """Pool of threads that claim and run jobs until stopped"""
+
+    def __init__(self, engine, concurrency: int = 1, poll_interval: float = JOB_POLL_INTERVAL,
+                 names: Optional[Sequence[str]] = None):
+        self.queue = JobQueue(engine)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.names = names
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._reaped_at = 0.0
+        self._reap_lock = threading.Lock()
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        _logger.info(f"Started {self.concurrency} job worker threads")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Let running jobs finish, then stop the threads"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _reap(self):
+        if time.monotonic() - self._reaped_at < REAP_INTERVAL or not self._reap_lock.acquire(blocking=False):
+            return
+        try:
+            self._reaped_at = time.monotonic()
+            released = self.queue.requeue_stale()
+            if released:
+                _logger.warning(f"Requeued {released} jobs whose worker stopped responding")
+        finally:
+            self._reap_lock.release()
+
+    def _run(self):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        while not self._stopping.is_set():
+            try:
+                self._reap()
+                claimed = self.queue.claim(worker_id, names=self.names)
+            except SQLAlchemyError as e:
+                _logger.warning(f"Could not claim jobs: {e}")
+                claimed = []
+            if not claimed:
+                self._stopping.wait(self.poll_interval)
+                continue
+            for job_row in claimed:
+                try:
+                    self.execute(job_row)
+                except Exception:
+                    # Recording the outcome failed; the reaper requeues the job after JOB_LOCK_TIMEOUT
+                    _logger.exception(f"Job {job_row.name} #{job_row.id} could not be completed")
+                    job_queue_jobs_total.inc(job=job_row.name, outcome="error")
+
+    def execute(self, job_row):
+        from database import SessionLocal
+
+        started = time.perf_counter()
+        lag = max(0.0, (datetime.now(timezone.utc) - _as_utc(job_row.run_at)).total_seconds())
+        handler = get_handler(job_row.name)
+        db = SessionLocal()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job_row.name!r}")
+            handler.func(db, job_row.payload)
+        except Exception as e:
+            db.rollback()
+            outcome = self.queue.fail(job_row.id, job_row.attempts, job_row.max_attempts, f"{type(e).__name__}: {e}")
+            _logger.log(logging.ERROR if outcome == "dead" else logging.WARNING,
+                        f"Job {job_row.name} #{job_row.id} failed (attempt {job_row.attempts}/{job_row.max_attempts}, {outcome}): {e}")
+        else:
+            self.queue.succeed(job_row.id)
+            outcome = "succeeded"
+        finally:
+            db.close()
+        job_queue_jobs_total.inc(job=job_row.name, outcome=outcome)
+        observe_job(job_row.name, lag, time.perf_counter() - started)
+
+_embedded_worker: Optional[Worker] = None
+
+def start_embedded_workers():
+    """Run EMBEDDED_JOB_WORKERS worker threads inside this (app) process"""
+    global _embedded_worker
+    if EMBEDDED_JOB_WORKERS > 0 and _embedded_worker is None:
+        from database import engine
+        _embedded_worker = Worker(engine, EMBEDDED_JOB_WORKERS)
+        _embedded_worker.start()
+
+def stop_embedded_workers(timeout: float = 30):
+    global _embedded_worker
+    if _embedded_worker is not None:
+        _embedded_worker.stop(timeout)
+        _embedded_worker = None
+
+def serve_metrics(port: int):
+    """Expose this process's metrics on http://0.0.0.0:<port>/metrics (for worker processes)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from metrics import render_metrics
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_metrics()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
@@ -0,0 +1,197 @@
+"""
+Application job handlers, run by job_queue workers, outbox subscribers and
+periodic tasks
+Each handler gets its own session and the job's payload, and must be safe to run
+again: a job is retried after any exception, and after a worker dies mid-run.
+The worker process also runs the outbox relay, which calls the subscribers, and
+competes with the app processes to be the scheduler leader that runs the tasks.
+
+Usage (from appointment_system/):
+    python jobs.py worker --concurrency 4 [--metrics-port 9101]
+    python jobs.py enqueue cleanup_expired_tokens [--payload '{}']
+    python jobs.py stats | retry-dead [--name NAME] | tasks
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from job_queue import JOB_POLL_INTERVAL, JobQueue, Worker, enqueue, job, serve_metrics
+from outbox import OutboxRelay, subscribe
+from scheduler import Scheduler, get_tasks, periodic
+
+_logger = logging.getLogger(__name__)
+
+# Outbox subscribers: run by the relay inside its transaction, so keep them to enqueue() calls
+
+@subscribe("created")
+def notify_patient_of_booking(db: Session, event):
+    enqueue(db, "appointment_notification", {"appointment_id": event.appointment_id})
+
+# Jobs
+
+@job("appointment_notification")
+def appointment_notification(db: Session, payload: dict):
+    """Create the patient's notification for a new appointment"""
+    from models import Appointment
+    from notification_service import NotificationService
+
+    appointment = db.query(Appointment).filter(Appointment.id == payload["appointment_id"]).first()
+    if appointment is None:
+        # Deleted (or its doctor removed) before the job ran
+        return
+    NotificationService.create_notification(db, appointment)
+
+@job("appointment_reminder")
+def appointment_reminder(db: Session, payload: dict):
+    """Create an unread reminder for the patient, at most once per appointment and day"""
+    from models import Appointment, AppointmentReminder, AppointmentStatus, Notification
+
+    appointment_id, day = payload["appointment_id"], date.fromisoformat(payload["day"])
+    if db.get(AppointmentReminder, (appointment_id, day)) is not None:
+        return
+    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    if appointment is None or appointment.status not in (AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED):
+        # Deleted or cancelled since it was queued
+        return
+    notification = Notification(user_id=appointment.patient_id, is_read=False)
+    db.add(notification)
+    db.flush()
+    db.add(AppointmentReminder(appointment_id=appointment_id, reminder_date=day, notification_id=notification.id))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another run of the same reminder committed first
+        db.rollback()
+
+@job("cleanup_expired_tokens", max_attempts=1)
+def cleanup_expired_tokens(db: Session, payload: dict):
+    """Drop blacklisted tokens that have expired anyway"""
+    from auth_utils import cleanup_expired_blacklisted_tokens
+
+    if not cleanup_expired_blacklisted_tokens(db):
+        raise RuntimeError("Could not delete expired blacklisted tokens")
+
+# Periodic tasks: run by the scheduler leader only, once cluster-wide. Run their
+# statements on the session (or db.connection()) so the task's timeout applies
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+@periodic("expire_blacklisted_tokens", interval=HOUR)
+def expire_blacklisted_tokens(db: Session):
+    enqueue(db, "cleanup_expired_tokens")
+
+@periodic("appointment_reminders", interval=DAY)
+def appointment_reminders(db: Session):
+    """Queue a reminder for every appointment booked for tomorrow"""
+    from models import Appointment, AppointmentStatus
+
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+    appointment_ids = db.query(Appointment.id).filter(
+        Appointment.appointment_date == tomorrow,
+        Appointment.status.in_([AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED])
+    ).all()
+    for appointment_id, in appointment_ids:
+        enqueue(db, "appointment_reminder", {"appointment_id": appointment_id, "day": today.isoformat()})
+
+@periodic("partition_maintenance", interval=DAY, timeout=900)
+def partition_maintenance(db: Session):
+    """Create upcoming monthly partitions and archive old ones (PostgreSQL only)"""
+    from partitioning import archive_partitions, ensure_partitions
+
+    ensure_partitions(db.connection())
+    archive_partitions(db.connection())
+
+@periodic("purge_idempotency_keys", interval=HOUR)
+def purge_idempotency_keys(db: Session):
+    from idempotency import IdempotencyStore
+
+    IdempotencyStore.purge_expired(db.connection(), time.time())
+
+@periodic("purge_rate_limit_buckets", interval=HOUR)
+def purge_rate_limit_buckets(db: Session):
+    from rate_limit import DatabaseRateLimitBackend
+
+    DatabaseRateLimitBackend.purge_idle(db.connection(), time.time())
+
+def main() -> int:
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subcommands.add_parser("worker", help="run jobs until SIGTERM/SIGINT")
+    worker_parser.add_argument("--concurrency", type=int, default=int(os.getenv('JOB_WORKER_CONCURRENCY', '4')))
+    worker_parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL)
+    worker_parser.add_argument("--name", action="append", help="only run these jobs (repeatable)")
+    worker_parser.add_argument("--metrics-port", type=int, help="serve /metrics on this port")
+    worker_parser.add_argument("--no-outbox-relay", action="store_true", help="do not publish outbox events")
+    worker_parser.add_argument("--no-scheduler", action="store_true", help="never run periodic tasks")
+    enqueue_parser = subcommands.add_parser("enqueue", help="queue one job")
+    enqueue_parser.add_argument("name")
+    enqueue_parser.add_argument("--payload", default="{}", help="JSON object")
+    subcommands.add_parser("stats", help="jobs by name and status")
+    retry_parser = subcommands.add_parser("retry-dead", help="queue dead jobs again")
+    retry_parser.add_argument("--name")
+    subcommands.add_parser("tasks", help="periodic tasks and their last run")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.command == "worker":
+        if args.metrics_port:
+            serve_metrics(args.metrics_port)
+        from database import SessionLocal
+        worker = Worker(engine, args.concurrency, args.poll_interval, args.name)
+        relay = None if args.no_outbox_relay else OutboxRelay(SessionLocal)
+        scheduler = None if args.no_scheduler else Scheduler(engine, SessionLocal)
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+        signal.signal(signal.SIGINT, lambda *_: stopped.set())
+        worker.start()
+        if relay:
+            relay.start()
+        if scheduler:
+            scheduler.start()
+        stopped.wait()
+        _logger.info("Stopping; waiting for running jobs to finish")
+        if scheduler:
+            scheduler.stop()
+        if relay:
+            relay.stop()
+        worker.stop()
+    elif args.command == "enqueue":
+        from database import SessionLocal
+        db = SessionLocal()
+        try:
+            job_row = enqueue(db, args.name, json.loads(args.payload))
+            db.commit()
+            print(f"Queued {args.name} #{job_row.id}")
+        finally:
+            db.close()
+    elif args.command == "stats":
+        for (name, status), count in sorted(JobQueue(engine).counts().items()):
+            print(f"{name:<32}{status:<10}{count:>8}")
+    elif args.command == "retry-dead":
+        print(f"Queued {JobQueue(engine).retry_dead(args.name)} dead jobs again")
+    elif args.command == "tasks":
+        from models import ScheduledTaskState
+        with engine.connect() as conn:
+            states = {row.name: row for row in conn.execute(select(ScheduledTaskState.__table__))}
+        for name in sorted(get_tasks()):
+            state = states.get(name)
+            next_run = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state.next_run_at)) if state else "-"
+            last = f"{state.last_status} in {state.last_duration:.2f}s" if state and state.last_status else "never run"
+            print(f"{name:<32}next {next_run:<22}{last}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
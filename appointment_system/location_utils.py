@@ -3,8 +3,14 @@ Database utilities for seeding location data (Divisions, Districts, Thanas)
 This includes the major administrative divisions of Bangladesh
 """
 
+from collections import defaultdict
 from sqlalchemy.orm import Session
+from cache_utils import LRUCache
 from models import Division, District, Thana
+import schemas
+
+# Location lists never change after seeding, so they are cached without a TTL
+location_cache = LRUCache("locations", maxsize=1024)
 
 # Bangladesh administrative data
 BANGLADESH_LOCATIONS = {
@@ -89,8 +95,7 @@ def seed_location_data(db: Session):
     """
     try:
         # Check if data already exists
-        existing_divisions = db.query(Division).count()
-        if existing_divisions > 0:
+        if db.query(Division.id).first() is not None:
             print("Location data already exists. Skipping seeding.")
             return
 
@@ -112,6 +117,7 @@ def seed_location_data(db: Session):
                     db.add(thana)
 
         db.commit()
+        location_cache.clear()
         print("Successfully seeded location data!")
 
     except Exception as e:
@@ -119,14 +125,46 @@ def seed_location_data(db: Session):
         print(f"Error seeding location data: {e}")
         raise
 
+def warm_location_cache(db: Session) -> int:
+    """Load every division, district and thana list into the cache with three queries"""
+    districts = defaultdict(list)
+    for district in db.query(District).order_by(District.id):
+        districts[district.division_id].append(schemas.District.model_validate(district))
+    thanas = defaultdict(list)
+    for thana in db.query(Thana).order_by(Thana.id):
+        thanas[thana.district_id].append(schemas.Thana.model_validate(thana))
+    divisions = [schemas.Division.model_validate(division) for division in db.query(Division).order_by(Division.id)]
+
+    location_cache.set(("divisions",), divisions)
+    for division in divisions:
+        location_cache.set(("districts", division.id), districts.get(division.id, []))
+    for district_list in districts.values():
+        for district in district_list:
+            location_cache.set(("thanas", district.id), thanas.get(district.id, []))
+    return len(location_cache)
+
 def get_districts_by_division(db: Session, division_id: int):
     """Get all districts for a specific division"""
-    return db.query(District).filter(District.division_id == division_id).all()
+    districts = location_cache.get(("districts", division_id))
+    if districts is None:
+        districts = [schemas.District.model_validate(district) for district in
+                     db.query(District).filter(District.division_id == division_id).all()]
+        location_cache.set(("districts", division_id), districts)
+    return districts
 
 def get_thanas_by_district(db: Session, district_id: int):
     """Get all thanas for a specific district"""
-    return db.query(Thana).filter(Thana.district_id == district_id).all()
+    thanas = location_cache.get(("thanas", district_id))
+    if thanas is None:
+        thanas = [schemas.Thana.model_validate(thana) for thana in
+                  db.query(Thana).filter(Thana.district_id == district_id).all()]
+        location_cache.set(("thanas", district_id), thanas)
+    return thanas
 
 def get_all_divisions(db: Session):
     """Get all divisions"""
-    return db.query(Division).all()
+    divisions = location_cache.get(("divisions",))
+    if divisions is None:
+        divisions = [schemas.Division.model_validate(division) for division in db.query(Division).all()]
+        location_cache.set(("divisions",), divisions)
+    return divisions
@@ -1,11 +1,25 @@
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from routers import auth, users, locations, general, doctors, appointments, admin, notifications
-from fastapi import FastAPI
+from routers import auth, users, locations, general, doctors, appointments, admin, notifications, metrics, health
+import logging
+import startup
+import jobs  # registers job handlers and outbox subscribers
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from fastapi.middleware.cors import CORSMiddleware
-import models
-from database import SessionLocal, engine
-from location_utils import seed_location_data
+from image_utils import shutdown_image_pool
+from job_queue import start_embedded_workers, stop_embedded_workers
+from outbox import start_embedded_relay, stop_embedded_relay
+from cache_bus import start_listener, stop_listener
+from scheduler import start_scheduler, stop_scheduler
+from assets import AssetStaticFiles, CompressionMiddleware
+from metrics import MetricsMiddleware, app_errors_total
+from sql_instrumentation import SQLStatsMiddleware
+from profiling import ProfilingMiddleware
+from admission import AdmissionMiddleware
+from idempotency import IdempotencyMiddleware
+from db_routing import ReadYourWritesMiddleware
+
+_logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Appointment System API",
@@ -13,7 +27,25 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
+# Innermost, so replayed responses still get CORS headers and compression
+app.add_middleware(IdempotencyMiddleware)
+
+# Keep a user's reads on the primary for a few seconds after their writes (replica routing)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Negotiated gzip for API and page responses
+app.add_middleware(CompressionMiddleware)
+
+# Per-request SQL query count/time headers and log line
+app.add_middleware(SQLStatsMiddleware)
+
+# Admin-triggered request profiling (X-Profile header or sampling rate)
+app.add_middleware(ProfilingMiddleware)
+
+# Queue or shed requests (503) before they do any work when the worker is saturated
+app.add_middleware(AdmissionMiddleware)
+
+# Outside admission control, so browsers can read the 503s it sheds
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
@@ -22,16 +54,15 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+# Added last so it wraps everything and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 from pathlib import Path
 
 # Get the directory of this file for proper path resolution
 BASE_DIR = Path(__file__).parent
 
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
+app.mount("/static", AssetStaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
 # Include routers with /api prefix for API endpoints
 app.include_router(auth.router, prefix="/api")
@@ -47,14 +78,46 @@ app.include_router(admin.router)
 # Include general router without prefix for serving HTML pages
 app.include_router(general.router)
 
+# Prometheus scrape endpoint
+app.include_router(metrics.router)
+
+# Liveness / readiness probes
+app.include_router(health.router)
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """No database connection became free in time: tell the client to retry instead of failing"""
+    app_errors_total.inc(source="db_pool_timeout")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database with location data on startup"""
-    db = SessionLocal()
+    """Create/verify the schema, seed location data and warm the pool and caches"""
     try:
-        seed_location_data(db)
+        startup.run_startup()
+        start_listener()
+        start_embedded_workers()
+        start_embedded_relay()
+        start_scheduler()
     except Exception as e:
-        print(f"Error during startup: {e}")
-    finally:
-        db.close()
+        app_errors_total.inc(source="startup")
+        _logger.exception(f"Error during startup: {e}")
+        if startup.PRODUCTION:
+            # Exit so the orchestrator restarts the container instead of keeping it unready
+            raise
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background worker pools"""
+    shutdown_image_pool()
+    stop_scheduler()
+    stop_embedded_relay()
+    stop_embedded_workers()
+    stop_listener()
@@ -0,0 +1,295 @@
+"""
+In-process metrics in the Prometheus text exposition format
+Request metrics are labelled by route template (e.g. /api/appointments/{appointment_id}),
+never by raw path, so the number of series stays bounded
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from starlette.routing import Match, Mount
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    """Base class: a named family of series keyed by label values"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """(suffix, label names, label values, value) for every series"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", self.labelnames, key, value) for key, value in self._values.items()]
+
+class Gauge(Metric):
+    """
+    Value that goes up and down
+    Pass a callback to compute the series at scrape time instead of storing them
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self._callback is not None:
+            values = self._callback()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [("", self.labelnames, key, value) for key, value in values.items()]
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+        samples = []
+        bucket_names = self.labelnames + ("le",)
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", bucket_names, key + (_format_value(bound),), cumulative))
+            samples.append(("_sum", self.labelnames, key, total))
+            samples.append(("_count", self.labelnames, key, cumulative))
+        return samples
+
+class Registry:
+    """All metrics of this process, rendered together on scrape"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+_registry = Registry()
+
+def get_registry() -> Registry:
+    return _registry
+
+def render_metrics() -> bytes:
+    """The whole registry in the Prometheus text format"""
+    return _registry.render()
+
+# HTTP request metrics
+
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests by route template and status code",
+    ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route")
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served",
+    ("method", "route")
+)
+
+# Application errors that are handled (and logged) instead of propagated
+app_errors_total = Counter("app_errors_total", "Handled application errors", ("source",))
+
+# Background jobs (image processing, queues, schedulers)
+
+background_job_lag_seconds = Histogram(
+    "background_job_lag_seconds", "Time between a job being queued and starting",
+    ("job",)
+)
+background_job_duration_seconds = Histogram(
+    "background_job_duration_seconds", "Time spent running a job",
+    ("job",)
+)
+background_job_last_run_timestamp = Gauge(
+    "background_job_last_run_timestamp_seconds", "Unix time a job last finished",
+    ("job",)
+)
+
+def observe_job(job: str, lag: float, duration: float):
+    """Record one finished background job"""
+    background_job_lag_seconds.observe(lag, job=job)
+    background_job_duration_seconds.observe(duration, job=job)
+    background_job_last_run_timestamp.set(time.time(), job=job)
+
+# Caches and the database pool are read at scrape time
+
+def _cache_series(field: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    def collect():
+        from cache_utils import all_caches
+        return {(name,): cache.stats()[field] for name, cache in all_caches().items()}
+    return collect
+
+def _cache_hit_ratio() -> Dict[Tuple[str, ...], float]:
+    from cache_utils import all_caches
+    ratios = {}
+    for name, cache in all_caches().items():
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratios[(name,)] = stats["hits"] / lookups if lookups else 0.0
+    return ratios
+
+Gauge("cache_hits", "Cache hits since start", ("cache",), callback=_cache_series("hits"))
+Gauge("cache_misses", "Cache misses since start", ("cache",), callback=_cache_series("misses"))
+Gauge("cache_entries", "Entries currently cached", ("cache",), callback=_cache_series("size"))
+Gauge("cache_hit_ratio", "Cache hits / lookups since start", ("cache",), callback=_cache_hit_ratio)
+
+def _pool_series(method: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    def collect():
+        from database import engine
+        reader = getattr(engine.pool, method, None)
+        return {(): reader()} if reader is not None else {}
+    return collect
+
+Gauge("db_pool_size", "Configured connection pool size", callback=_pool_series("size"))
+Gauge("db_pool_checked_out", "Connections currently in use", callback=_pool_series("checkedout"))
+Gauge("db_pool_checked_in", "Idle connections in the pool", callback=_pool_series("checkedin"))
+Gauge("db_pool_overflow", "Connections open beyond the pool size", callback=_pool_series("overflow"))
+
+def route_template(scope: Scope) -> str:
+    """
+    Route template of a request, e.g. /api/users/{user_id}
+    Matched against the app's routes up front so in-flight requests are labelled too
+    """
+    router = getattr(scope.get("app"), "router", None)
+    partial = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{route.path}/{{path}}" if isinstance(route, Mount) else route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path  # path matched, method did not (405)
+    return partial or "<unmatched>"
+
+class MetricsMiddleware:
+    """Record count, latency and in-flight requests per route template and status"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status_code = 500
+        started = time.perf_counter()
+        http_requests_in_progress.inc(method=method, route=route)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec(method=method, route=route)
+            http_requests_total.inc(method=method, route=route, status=str(status_code))
+            http_request_duration_seconds.observe(time.perf_counter() - started, method=method, route=route)
@@ -1,8 +1,9 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Enum, Float, Boolean, ForeignKey, DateTime, Text, Date, Time
+from sqlalchemy import Column, Integer, String, Enum, Float, Boolean, ForeignKey, DateTime, Text, Date, Time, Index, LargeBinary, JSON, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
+from partitioning import monthly_partitioned
 
 class UserType(str, enum.Enum):
     PATIENT = "PATIENT"
@@ -121,6 +122,25 @@ class Appointment(Base):
     patient = relationship("User", foreign_keys=[patient_id])
     doctor = relationship("DoctorProfile", foreign_keys=[doctor_id])
 
+    # One partition per month on PostgreSQL (see partitioning.py)
+    __table_args__ = monthly_partitioned('appointment_date')
+
+class AppointmentArchive(Base):
+    """Appointments of months moved out of the live table; read only by history queries"""
+    __tablename__ = 'appointments_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    patient_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    doctor_id = Column(Integer, ForeignKey('doctor_profiles.id'), nullable=False)
+    appointment_date = Column(Date, nullable=False)
+    appointment_time = Column(Time, nullable=False)
+    notes = Column(Text, nullable=True)
+    status = Column(Enum(AppointmentStatus))
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+
+    __table_args__ = monthly_partitioned('appointment_date')
+
 class Notification(Base):
     __tablename__ = 'notifications'
 
@@ -142,4 +162,153 @@ class TokenBlacklist(Base):
     expires_at = Column(DateTime(timezone=True), nullable=False)  # When the token would naturally expire
 
     # Relationship
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+class DoctorSearchEntry(Base):
+    """
+    Denormalized doctor directory row, kept in sync by DoctorSearchService
+    whenever a doctor, their user account or their timeslots change
+    """
+    __tablename__ = 'doctor_search'
+
+    doctor_id = Column(Integer, ForeignKey('doctor_profiles.id'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    full_name = Column(String, nullable=False)
+    name_key = Column(String, nullable=False)  # lower(full_name), for prefix search
+    license_number = Column(String, nullable=False)
+    experience_years = Column(Integer, nullable=False)
+    consultation_fee = Column(Float, nullable=False)
+    division_id = Column(Integer, nullable=False)
+    district_id = Column(Integer, nullable=False)
+    thana_id = Column(Integer, nullable=False)
+    division_name = Column(String, nullable=True)
+    district_name = Column(String, nullable=True)
+    thana_name = Column(String, nullable=True)
+    profile_image_filename = Column(String, nullable=True)
+    earliest_slot_start = Column(String, nullable=True)  # "HH:MM" of the earliest available daily slot
+
+    __table_args__ = (
+        Index('ix_doctor_search_division_fee', 'division_id', 'consultation_fee'),
+        Index('ix_doctor_search_district_fee', 'district_id', 'consultation_fee'),
+        Index('ix_doctor_search_thana_fee', 'thana_id', 'consultation_fee'),
+        Index('ix_doctor_search_fee', 'consultation_fee'),
+        Index('ix_doctor_search_experience', 'experience_years'),
+        Index('ix_doctor_search_earliest_slot', 'earliest_slot_start'),
+        Index('ix_doctor_search_name_key', 'name_key', postgresql_ops={'name_key': 'text_pattern_ops'}),
+    )
+
+class SchemaVersion(Base):
+    """
+    Fingerprint of the schema the database was last brought up to, so production
+    startup can skip create_all (and its per-table introspection) when nothing changed
+    """
+    __tablename__ = 'schema_version'
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RateLimitBucket(Base):
+    """Token bucket shared by all workers (RATE_LIMIT_BACKEND=database)"""
+    __tablename__ = 'rate_limit_buckets'
+
+    key = Column(String, primary_key=True)  # "<rule>:<identity kind>:<identity>"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)  # Unix time of the last refill
+    allowed = Column(Boolean, nullable=False)  # Outcome of the last hit
+
+class IdempotencyRecord(Base):
+    """First response to a request sent with an Idempotency-Key, replayed to retries until it expires"""
+    __tablename__ = 'idempotency_keys'
+
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    endpoint = Column(String, nullable=False)  # "POST /api/appointments/"
+    request_hash = Column(String(64), nullable=False)  # sha256 of the body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is running
+    content_type = Column(String, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    locked_at = Column(Float, nullable=False)  # Unix time the running request started
+    expires_at = Column(Float, nullable=False, index=True)
+
+class Job(Base):
+    """
+    Background job (see job_queue.py)
+    Succeeded jobs are deleted; jobs that used up their attempts stay as "dead"
+    """
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)  # Handler registered with @job
+    payload = Column(JSON, nullable=False)
+    status = Column(String(16), nullable=False, default='queued')  # queued, running or dead
+    priority = Column(Integer, nullable=False, default=0)  # lower runs first
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    locked_by = Column(String(100), nullable=True)  # "<host>:<pid>:<thread>"
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Only queued jobs are ever scanned by workers
+        Index('ix_jobs_ready', 'priority', 'run_at',
+              postgresql_where=text("status = 'queued'"), sqlite_where=text("status = 'queued'")),
+        Index('ix_jobs_status', 'status'),
+    )
+
+class AppointmentEvent(Base):
+    """Outbox row committed with the appointment change it describes (see outbox.py)"""
+    __tablename__ = 'appointment_events'
+
+    id = Column(Integer, primary_key=True)
+    appointment_id = Column(Integer, nullable=False)  # No foreign key: the appointment may be deleted first
+    event_type = Column(String(20), nullable=False)  # created, updated, confirmed, completed, cancelled, deleted
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)  # Failed relay attempts
+    dead = Column(Boolean, nullable=False, default=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AppointmentReminder(Base):
+    """Reminder notification sent for an appointment; one per appointment and day"""
+    __tablename__ = 'appointment_reminders'
+
+    appointment_id = Column(Integer, primary_key=True)  # No foreign key: the appointment may be deleted first
+    reminder_date = Column(Date, primary_key=True)
+    notification_id = Column(Integer, ForeignKey('notifications.id', ondelete='CASCADE'), nullable=False)
+
+class ScheduledTaskState(Base):
+    """When each periodic task (see scheduler.py) is next due, and how its last run went"""
+    __tablename__ = 'scheduled_tasks'
+
+    name = Column(String(100), primary_key=True)  # Task registered with @periodic
+    next_run_at = Column(Float, nullable=False)  # Unix time
+    last_started_at = Column(Float, nullable=True)
+    last_finished_at = Column(Float, nullable=True)
+    last_duration = Column(Float, nullable=True)  # Seconds
+    last_status = Column(String(16), nullable=True)  # succeeded or failed
+    last_error = Column(Text, nullable=True)
+
+class RequestProfileRecord(Base):
+    """Request profile (see profiling.py); the last PROFILE_HISTORY of all workers are kept"""
+    __tablename__ = 'request_profiles'
+
+    id = Column(Integer, primary_key=True)
+    method = Column(String(10), nullable=False)
+    path = Column(String, nullable=False)
+    trigger = Column(String(16), nullable=False)  # header or sample
+    pid = Column(Integer, nullable=False)  # Worker process that served the request
+    status_code = Column(Integer, nullable=True)
+    duration_ms = Column(Float, nullable=True)  # NULL while the request runs
+    samples = Column(Integer, nullable=False, default=0)
+    folded = Column(Text, nullable=False, default='')
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+class ProfilerSettings(Base):
+    """Sampling rate set on /admin/profiles, shared by every worker (a single row)"""
+    __tablename__ = 'profiler_settings'
+
+    id = Column(Integer, primary_key=True)
+    sample_rate = Column(Float, nullable=False)
@@ -1,9 +1,11 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy import and_, desc
 from typing import List
 from models import Notification, User
 from schemas import NotificationCreate, NotificationResponse, Notification as NotificationSchema
 from fastapi import HTTPException
+from serialization import rows_to_dicts
 
 class NotificationService:
 
@@ -50,44 +52,53 @@ class NotificationService:
 
             return NotificationSchema.from_orm(db_notification)
 
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
     @staticmethod
-    def get_user_notifications(
+    def get_user_notification_rows(
         db: Session,
         user_id: int,
         skip: int = 0,
         limit: int = 20,
         read_only: bool = True
-    ) -> List[NotificationResponse]:
-        """Get notifications for a specific user"""
+    ) -> List[dict]:
+        """Get notifications for a specific user as plain dicts (NotificationResponse fields)"""
         try:
-            query = db.query(Notification).join(User).filter(Notification.user_id == user_id)
+            query = db.query(
+                Notification.id,
+                Notification.user_id,
+                Notification.is_read,
+                Notification.created_at,
+                User.full_name.label('user_name'),
+                User.email.label('user_email')
+            ).join(User, Notification.user_id == User.id).filter(Notification.user_id == user_id)
 
             if read_only:
                 query = query.filter(Notification.is_read == True)
 
             notifications = query.order_by(desc(Notification.created_at)).offset(skip).limit(limit).all()
+            return rows_to_dicts(notifications)
 
-            # Convert to response format with user information
-            notification_responses = []
-            for notification in notifications:
-                response = NotificationResponse(
-                    id=notification.id,
-                    user_id=notification.user_id,
-                    is_read=notification.is_read,
-                    created_at=notification.created_at.isoformat(),
-                    user_name=notification.user.full_name,
-                    user_email=notification.user.email
-                )
-                notification_responses.append(response)
-
-            return notification_responses
-
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error fetching notifications: {str(e)}")
 
+    @staticmethod
+    def get_user_notifications(
+        db: Session,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 20,
+        read_only: bool = True
+    ) -> List[NotificationResponse]:
+        """Get notifications for a specific user"""
+        rows = NotificationService.get_user_notification_rows(db, user_id, skip, limit, read_only)
+        # Rows come straight from the database, so skip re-validation
+        return [NotificationResponse.model_construct(**row) for row in rows]
 
     @staticmethod
     def delete_notification(db: Session, notification_id: int, user_id: int) -> bool:
@@ -104,6 +115,8 @@ class NotificationService:
             db.commit()
             return True
 
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"Error deleting notification: {str(e)}")
@@ -117,5 +130,7 @@ class NotificationService:
             ).count()
             return count
 
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error counting notifications: {str(e)}")
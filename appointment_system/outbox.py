@@ -0,0 +1,183 @@
+"""
+Transactional outbox for appointment lifecycle events
+Appointment changes call record_event() before committing, so the event row
+commits (or rolls back) together with the change. A relay thread reads pending
+events in batches, runs the subscribers registered with @subscribe for each one
+and deletes it, all in one transaction; anything a subscriber writes (e.g. a
+job from enqueue()) commits with that delete, so delivery is at-least-once.
+
+Subscribers should be quick and idempotent and hand slow work to a job. An event
+whose subscribers fail is retried on later batches and kept as dead after
+OUTBOX_MAX_ATTEMPTS. Relays in several processes share the table with SKIP
+LOCKED, so events for one appointment are not guaranteed to be handled in order.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from metrics import Counter, Gauge, observe_job
+
+_logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '0.5'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+
+# Run a relay thread inside each app process (the job worker always runs one); off in production
+_PRODUCTION = os.getenv('APP_ENV', 'development').lower() == 'production'
+EMBEDDED_OUTBOX_RELAY = os.getenv('EMBEDDED_OUTBOX_RELAY', 'False' if _PRODUCTION else 'True').lower() == 'true'
+
+EVENT_TYPES = ("created", "updated", "confirmed", "completed", "cancelled", "deleted")
+
+outbox_events_total = Counter(
+    "outbox_events_total", "Outbox events handled by the relay, by event type and outcome",
+    ("event", "outcome")
+)
+
+_subscribers: Dict[str, List[Callable]] = defaultdict(list)
+
+def subscribe(*event_types: str):
+    """Decorator registering fn(db, event) for the given event types (default: all)"""
+    def register(fn: Callable):
+        for event_type in event_types or EVENT_TYPES:
+            _subscribers[event_type].append(fn)
+        return fn
+    return register
+
+def record_event(db: Session, appointment, event_type: str):
+    """Add an event for `appointment` (flushed, so it has an id) to the caller's transaction"""
+    from models import AppointmentEvent
+
+    db.add(AppointmentEvent(
+        appointment_id=appointment.id,
+        event_type=event_type,
+        payload={
+            "appointment_id": appointment.id,
+            "patient_id": appointment.patient_id,
+            "doctor_id": appointment.doctor_id,
+            "appointment_date": appointment.appointment_date.isoformat(),
+            "appointment_time": appointment.appointment_time.strftime("%H:%M"),
+            "status": appointment.status.value if appointment.status else None,
+        }
+    ))
+
+def _age(created_at: Optional[datetime]) -> float:
+    if created_at is None:
+        return 0.0
+    if created_at.tzinfo is None:
+        # SQLite hands back naive UTC timestamps
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - created_at).total_seconds())
+
+class OutboxRelay:
+    """Thread that publishes pending events to the subscribers in batches"""
+
+    def __init__(self, session_factory, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def relay_batch(self) -> int:
+        """Publish one batch; returns the number of events handled"""
+        from models import AppointmentEvent
+
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            events = db.execute(
+                select(AppointmentEvent).where(AppointmentEvent.dead == False)
+                .order_by(AppointmentEvent.id).limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not events:
+                return 0
+            lag = _age(events[0].created_at)
+
+            for event in events:
+                try:
+                    with db.begin_nested():
+                        for subscriber in _subscribers.get(event.event_type, ()):
+                            subscriber(db, event)
+                        db.delete(event)
+                    outbox_events_total.inc(event=event.event_type, outcome="published")
+                except Exception as e:
+                    event.attempts += 1
+                    event.last_error = f"{type(e).__name__}: {e}"[:4000]
+                    event.dead = event.attempts >= OUTBOX_MAX_ATTEMPTS
+                    outcome = "dead" if event.dead else "failed"
+                    outbox_events_total.inc(event=event.event_type, outcome=outcome)
+                    _logger.log(logging.ERROR if event.dead else logging.WARNING,
+                                f"Outbox event #{event.id} ({event.event_type}) {outcome}: {e}")
+            db.commit()
+            observe_job("outbox_relay", lag, time.perf_counter() - started)
+            return len(events)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                handled = self.relay_batch()
+            except SQLAlchemyError as e:
+                _logger.warning(f"Outbox relay failed: {e}")
+                handled = 0
+            # A full batch means more are probably waiting
+            if handled < self.batch_size:
+                self._stopping.wait(self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+def _pending_events() -> Dict[tuple, float]:
+    from database import engine
+    from models import AppointmentEvent
+
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(AppointmentEvent.dead, func.count()).group_by(AppointmentEvent.dead)
+            ).all()
+    except SQLAlchemyError:
+        return {}
+    return {("dead" if dead else "pending",): count for dead, count in rows}
+
+outbox_events = Gauge(
+    "outbox_events", "Unpublished outbox events by state (read at scrape time)",
+    ("state",), callback=_pending_events
+)
+
+_embedded_relay: Optional[OutboxRelay] = None
+
+def start_embedded_relay():
+    """Run a relay thread inside this (app) process when EMBEDDED_OUTBOX_RELAY is set"""
+    global _embedded_relay
+    if EMBEDDED_OUTBOX_RELAY and _embedded_relay is None:
+        from database import SessionLocal
+        _embedded_relay = OutboxRelay(SessionLocal)
+        _embedded_relay.start()
+
+def stop_embedded_relay(timeout: float = 30):
+    global _embedded_relay
+    if _embedded_relay is not None:
+        _embedded_relay.stop(timeout)
+        _embedded_relay = None
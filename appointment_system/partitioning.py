@@ -0,0 +1,249 @@
+"""
+Monthly range partitioning of appointments by appointment_date (PostgreSQL)
+  - appointments holds recent and upcoming months, one partition per month
+    (appointments_pYYYY_MM) plus appointments_default for dates no partition covers
+  - ensure_partitions() creates partitions PARTITION_MONTHS_AHEAD months ahead;
+    it runs on startup and should also run daily (python partitioning.py maintain)
+  - archive_partitions() detaches months older than ARCHIVE_AFTER_MONTHS and attaches
+    them to appointments_archive, which only history queries read. Both steps only
+    change catalog entries; no rows are copied.
+  - convert_to_partitioned() migrates an existing unpartitioned appointments table
+    (python partitioning.py convert, in a maintenance window)
+On other databases the tables are plain and these functions do nothing.
+
+Usage (from appointment_system/):
+    python partitioning.py maintain | archive | status | convert
+"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import PrimaryKeyConstraint, text
+from sqlalchemy.ext.compiler import compiles
+from database import begin
+
+_logger = logging.getLogger(__name__)
+
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', '12'))
+
+# DDL gives up instead of queueing behind long transactions (and blocking everyone queued after it)
+PARTITION_LOCK_TIMEOUT = os.getenv('PARTITION_LOCK_TIMEOUT', '5s')
+
+LIVE_TABLE = "appointments"
+ARCHIVE_TABLE = "appointments_archive"
+PARTITION_KEY = "appointment_date"
+
+def monthly_partitioned(column: str) -> dict:
+    """__table_args__ for a table range-partitioned on a date column (PostgreSQL only)"""
+    return {"postgresql_partition_by": f"RANGE ({column})", "info": {"partition_key": column}}
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _partitioned_primary_key(constraint, compiler, **kw):
+    """A partitioned table's primary key must include the partition key; the ORM still identifies rows by id"""
+    partition_key = constraint.table.info.get("partition_key")
+    if partition_key is None or not constraint.columns or partition_key in constraint.columns.keys():
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+
+    columns = [compiler.preparer.quote(column.name) for column in constraint.columns]
+    columns.append(compiler.preparer.quote(partition_key))
+    prefix = f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} " if constraint.name else ""
+    return f"{prefix}PRIMARY KEY ({', '.join(columns)})"
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{LIVE_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+def _is_postgresql(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+def _lock(conn):
+    """Serialize partition maintenance across workers and hosts, and bound lock waits"""
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('appointments_partitions'))"))
+    conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"
+    ), {"table": table}).scalar() or False
+
+def list_partitions(conn, table: str) -> Dict[str, Optional[Tuple[date, date]]]:
+    """Partition name -> (from, to) bounds; None for the default partition"""
+    rows = conn.execute(text("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.oid = to_regclass(:table)
+    """), {"table": table}).all()
+
+    partitions = {}
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            partitions[name] = None
+        else:
+            # FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')
+            lower, upper = bound.split("'")[1], bound.split("'")[3]
+            partitions[name] = (date.fromisoformat(lower), date.fromisoformat(upper))
+    return partitions
+
+def _create_partition(conn, month: date):
+    """
+    Attach a new month to appointments, moving in any rows the default partition
+    holds for it (ATTACH would fail while they are there)
+    """
+    name = partition_name(month)
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {LIVE_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {LIVE_TABLE}_default
+            WHERE {PARTITION_KEY} >= '{lower}' AND {PARTITION_KEY} < '{upper}'
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """))
+    # Indexes and foreign keys are cloned from the parent on attach
+    conn.execute(text(f"ALTER TABLE {LIVE_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+
+def ensure_partitions(bind, since: Optional[date] = None, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Create the default partition and every missing month from `since` (default:
+    this month) to `months_ahead` months ahead; returns the partitions created.
+    `bind` is an engine, or a connection whose transaction the caller commits
+    """
+    if not _is_postgresql(bind):
+        return []
+
+    created = []
+    with begin(bind) as conn:
+        if not is_partitioned(conn, LIVE_TABLE):
+            _logger.warning(f"{LIVE_TABLE} is not partitioned; run `python partitioning.py convert`")
+            return []
+        _lock(conn)
+
+        existing = list_partitions(conn, LIVE_TABLE)
+        archived = list_partitions(conn, ARCHIVE_TABLE) if is_partitioned(conn, ARCHIVE_TABLE) else {}
+        if f"{LIVE_TABLE}_default" not in existing:
+            conn.execute(text(f"CREATE TABLE {LIVE_TABLE}_default PARTITION OF {LIVE_TABLE} DEFAULT"))
+            created.append(f"{LIVE_TABLE}_default")
+
+        this_month = month_start(date.today())
+        month = month_start(since) if since else this_month
+        last = add_months(this_month, months_ahead)
+        while month <= last:
+            name = partition_name(month)
+            if name not in existing and name not in archived:
+                _create_partition(conn, month)
+                created.append(name)
+            month = add_months(month, 1)
+
+    if created:
+        _logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+def archive_partitions(bind, older_than_months: int = ARCHIVE_AFTER_MONTHS) -> List[str]:
+    """
+    Move whole months that ended more than `older_than_months` months ago from
+    appointments to appointments_archive; returns the partitions moved.
+    `bind` is an engine, or a connection whose transaction the caller commits
+    """
+    if not _is_postgresql(bind):
+        return []
+
+    cutoff = add_months(month_start(date.today()), -older_than_months)
+    moved = []
+    with begin(bind) as conn:
+        if not is_partitioned(conn, LIVE_TABLE) or not is_partitioned(conn, ARCHIVE_TABLE):
+            _logger.warning(f"{LIVE_TABLE} is not partitioned; nothing to archive")
+            return []
+        _lock(conn)
+
+        for name, bounds in sorted(list_partitions(conn, LIVE_TABLE).items()):
+            if bounds is None or bounds[1] > cutoff:
+                continue
+            lower, upper = bounds[0].isoformat(), bounds[1].isoformat()
+            conn.execute(text(f"ALTER TABLE {LIVE_TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"))
+            moved.append(name)
+
+    if moved:
+        _logger.info(f"Archived partitions: {', '.join(moved)}")
+    return moved
+
+def convert_to_partitioned(engine) -> int:
+    """
+    Replace an unpartitioned appointments table by a partitioned one holding the
+    same rows (copied month by month); returns the number of rows copied
+    Takes an exclusive lock on appointments for the whole copy
+    """
+    import models
+
+    if not _is_postgresql(engine):
+        raise RuntimeError("Partitioning needs PostgreSQL")
+
+    with engine.begin() as conn:
+        if is_partitioned(conn, LIVE_TABLE):
+            return 0
+        legacy = f"{LIVE_TABLE}_unpartitioned"
+        conn.execute(text(f"LOCK TABLE {LIVE_TABLE} IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"ALTER TABLE {LIVE_TABLE} RENAME TO {legacy}"))
+        # Index names are schema-wide; free them for the new table
+        for (index,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": legacy}):
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index}_unpartitioned"'))
+
+        models.Appointment.__table__.create(bind=conn, checkfirst=True)
+        models.AppointmentArchive.__table__.create(bind=conn, checkfirst=True)
+        conn.execute(text(f"CREATE TABLE {LIVE_TABLE}_default PARTITION OF {LIVE_TABLE} DEFAULT"))
+
+        first = conn.execute(text(f"SELECT MIN({PARTITION_KEY}) FROM {legacy}")).scalar()
+        last = conn.execute(text(f"SELECT MAX({PARTITION_KEY}) FROM {legacy}")).scalar()
+        month = month_start(first or date.today())
+        end = max(month_start(last or date.today()), add_months(month_start(date.today()), PARTITION_MONTHS_AHEAD))
+        while month <= end:
+            conn.execute(text(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF {LIVE_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            month = add_months(month, 1)
+
+        columns = ", ".join(column.name for column in models.Appointment.__table__.columns)
+        copied = conn.execute(text(f"INSERT INTO {LIVE_TABLE} ({columns}) SELECT {columns} FROM {legacy}")).rowcount
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{LIVE_TABLE}', 'id'), COALESCE((SELECT MAX(id) FROM {legacy}), 1))"
+        ))
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    return copied
+
+def main() -> int:
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("maintain", "archive", "status", "convert"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "convert":
+        print(f"Copied {convert_to_partitioned(engine)} appointments into the partitioned table")
+    if args.command in ("maintain", "convert"):
+        ensure_partitions(engine)
+    if args.command in ("maintain", "archive"):
+        archive_partitions(engine)
+    if args.command == "status" and _is_postgresql(engine):
+        with engine.connect() as conn:
+            for table in (LIVE_TABLE, ARCHIVE_TABLE):
+                for name, bounds in sorted(list_partitions(conn, table).items()):
+                    print(f"{table:<22}{name:<28}{'DEFAULT' if bounds is None else f'{bounds[0]} .. {bounds[1]}'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
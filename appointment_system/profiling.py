@@ -0,0 +1,371 @@
+"""
+On-demand request profiling for admins
+A request is profiled when an admin sends `X-Profile: 1`, or when it is picked
+by the sampling rate an admin sets in the panel. A sampling profiler records
+folded stacks (`frame;frame;frame count`), which flamegraph.pl and
+speedscope read directly. With no header and a zero sampling rate the
+middleware only does one header lookup (and a cache read) per request.
+
+Profiles and the sampling rate are kept in the database, so the panel shows
+the last PROFILE_HISTORY profiles of every worker process and a new rate
+reaches all of them: each worker caches the rate, and changing it evicts that
+cache everywhere through the cache bus (or, without PostgreSQL, after
+PROFILE_SETTINGS_TTL seconds).
+"""
+
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from cache_bus import publish, track
+from cache_utils import LRUCache
+
+_logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+# Seconds between stack samples
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+
+# Profiles kept (for all worker processes together)
+PROFILE_HISTORY = int(os.getenv('PROFILE_HISTORY', '20'))
+
+# Sampling rate until an admin sets one
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+
+# How long a worker uses its cached sampling rate when no cache bus evicts it
+PROFILE_SETTINGS_TTL = float(os.getenv('PROFILE_SETTINGS_TTL', '30'))
+
+# Frames where a thread is idle (waiting for work or I/O readiness); such samples are dropped
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+# The profile of the request running in this context; threadpool calls run in a copy of it
+_profiled_request: contextvars.ContextVar = contextvars.ContextVar("profiled_request", default=None)
+
+class StackSampler:
+    """
+    Samples, from a background thread, the stacks of the threads working on one request:
+    the event loop while it runs the request's coroutines, and threadpool threads
+    while they run its sync endpoints and dependencies (each stack is rooted at its
+    thread name). Other requests running concurrently are left out.
+    """
+
+    def __init__(self, target: object, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.target = target
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def _belongs_to_target(self, frame) -> bool:
+        while frame is not None:
+            code = frame.f_code
+            if code is ProfilingMiddleware.__call__.__code__:
+                if frame.f_locals.get("profile") is self.target:
+                    return True
+            elif "context" in code.co_varnames:
+                # Worker threads run each call in the context copied from the request
+                context = frame.f_locals.get("context")
+                if isinstance(context, contextvars.Context) and context.get(_profiled_request) is self.target:
+                    return True
+            frame = frame.f_back
+        return False
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if leaf in IDLE_FRAMES or not self._belongs_to_target(frame):
+                continue
+
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame))
+                frame = frame.f_back
+            names.append(thread_names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """Stacks in the folded format, heaviest first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+class RequestProfile:
+    """A finished profile and what was requested"""
+
+    def __init__(self, profile_id: int, method: str, path: str, trigger: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.pid = os.getpid()
+        self.created_at = datetime.now(timezone.utc)
+        self.status_code: Optional[int] = None
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.folded = ""
+
+    @classmethod
+    def from_record(cls, record) -> "RequestProfile":
+        profile = cls(record.id, record.method, record.path, record.trigger)
+        profile.pid = record.pid
+        # SQLite hands back naive UTC timestamps
+        profile.created_at = record.created_at if record.created_at.tzinfo else record.created_at.replace(tzinfo=timezone.utc)
+        profile.status_code = record.status_code
+        profile.duration_ms = record.duration_ms
+        profile.samples = record.samples
+        profile.folded = record.folded
+        return profile
+
+    def top_frames(self, limit: int = 10) -> List[tuple]:
+        """Leaf frames with the most samples (self time)"""
+        leaves: Counter = Counter()
+        for line in self.folded.splitlines():
+            stack, _, count = line.rpartition(" ")
+            leaves[stack.rsplit(";", 1)[-1]] += int(count)
+        return leaves.most_common(limit)
+
+profiler_settings_cache = track(LRUCache("profiler_settings", maxsize=1, ttl=PROFILE_SETTINGS_TTL))
+
+class ProfileStore:
+    """
+    The last PROFILE_HISTORY profiles and the sampling rate, shared by all workers
+    Every method blocks on the database; call them from the threadpool
+    """
+
+    def __init__(self, session_factory=None, maxlen: int = PROFILE_HISTORY):
+        self._session_factory = session_factory
+        self.maxlen = maxlen
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory
+
+    def cached_sample_rate(self) -> Optional[float]:
+        """This worker's copy of the sampling rate, None when it has to be loaded"""
+        return profiler_settings_cache.get("sample_rate")
+
+    def load_sample_rate(self) -> float:
+        from models import ProfilerSettings
+
+        generation = profiler_settings_cache.generation
+        db = self.session_factory()
+        try:
+            settings = db.get(ProfilerSettings, 1)
+            sample_rate = settings.sample_rate if settings else PROFILE_SAMPLE_RATE
+        except SQLAlchemyError as e:
+            # Retried after PROFILE_SETTINGS_TTL rather than on every request
+            _logger.warning(f"Could not load the profiling sample rate: {e}")
+            sample_rate = 0.0
+        finally:
+            db.close()
+        profiler_settings_cache.set("sample_rate", sample_rate, generation)
+        return sample_rate
+
+    def set_sample_rate(self, sample_rate: float):
+        from models import ProfilerSettings
+
+        db = self.session_factory()
+        try:
+            settings = db.get(ProfilerSettings, 1)
+            if settings is None:
+                db.add(ProfilerSettings(id=1, sample_rate=sample_rate))
+            else:
+                settings.sample_rate = sample_rate
+            publish(db, profiler_settings_cache.name, "sample_rate")
+            db.commit()
+        finally:
+            db.close()
+
+    def new_profile(self, method: str, path: str, trigger: str) -> RequestProfile:
+        """Record the start of a profile, which gives it its id"""
+        from models import RequestProfileRecord
+
+        profile = RequestProfile(None, method, path, trigger)
+        db = self.session_factory()
+        try:
+            record = RequestProfileRecord(
+                method=method, path=path[:2000], trigger=trigger, pid=profile.pid, created_at=profile.created_at
+            )
+            db.add(record)
+            db.commit()
+            profile.id = record.id
+        finally:
+            db.close()
+        return profile
+
+    def add(self, profile: RequestProfile):
+        """Store a finished profile and drop those beyond the last maxlen"""
+        from models import RequestProfileRecord
+
+        table = RequestProfileRecord.__table__
+        db = self.session_factory()
+        try:
+            db.execute(update(table).where(table.c.id == profile.id).values(
+                status_code=profile.status_code, duration_ms=profile.duration_ms,
+                samples=profile.samples, folded=profile.folded
+            ))
+            oldest_kept = db.execute(
+                select(table.c.id).order_by(table.c.id.desc()).offset(self.maxlen - 1).limit(1)
+            ).scalar()
+            if oldest_kept is not None:
+                db.execute(delete(table).where(table.c.id < oldest_kept))
+            db.commit()
+        finally:
+            db.close()
+
+    def list(self) -> List[RequestProfile]:
+        """Finished profiles, newest first"""
+        from models import RequestProfileRecord
+
+        db = self.session_factory()
+        try:
+            records = db.query(RequestProfileRecord).filter(
+                RequestProfileRecord.duration_ms.isnot(None)
+            ).order_by(RequestProfileRecord.id.desc()).limit(self.maxlen).all()
+            return [RequestProfile.from_record(record) for record in records]
+        finally:
+            db.close()
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        from models import RequestProfileRecord
+
+        db = self.session_factory()
+        try:
+            record = db.get(RequestProfileRecord, profile_id)
+            return RequestProfile.from_record(record) if record is not None and record.duration_ms is not None else None
+        finally:
+            db.close()
+
+    def clear(self):
+        from models import RequestProfileRecord
+
+        db = self.session_factory()
+        try:
+            db.execute(delete(RequestProfileRecord.__table__))
+            db.commit()
+        finally:
+            db.close()
+
+profile_store = ProfileStore()
+
+def _is_admin_request(headers: Headers) -> bool:
+    """Header-triggered profiling is only honoured for admin credentials (bearer token or admin cookie)"""
+    from auth_utils import get_current_user_from_token
+    from database import SessionLocal
+    from models import UserType
+
+    token = None
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    else:
+        for cookie in headers.get("cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "admin_token":
+                token = value
+    if not token:
+        return False
+
+    db = SessionLocal()
+    try:
+        user = get_current_user_from_token(token, db)
+        return user is not None and user.user_type == UserType.ADMIN
+    finally:
+        db.close()
+
+class ProfilingMiddleware:
+    """Profile requests selected by admin header or sampling rate"""
+
+    def __init__(self, app: ASGIApp, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trigger = None
+        sample_rate = self.store.cached_sample_rate()
+        if sample_rate is None:
+            sample_rate = await run_in_threadpool(self.store.load_sample_rate)
+        if sample_rate and random.random() < sample_rate:
+            trigger = "sample"
+        else:
+            headers = Headers(scope=scope)
+            if headers.get(PROFILE_HEADER) and await run_in_threadpool(_is_admin_request, headers):
+                trigger = "header"
+
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            profile = await run_in_threadpool(self.store.new_profile, scope["method"], scope["path"], trigger)
+        except SQLAlchemyError as e:
+            _logger.warning(f"Could not start a profile, serving the request unprofiled: {e}")
+            await self.app(scope, receive, send)
+            return
+        sampler = StackSampler(profile)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = str(profile.id)
+            await send(message)
+
+        started = time.perf_counter()
+        token = _profiled_request.set(profile)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            _profiled_request.reset(token)
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            profile.samples = sampler.samples
+            profile.folded = sampler.folded()
+            try:
+                await run_in_threadpool(self.store.add, profile)
+            except SQLAlchemyError as e:
+                _logger.warning(f"Could not store profile #{profile.id}: {e}")
@@ -0,0 +1,222 @@
+"""
+Token-bucket rate limiting for expensive endpoints (login, signup, booking)
+Select the backend with RATE_LIMIT_BACKEND=memory (per worker process, the
+default outside production) or database (one bucket table shared by all workers
+and hosts, the default with APP_ENV=production, where every gunicorn worker
+would otherwise allow the full limit). The database backend blocks on a query,
+so async endpoints call check_rate_limit through run_in_threadpool.
+
+Limits are "<requests>/<second|minute|hour>" and can be overridden per rule and
+identity kind, e.g. RATE_LIMIT_LOGIN_EMAIL=10/minute
+"""
+
+import logging
+import math
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from sqlalchemy import case, delete
+from sqlalchemy.exc import SQLAlchemyError
+from cache_utils import LRUCache
+from metrics import Counter
+
+_logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+
+_PRODUCTION = os.getenv('APP_ENV', 'development').lower() == 'production'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'database' if _PRODUCTION else 'memory')
+
+# Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv('RATE_LIMIT_TRUST_FORWARDED', 'False').lower() == 'true'
+
+rate_limit_requests_total = Counter(
+    "rate_limit_requests_total", "Rate-limited requests by rule, identity kind and outcome",
+    ("rule", "identity", "outcome")
+)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+class RateLimit:
+    """A bucket that holds `capacity` requests and refills completely every `period` seconds"""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period  # tokens per second
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        count, _, unit = value.partition("/")
+        return cls(int(count), _PERIODS[unit.strip().rstrip("s")])
+
+    def __repr__(self):
+        return f"RateLimit({self.capacity}/{self.period}s)"
+
+# rule -> identity kind -> default limit
+DEFAULT_LIMITS: Dict[str, Dict[str, str]] = {
+    "login": {"ip": "20/minute", "email": "5/minute"},
+    "admin_login": {"ip": "10/minute", "email": "5/minute"},
+    "signup": {"ip": "5/minute"},
+    "booking": {"ip": "30/minute", "user": "10/minute"},
+}
+
+@lru_cache(maxsize=None)
+def get_limit(rule: str, identity: str) -> RateLimit:
+    default = DEFAULT_LIMITS[rule][identity]
+    return RateLimit.parse(os.getenv(f"RATE_LIMIT_{rule.upper()}_{identity.upper()}", default))
+
+def _refill(tokens: float, elapsed: float, limit: RateLimit) -> float:
+    return min(limit.capacity, tokens + elapsed * limit.rate)
+
+class RateLimitBackend:
+    """
+    Base class for bucket storage
+    hit() takes one token if available and returns (allowed, tokens left)
+    """
+
+    def hit(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in this process; the least recently used are dropped beyond maxsize"""
+
+    def __init__(self, maxsize: int = 100000):
+        self._buckets = LRUCache("rate_limit_buckets", maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+            tokens = _refill(tokens, now - updated_at, limit)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets.set(key, (tokens, now))
+        return allowed, tokens
+
+class DatabaseRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in the rate_limit_buckets table, refilled and taken in one atomic upsert
+    Buckets idle for a day are purged now and then
+    """
+
+    PURGE_PROBABILITY = 0.001
+    PURGE_AFTER = 86400
+
+    def __init__(self, engine):
+        self.engine = engine
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    def hit(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        from models import RateLimitBucket
+
+        table = RateLimitBucket.__table__
+        statement = self._insert(table).values(key=key, tokens=limit.capacity - 1, updated_at=now, allowed=True)
+        # SET expressions see the row as it was before the update
+        refilled = table.c.tokens + (now - table.c.updated_at) * limit.rate
+        refilled = case((refilled > limit.capacity, limit.capacity), else_=refilled)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "tokens": case((refilled >= 1, refilled - 1), else_=refilled),
+                "updated_at": now,
+                "allowed": refilled >= 1,
+            }
+        ).returning(table.c.allowed, table.c.tokens)
+
+        with self.engine.begin() as conn:
+            allowed, tokens = conn.execute(statement).one()
+            if random.random() < self.PURGE_PROBABILITY:
+                self.purge_idle(conn, now)
+        return allowed, tokens
+
+    @classmethod
+    def purge_idle(cls, conn, now: float) -> int:
+        """Delete buckets idle for PURGE_AFTER seconds (they would be full again anyway), in the connection's transaction"""
+        from models import RateLimitBucket
+
+        table = RateLimitBucket.__table__
+        return conn.execute(delete(table).where(table.c.updated_at < now - cls.PURGE_AFTER)).rowcount
+
+def create_backend() -> RateLimitBackend:
+    """Build the backend configured by environment variables"""
+    if RATE_LIMIT_BACKEND == "memory":
+        if _PRODUCTION:
+            _logger.warning("RATE_LIMIT_BACKEND=memory keeps buckets per worker: each allows the full limit")
+        return MemoryRateLimitBackend()
+
+    if RATE_LIMIT_BACKEND == "database":
+        from database import engine
+        return DatabaseRateLimitBackend(engine)
+
+    raise RuntimeError(f"Unknown rate limit backend: {RATE_LIMIT_BACKEND}")
+
+_backend: Optional[RateLimitBackend] = None
+
+def get_backend() -> RateLimitBackend:
+    """Get the process-wide rate limit backend"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+def set_backend(backend: Optional[RateLimitBackend]):
+    """Replace the process-wide rate limit backend"""
+    global _backend
+    _backend = backend
+
+class RateLimitExceeded(HTTPException):
+    """429 with Retry-After"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please try again later",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.retry_after = retry_after
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def check_rate_limit(rule: str, **identities: Optional[str]):
+    """
+    Take a token from the rule's bucket for every identity given (ip=..., email=..., user=...)
+    Raises RateLimitExceeded when any bucket is empty; fails open if the backend errors
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    backend = get_backend()
+    now = time.time()
+    retry_after = 0
+    for kind, identity in identities.items():
+        if identity is None:
+            continue
+        limit = get_limit(rule, kind)
+        try:
+            allowed, tokens = backend.hit(f"{rule}:{kind}:{str(identity).lower()}", limit, now)
+        except SQLAlchemyError as e:
+            rate_limit_requests_total.inc(rule=rule, identity=kind, outcome="error")
+            _logger.warning(f"Rate limit backend failed, allowing request: {e}")
+            continue
+
+        rate_limit_requests_total.inc(rule=rule, identity=kind, outcome="allowed" if allowed else "limited")
+        if not allowed:
+            retry_after = max(retry_after, math.ceil((1 - tokens) / limit.rate))
+
+    if retry_after:
+        raise RateLimitExceeded(retry_after)
@@ -1,16 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy import and_, extract, func, or_
 from database import get_db
+from db_routing import get_read_db
+from templating import templates
 import models
 from auth_utils import verify_password, create_access_token, get_current_user_from_token
+from doctor_search_service import DoctorSearchService
+from metrics import app_errors_total
+from profiling import PROFILE_HISTORY, profile_store
+from rate_limit import RateLimitExceeded, check_rate_limit, client_ip
+from outbox import record_event
+from cache_bus import publish
 from datetime import datetime
 from typing import Optional
+import logging
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
+
+_logger = logging.getLogger(__name__)
 
 def get_admin_user(request: Request, db: Session = Depends(get_db)):
     """Get admin user from cookie or redirect to login"""
@@ -53,6 +64,14 @@ async def admin_login(
     db: Session = Depends(get_db)
 ):
     """Admin login endpoint"""
+    try:
+        await run_in_threadpool(check_rate_limit, "admin_login", ip=client_ip(request), email=email)
+    except RateLimitExceeded as e:
+        return templates.TemplateResponse("admin_login.html", {
+            "request": request,
+            "error": "Too many login attempts, please try again later"
+        }, status_code=e.status_code, headers=e.headers)
+
     # Find user by email
     user = db.query(models.User).filter(models.User.email == email).first()
 
@@ -102,7 +121,7 @@ async def admin_dashboard(request: Request, db: Session = Depends(get_db)):
 @router.get("/admin/appointments", response_class=HTMLResponse)
 async def admin_appointments(
     request: Request,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(require_admin_cookie)
 ):
     """View all appointments"""
@@ -132,8 +151,12 @@ async def update_appointment_status(
     # Validate status
     try:
         appointment_status = models.AppointmentStatus(status)
+        changed = appointment_status != appointment.status
         appointment.status = appointment_status
         appointment.updated_at = datetime.utcnow()
+        if changed:
+            event_type = "updated" if appointment_status == models.AppointmentStatus.PENDING else appointment_status.value.lower()
+            record_event(db, appointment, event_type)
         db.commit()
         return RedirectResponse(url="/admin/appointments", status_code=303)
     except ValueError:
@@ -150,6 +173,7 @@ async def delete_appointment(
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
+    record_event(db, appointment, "deleted")
     db.delete(appointment)
     db.commit()
     return RedirectResponse(url="/admin/appointments", status_code=303)
@@ -214,6 +238,8 @@ async def create_appointment(
         )
 
         db.add(appointment)
+        db.flush()
+        record_event(db, appointment, "created")
         db.commit()
         return RedirectResponse(url="/admin/appointments", status_code=303)
 
@@ -371,10 +397,16 @@ async def create_doctor(
             )
             db.add(timeslot)
 
+        db.flush()
+        DoctorSearchService.refresh_doctor(db, doctor_profile.id)
+        publish(db, "doctor_timeslots", doctor_profile.id)
+
         db.commit()
 
         return RedirectResponse(url="/admin/doctors", status_code=303)
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create doctor: {str(e)}")
@@ -423,6 +455,9 @@ async def delete_doctor(
         appointments_deleted = db.query(models.Appointment).filter(
             models.Appointment.doctor_id == doctor_id
         ).delete(synchronize_session=False)
+        db.query(models.AppointmentArchive).filter(
+            models.AppointmentArchive.doctor_id == doctor_id
+        ).delete(synchronize_session=False)
 
         # 3. Delete notifications for this user
         notifications_deleted = db.query(models.Notification).filter(
@@ -434,21 +469,31 @@ async def delete_doctor(
             models.TokenBlacklist.user_id == user_id
         ).delete(synchronize_session=False)
 
-        # 5. Delete doctor profile
+        # 5. Remove doctor from the search directory
+        DoctorSearchService.remove_doctor(db, doctor_id)
+
+        # 6. Delete doctor profile
         db.delete(doctor)
 
-        # 6. Finally delete the user
+        # 7. Finally delete the user
         db.delete(user)
 
+        # 8. Evict the doctor from every worker's caches once this commits
+        publish(db, "doctor_timeslots", doctor_id)
+        publish(db, "profile_image_filenames", user_id)
+
         # Commit all changes
         db.commit()
 
         return RedirectResponse(url="/admin/doctors", status_code=303)
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         db.rollback()
         # Log the error for debugging
-        print(f"Error deleting doctor {doctor_id}: {str(e)}")
+        app_errors_total.inc(source="admin.delete_doctor")
+        _logger.exception(f"Error deleting doctor {doctor_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete doctor: {str(e)}")
 
 @router.get("/admin/doctors/{doctor_id}/edit", response_class=HTMLResponse)
@@ -538,9 +583,14 @@ async def edit_doctor(
         doctor.experience_years = experience_years
         doctor.consultation_fee = consultation_fee
 
+        db.flush()
+        DoctorSearchService.refresh_doctor(db, doctor_id)
+
         db.commit()
         return RedirectResponse(url="/admin/doctors", status_code=303)
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to update doctor")
@@ -568,7 +618,7 @@ async def get_admin_stats(
     }
 
 @router.get("/admin/monthly-report", response_class=HTMLResponse)
-async def admin_monthly_report(request: Request, db: Session = Depends(get_db)):
+async def admin_monthly_report(request: Request, db: Session = Depends(get_read_db)):
     """Generate a monthly report for all doctors (admin only)"""
     user = get_admin_user(request, db)
     if not user:
@@ -622,4 +672,63 @@ async def admin_monthly_report(request: Request, db: Session = Depends(get_db)):
         "user": user,
         "report_data": report_data,
         "summary": summary
-    })
\ No newline at end of file
+    })
+
+# Request Profiles
+@router.get("/admin/profiles", response_class=HTMLResponse)
+async def admin_profiles(request: Request, db: Session = Depends(get_db)):
+    """Recent request profiles and the sampling rate"""
+    user = get_admin_user(request, db)
+    if not user:
+        return RedirectResponse(url="/admin/login", status_code=303)
+
+    return templates.TemplateResponse("admin_profiles.html", {
+        "request": request,
+        "user": user,
+        "profiles": await run_in_threadpool(profile_store.list),
+        "sample_rate": await run_in_threadpool(profile_store.load_sample_rate),
+        "history": PROFILE_HISTORY
+    })
+
+@router.get("/admin/profiles/{profile_id}.folded")
+async def download_profile(profile_id: int, request: Request, db: Session = Depends(get_db)):
+    """Folded stacks of a profile, for flamegraph.pl or speedscope"""
+    user = get_admin_user(request, db)
+    if not user:
+        return RedirectResponse(url="/admin/login", status_code=303)
+
+    profile = await run_in_threadpool(profile_store.get, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return PlainTextResponse(profile.folded, headers={
+        "Content-Disposition": f'attachment; filename="profile-{profile.id}.folded"'
+    })
+
+@router.post("/admin/profiles/settings")
+async def update_profile_settings(
+    request: Request,
+    sample_rate: float = Form(...),
+    db: Session = Depends(get_db)
+):
+    """Set the fraction of requests profiled automatically (0 disables sampling)"""
+    user = get_admin_user(request, db)
+    if not user:
+        return RedirectResponse(url="/admin/login", status_code=303)
+
+    if not 0 <= sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="Sampling rate must be between 0 and 1")
+
+    await run_in_threadpool(profile_store.set_sample_rate, sample_rate)
+    _logger.info("Profiling sample rate set to %s by %s", sample_rate, user.email)
+    return RedirectResponse(url="/admin/profiles", status_code=303)
+
+@router.post("/admin/profiles/clear")
+async def clear_profiles(request: Request, db: Session = Depends(get_db)):
+    """Drop all recorded profiles"""
+    user = get_admin_user(request, db)
+    if not user:
+        return RedirectResponse(url="/admin/login", status_code=303)
+
+    await run_in_threadpool(profile_store.clear)
+    return RedirectResponse(url="/admin/profiles", status_code=303)
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from typing import List, Optional
 from datetime import date
 from database import SessionLocal
+from db_routing import get_read_db
 from schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse
 from models import AppointmentStatus
 from appointment_service import AppointmentService
-from notification_service import NotificationService
 from auth_utils import get_current_user
+from serialization import FastJSONResponse
 from models import User
+from rate_limit import check_rate_limit, client_ip
 
 router = APIRouter(
     prefix="/appointments",
@@ -25,12 +29,14 @@ def get_db():
 @router.post("/", response_model=AppointmentResponse, status_code=status.HTTP_201_CREATED)
 async def create_appointment(
     appointment: AppointmentCreate,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Create a new appointment (patients only)
     """
+    await run_in_threadpool(check_rate_limit, "booking", ip=client_ip(request), user=current_user.id)
     if current_user.user_type != "PATIENT":
         raise HTTPException(
             status_code=403,
@@ -40,15 +46,8 @@ async def create_appointment(
         created_appointment = AppointmentService.create_appointment(
             db, appointment, current_user.id
         )
-        if created_appointment:
-            created_notification = NotificationService.create_notification(
-                db, created_appointment
-            )
-        if not created_notification:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to create appointment notification"
-            )
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -56,7 +55,10 @@ async def create_appointment(
         )
 
     # Return the appointment with full details
-    return AppointmentService.get_appointment_by_id(db, created_appointment.id)
+    return FastJSONResponse(
+        AppointmentService.get_appointment_row(db, created_appointment.id),
+        status_code=status.HTTP_201_CREATED
+    )
 
 @router.get("/", response_model=List[AppointmentResponse])
 async def get_appointments(
@@ -65,6 +67,7 @@ async def get_appointments(
     status: Optional[AppointmentStatus] = None,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
+    history: bool = Query(False, description="Also search archived (old) appointments"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -83,7 +86,7 @@ async def get_appointments(
         doctor_user_id = current_user.id
     # Admins can see all appointments (no filtering)
 
-    return AppointmentService.get_appointments(
+    return FastJSONResponse(AppointmentService.get_appointment_rows(
         db=db,
         skip=skip,
         limit=limit,
@@ -91,12 +94,14 @@ async def get_appointments(
         doctor_user_id=doctor_user_id,
         status=status,
         date_from=date_from,
-        date_to=date_to
-    )
+        date_to=date_to,
+        history=history
+    ))
 
 @router.get("/{appointment_id}", response_model=AppointmentResponse)
 async def get_appointment(
     appointment_id: int,
+    history: bool = Query(False, description="Also search archived (old) appointments"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -106,7 +111,7 @@ async def get_appointment(
     # For non-admins, check if they have access to this appointment
     user_id = None if current_user.user_type == "ADMIN" else current_user.id
 
-    return AppointmentService.get_appointment_by_id(db, appointment_id, user_id)
+    return FastJSONResponse(AppointmentService.get_appointment_row(db, appointment_id, user_id, history))
 
 @router.put("/{appointment_id}", response_model=AppointmentResponse)
 async def update_appointment(
@@ -125,7 +130,7 @@ async def update_appointment(
         db, appointment_id, appointment_update, current_user.id
     )
 
-    return AppointmentService.get_appointment_by_id(db, updated_appointment.id)
+    return FastJSONResponse(AppointmentService.get_appointment_row(db, updated_appointment.id))
 
 @router.delete("/{appointment_id}")
 async def cancel_appointment(
@@ -176,7 +181,7 @@ async def confirm_appointment(
         db, appointment_id, appointment_update, current_user.id
     )
 
-    return AppointmentService.get_appointment_by_id(db, updated_appointment.id)
+    return FastJSONResponse(AppointmentService.get_appointment_row(db, updated_appointment.id))
 
 @router.post("/{appointment_id}/complete")
 async def complete_appointment(
@@ -198,12 +203,12 @@ async def complete_appointment(
         db, appointment_id, appointment_update, current_user.id
     )
 
-    return AppointmentService.get_appointment_by_id(db, updated_appointment.id)
+    return FastJSONResponse(AppointmentService.get_appointment_row(db, updated_appointment.id))
 
 # Statistics endpoints
 @router.get("/stats/summary")
 async def get_appointment_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -1,7 +1,9 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from database import SessionLocal
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, File, UploadFile, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 from schemas import UserCreate, User as UserSchema
 from user_service import UserService
 from auth_utils import verify_password, create_access_token, blacklist_token, get_current_user_from_token
@@ -9,6 +11,7 @@ from pydantic import BaseModel
 from typing import Optional
 import base64
 from models import UserType
+from rate_limit import check_rate_limit, client_ip
 
 class LoginRequest(BaseModel):
     email: str
@@ -63,6 +66,8 @@ async def get_current_user(
 
     except HTTPException:
         raise
+    except PoolTimeoutError:
+        raise
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -71,11 +76,12 @@ async def get_current_user(
         )
 
 @router.post("/login", response_model=LoginResponse)
-async def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_user(login_data: LoginRequest, request: Request, db: Session = Depends(get_db)):
     """User login endpoint"""
+    await run_in_threadpool(check_rate_limit, "login", ip=client_ip(request), email=login_data.email)
     try:
         # Get user by email
-        user = UserService.get_user_by_email(db, login_data.email)
+        user = UserService.get_user_by_email(db, login_data.email, load_relationships=True)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -101,6 +107,8 @@ async def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
 
     except HTTPException:
         raise
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -139,6 +147,8 @@ async def logout_user(
 
     except HTTPException:
         raise
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -152,15 +162,19 @@ async def refresh_token():
     pass
 
 @router.post("/signup", response_model=UserSchema)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, request: Request, db: Session = Depends(get_db)):
+    await run_in_threadpool(check_rate_limit, "signup", ip=client_ip(request))
     try:
-        user = UserService.create_user(db, user_data)
+        # Image processing waits on the process pool, so keep it off the event loop
+        user = await run_in_threadpool(UserService.create_user, db, user_data)
         return user
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -169,6 +183,7 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
 
 @router.post("/signup-with-file", response_model=UserSchema)
 async def register_user_with_file(
+    request: Request,
     full_name: str = Form(...),
     email: str = Form(...),
     mobile_number: str = Form(...),
@@ -184,6 +199,7 @@ async def register_user_with_file(
     consultation_fee: Optional[str] = Form(None),  # Accept as string, convert later
     db: Session = Depends(get_db)
 ):
+    await run_in_threadpool(check_rate_limit, "signup", ip=client_ip(request))
     try:
         # Convert string values to appropriate types
         try:
@@ -254,13 +270,15 @@ async def register_user_with_file(
             doctor_profile=doctor_profile
         )
 
-        user = UserService.create_user(db, user_data)
+        user = await run_in_threadpool(UserService.create_user, db, user_data)
         return user
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -285,6 +303,8 @@ async def get_dashboard_data(
 
     except HTTPException:
         raise
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -328,6 +348,8 @@ async def get_dashboard_with_notifications(
 
     except HTTPException:
         raise
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
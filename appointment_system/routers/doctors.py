@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
+from typing import Optional
 from database import SessionLocal
-from schemas import User as UserSchema
+from db_routing import get_read_db
+from schemas import User as UserSchema, DoctorCard
 from user_service import UserService
+from doctor_search_service import DoctorSearchService
+from serialization import orm_list_response
+from pydantic import TypeAdapter
+
+doctor_list_adapter = TypeAdapter(list[UserSchema])
+doctor_card_adapter = TypeAdapter(list[DoctorCard])
 
 router = APIRouter(
     prefix="/doctors",
@@ -17,7 +25,49 @@ def get_db():
         db.close()
 
 @router.get("/", response_model=list[UserSchema])
-async def get_doctors(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_doctors(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     """Get all doctors"""
     doctors = UserService.get_doctors(db, skip=skip, limit=limit)
-    return doctors
+    return orm_list_response(doctor_list_adapter, doctors)
+
+@router.get("/cards", response_model=list[DoctorCard])
+async def get_doctor_cards(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    """Get a lean listing of doctors (one flat record each)"""
+    cards = UserService.get_doctor_cards(db, skip=skip, limit=limit)
+    return orm_list_response(doctor_card_adapter, cards)
+
+@router.get("/search", response_model=list[DoctorCard])
+async def search_doctors(
+    division_id: Optional[int] = None,
+    district_id: Optional[int] = None,
+    thana_id: Optional[int] = None,
+    min_fee: Optional[float] = Query(None, ge=0),
+    max_fee: Optional[float] = Query(None, ge=0),
+    min_experience: Optional[int] = Query(None, ge=0),
+    name: Optional[str] = Query(None, max_length=100, description="Name prefix"),
+    sort: str = Query("name", description="name, fee, experience or earliest_slot"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """Search doctors by location, fee, experience and name"""
+    try:
+        results = DoctorSearchService.search(
+            db,
+            division_id=division_id,
+            district_id=district_id,
+            thana_id=thana_id,
+            min_fee=min_fee,
+            max_fee=max_fee,
+            min_experience=min_experience,
+            name=name,
+            sort=sort,
+            skip=skip,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return orm_list_response(doctor_card_adapter, results)
@@ -1,35 +1,33 @@
 from fastapi import APIRouter, Request
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
+from templating import page_response
 
 router = APIRouter(
     tags=["general"]
 )
 
-templates = Jinja2Templates(directory="templates")
-
 @router.get("/", response_class=HTMLResponse)
 async def home_page(request: Request):
     """Serve the home page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return page_response(request, "index.html")
 
 @router.get("/signup", response_class=HTMLResponse)
 async def signup_page(request: Request):
     """Serve the signup page"""
-    return templates.TemplateResponse("signup.html", {"request": request})
+    return page_response(request, "signup.html")
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Serve the login page"""
-    return templates.TemplateResponse("login.html", {"request": request})
+    return page_response(request, "login.html")
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard_page(request: Request):
     """Serve the dashboard page"""
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return page_response(request, "dashboard.html")
 
 @router.get("/appointments", response_class=HTMLResponse)
 async def appointments_page(request: Request):
     """Serve the appointments page"""
-    return templates.TemplateResponse("appointments.html", {"request": request})
+    return page_response(request, "appointments.html")
 
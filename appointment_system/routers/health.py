@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from startup import check_database, state
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"]
+)
+
+@router.get("/live", include_in_schema=False)
+async def liveness():
+    """The process is up and serving (no dependencies checked)"""
+    return {"status": "ok"}
+
+@router.get("/ready", include_in_schema=False)
+async def readiness():
+    """Startup finished and the database answers; 503 otherwise"""
+    if not state.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+
+    if not await run_in_threadpool(check_database):
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+
+    return {
+        "status": "ready",
+        "startup_seconds": round(state.startup_seconds, 3),
+        "steps_ms": state.steps
+    }
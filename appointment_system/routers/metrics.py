@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from metrics import CONTENT_TYPE, render_metrics
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (metrics of this worker process)"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from database import get_db
 from notification_service import NotificationService
 from schemas import NotificationResponse, User
 from auth_utils import get_current_user
 from typing import List
+from serialization import FastJSONResponse
 
 router = APIRouter(
     prefix="/notifications",
@@ -21,14 +23,16 @@ async def get_user_notifications(
 ):
     """Get notifications for the current user"""
     try:
-        notifications = NotificationService.get_user_notifications(
+        notifications = NotificationService.get_user_notification_rows(
             db=db,
             user_id=current_user.id,
             skip=skip,
             limit=limit,
             read_only=read_only
         )
-        return notifications
+        return FastJSONResponse(notifications)
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -44,6 +48,8 @@ async def get_unread_count(
     try:
         count = NotificationService.get_unread_count(db=db, user_id=current_user.id)
         return {"unread_count": count}
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -64,6 +70,8 @@ async def mark_notification_as_read(
             user_id=current_user.id
         )
         return {"message": "Notification marked as read", "notification": notification}
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -82,6 +90,8 @@ async def mark_all_notifications_as_read(
             user_id=current_user.id
         )
         return {"message": f"Marked {updated_count} notifications as read"}
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -108,6 +118,8 @@ async def delete_notification(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Notification not found"
             )
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
+from typing import Optional
 from database import SessionLocal
 from schemas import User as UserSchema
 from user_service import UserService
-from pathlib import Path
+from cache_utils import LRUCache
+from cache_bus import track
+import image_utils
 
 router = APIRouter(
     prefix="/users",
     tags=["users"]
 )
 
+# user_id -> profile_image_filename, so image requests skip the user lookup; deleting a user publishes it
+profile_image_cache = track(LRUCache("profile_image_filenames", maxsize=10000, ttl=300))
+
 def get_db():
     db = SessionLocal()
     try:
@@ -18,6 +23,24 @@ def get_db():
     finally:
         db.close()
 
+@router.get("/profile-images/{filename}")
+async def get_profile_image_file(filename: str, request: Request):
+    """Serve a profile image variant (content-addressed ones are cacheable forever)"""
+    immutable = image_utils.is_content_addressed(filename)
+    if not immutable and not image_utils.is_legacy(filename):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile image not found"
+        )
+
+    try:
+        return await image_utils.image_response(request, filename, immutable=immutable)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile image file not found"
+        )
+
 @router.get("/{user_id}", response_model=UserSchema)
 async def get_user(user_id: int, db: Session = Depends(get_db)):
     """Get user by ID"""
@@ -30,33 +53,46 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
     return user
 
 @router.get("/{user_id}/profile-image")
-async def get_user_profile_image(user_id: int, db: Session = Depends(get_db)):
-    """Get user profile image"""
-    user = UserService.get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+async def get_user_profile_image(
+    user_id: int,
+    request: Request,
+    size: int = image_utils.DEFAULT_VARIANT_SIZE,
+    format: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get user profile image (optionally a smaller or WebP variant)"""
+    filename = profile_image_cache.get(user_id)
+    if filename is None:
+        generation = profile_image_cache.generation
+        row = UserService.get_profile_image_filename(db, user_id)
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+
+        filename = row.profile_image_filename
+        if not filename:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Profile image not found"
+            )
+
+        profile_image_cache.set(user_id, filename, generation)
 
-    if not user.profile_image_filename:
+    try:
+        variant = image_utils.profile_image_variant_filename(filename, size, webp=(format == "webp"))
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Profile image not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
 
-    # Construct path to profile image
-    current_dir = Path(__file__).parent.parent
-    image_path = current_dir / "static" / "profiles" / user.profile_image_filename
-
-    if not image_path.exists():
+    # The user -> image mapping can change, so clients revalidate against the ETag
+    try:
+        return await image_utils.image_response(request, variant, immutable=False)
+    except FileNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Profile image file not found"
         )
-
-    return FileResponse(
-        path=str(image_path),
-        media_type=user.profile_image_content_type,
-        filename=user.profile_image_filename
-    )
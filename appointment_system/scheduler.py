@@ -0,0 +1,266 @@
+"""
+Leader-elected scheduler for periodic maintenance tasks
+Every app and worker process runs a scheduler thread, but only the one holding
+the PostgreSQL advisory lock SCHEDULER_LOCK_KEY (the leader) runs tasks; when
+its process or connection dies the lock is released and another process takes
+over within SCHEDULER_TICK seconds. Tasks are registered with @periodic and get
+a session that is committed when they return.
+
+When each task is next due is kept in the scheduled_tasks table, so a restart or
+a new leader does not run anything early or twice: a run only starts once its
+process has moved next_run_at on from the value it found due. A task runs once in
+every interval (counted from the epoch), at a random offset of up to `jitter` of
+the interval into it so tasks with the same interval do not all start together. On PostgreSQL the session's
+transaction gets statement_timeout = timeout, which cancels any single statement
+running longer (tasks must run on that session or db.connection() for it to
+apply); a run as a whole is not cancelled, but one still going after its timeout
+is reported as timed out and the task is not started again until it finishes.
+Without PostgreSQL every process is its own leader.
+"""
+
+import logging
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from metrics import Counter, Gauge, observe_job
+
+_logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'True').lower() == 'true'
+
+# How often the scheduler tries to become leader and looks for due tasks
+SCHEDULER_TICK = float(os.getenv('SCHEDULER_TICK', '5'))
+
+SCHEDULER_LOCK_KEY = os.getenv('SCHEDULER_LOCK_KEY', 'appointment_system_scheduler')
+
+scheduler_leader = Gauge("scheduler_leader", "1 while this process holds the scheduler leader lock")
+scheduler_task_runs_total = Counter(
+    "scheduler_task_runs_total", "Scheduled task runs by task and outcome (succeeded/failed/timeout)",
+    ("task", "outcome")
+)
+
+class PeriodicTask:
+    """A registered task: fn(db) run once every `interval` seconds, up to `jitter` of the interval into it"""
+
+    def __init__(self, name: str, func: Callable[[Session], None], interval: float, jitter: float, timeout: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def next_run(self, after: float) -> float:
+        """
+        Start of the next interval after `after` (intervals are counted from the
+        epoch, so daily tasks start at midnight UTC) plus a fresh jitter: late or
+        jittered runs do not push later ones back, and no interval is skipped
+        """
+        return (math.floor(after / self.interval) + 1 + random.uniform(0, self.jitter)) * self.interval
+
+_tasks: Dict[str, PeriodicTask] = {}
+
+def periodic(name: str, interval: float, jitter: float = 0.1, timeout: float = 300):
+    """Decorator registering fn(db) to run cluster-wide every `interval` seconds"""
+    def register(func: Callable[[Session], None]):
+        _tasks[name] = PeriodicTask(name, func, interval, jitter, timeout)
+        return func
+    return register
+
+def get_tasks() -> Dict[str, PeriodicTask]:
+    return dict(_tasks)
+
+class LeaderLock:
+    """Session-level advisory lock on a connection of its own; held until released or disconnected"""
+
+    def __init__(self, engine, key: str = SCHEDULER_LOCK_KEY):
+        self.engine = engine
+        self.key = key
+        self._conn = None
+        self._held = False
+
+    def _query(self, sql: str):
+        with self._conn.cursor() as cursor:
+            cursor.execute(sql, (self.key,))
+            return cursor.fetchone()[0]
+
+    def acquire(self) -> bool:
+        """True while this process is the leader; tries to become it otherwise"""
+        if self.engine.dialect.name != "postgresql":
+            return True
+        try:
+            if self._conn is None:
+                dialect = self.engine.dialect
+                cargs, cparams = dialect.create_connect_args(self.engine.url)
+                self._conn = dialect.connect(*cargs, **cparams)
+                self._conn.autocommit = True
+            if self._held:
+                # The lock lives as long as the connection; make sure it still does
+                self._query("SELECT %s IS NOT NULL")
+            else:
+                self._held = bool(self._query("SELECT pg_try_advisory_lock(hashtext(%s))"))
+            return self._held
+        except Exception as e:
+            _logger.warning(f"Scheduler leader lock check failed: {e}")
+            self.release()
+            return False
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                # Closing the connection releases the lock too
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+            self._held = False
+
+class Scheduler:
+    """Thread that runs due tasks while this process is the leader"""
+
+    def __init__(self, engine, session_factory, tick: float = SCHEDULER_TICK):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.tick = tick
+        self.lock = LeaderLock(engine)
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="scheduled-task")
+        # name -> (future, deadline) of runs still going; a task is never started twice
+        self._running: Dict[str, tuple] = {}
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _states(self) -> Dict[str, float]:
+        """next_run_at by task, creating rows for new tasks"""
+        from models import ScheduledTaskState
+
+        table = ScheduledTaskState.__table__
+        with self.engine.begin() as conn:
+            states = dict(conn.execute(select(table.c.name, table.c.next_run_at)).all())
+        now = time.time()
+        for task in _tasks.values():
+            if task.name not in states:
+                # Spread first runs over the jitter window instead of running everything at once
+                states[task.name] = now + task.interval * random.uniform(0, task.jitter)
+                try:
+                    with self.engine.begin() as conn:
+                        conn.execute(table.insert().values(name=task.name, next_run_at=states[task.name]))
+                except IntegrityError:
+                    pass
+        return states
+
+    def _claim(self, task: PeriodicTask, now: float, due: float) -> bool:
+        """
+        Move the task's next run forward before starting it, unless another
+        process (e.g. a stale leader) already did; True when this one may run it
+        """
+        from models import ScheduledTaskState
+
+        table = ScheduledTaskState.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(update(table).where(
+                table.c.name == task.name, table.c.next_run_at == due
+            ).values(next_run_at=task.next_run(now), last_started_at=now)).rowcount == 1
+
+    def _record(self, task: PeriodicTask, started_at: float, duration: float, error: Optional[str]):
+        from models import ScheduledTaskState
+
+        table = ScheduledTaskState.__table__
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(update(table).where(table.c.name == task.name).values(
+                    last_finished_at=started_at + duration, last_duration=duration,
+                    last_status="failed" if error else "succeeded", last_error=error
+                ))
+        except SQLAlchemyError as e:
+            _logger.warning(f"Could not record the run of {task.name}: {e}")
+
+    def execute(self, task: PeriodicTask, due: float):
+        """Run a task once in a session of its own and record the outcome"""
+        started_at, started = time.time(), time.perf_counter()
+        error = None
+        db = self.session_factory()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(text(f"SET LOCAL statement_timeout = {int(task.timeout * 1000)}"))
+            task.func(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            error = f"{type(e).__name__}: {e}"[:4000]
+            _logger.error(f"Scheduled task {task.name} failed: {e}")
+        finally:
+            db.close()
+        duration = time.perf_counter() - started
+        self._record(task, started_at, duration, error)
+        scheduler_task_runs_total.inc(task=task.name, outcome="failed" if error else "succeeded")
+        observe_job(task.name, max(0.0, started_at - due), duration)
+
+    def _reap(self, now: float):
+        for name, (future, deadline) in list(self._running.items()):
+            if future.done():
+                del self._running[name]
+            elif deadline is not None and now > deadline:
+                _logger.warning(f"Scheduled task {name} is still running after its timeout")
+                scheduler_task_runs_total.inc(task=name, outcome="timeout")
+                # Reported once; it keeps its slot until it finishes
+                self._running[name] = (future, None)
+
+    def run_due(self):
+        """Start every task whose time has come and that is not still running"""
+        now = time.time()
+        self._reap(now)
+        for name, due in self._states().items():
+            task = _tasks.get(name)
+            if task is None or due > now or name in self._running:
+                continue
+            if not self._claim(task, now, due):
+                continue
+            future: Future = self._pool.submit(self.execute, task, due)
+            self._running[name] = (future, now + task.timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            leader = self.lock.acquire()
+            scheduler_leader.set(1 if leader else 0)
+            if leader:
+                try:
+                    self.run_due()
+                except SQLAlchemyError as e:
+                    _logger.warning(f"Scheduler tick failed: {e}")
+            self._stopping.wait(self.tick)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop scheduling, wait for running tasks and give up leadership"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._pool.shutdown(wait=True)
+        self.lock.release()
+        scheduler_leader.set(0)
+
+_scheduler: Optional[Scheduler] = None
+
+def start_scheduler():
+    """Compete for scheduler leadership from this process when SCHEDULER_ENABLED is set"""
+    global _scheduler
+    if SCHEDULER_ENABLED and _scheduler is None:
+        from database import SessionLocal, engine
+        _scheduler = Scheduler(engine, SessionLocal)
+        _scheduler.start()
+
+def stop_scheduler(timeout: float = 30):
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop(timeout)
+        _scheduler = None
@@ -1,8 +1,9 @@
-from pydantic import BaseModel, EmailStr, field_validator, Field
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, field_validator, Field, computed_field
+from typing import Optional, List, Dict
 from datetime import datetime, date, time
 import re
 from models import UserType, AppointmentStatus
+import image_utils
 
 class DivisionBase(BaseModel):
     name: str
@@ -154,16 +155,43 @@ class User(UserBase):
     profile_image_filename: Optional[str] = None
     profile_image_content_type: Optional[str] = None
 
+    @computed_field
     @property
     def profile_image_url(self) -> Optional[str]:
         """Get the URL for the profile image"""
         if self.profile_image_filename:
-            return f"/static/profiles/{self.profile_image_filename}"
+            return f"{image_utils.PROFILES_URL}/{self.profile_image_filename}"
         return None
 
+    @computed_field
+    @property
+    def profile_image_urls(self) -> Dict[str, str]:
+        """Get URLs for every stored size variant (e.g. 200 and 200_webp)"""
+        return image_utils.profile_image_urls(self.profile_image_filename)
+
     class Config:
         from_attributes = True
 
+class DoctorCard(BaseModel):
+    """Flat doctor listing entry (see UserService.get_doctor_cards)"""
+    id: int
+    doctor_id: int
+    full_name: str
+    license_number: str
+    experience_years: int
+    consultation_fee: float
+    division_name: Optional[str] = None
+    district_name: Optional[str] = None
+    thana_name: Optional[str] = None
+    profile_image_filename: Optional[str] = None
+    earliest_slot_start: Optional[str] = None
+
+    @computed_field
+    @property
+    def profile_image_urls(self) -> Dict[str, str]:
+        """Get URLs for every stored size variant (e.g. 200 and 200_webp)"""
+        return image_utils.profile_image_urls(self.profile_image_filename)
+
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     email: Optional[EmailStr] = None
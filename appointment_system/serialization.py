@@ -0,0 +1,38 @@
+"""
+Fast JSON responses for list endpoints
+Trusted DB rows are rendered straight to bytes instead of going through
+response_model validation and the stdlib JSON encoder
+"""
+
+from typing import Any, Iterable
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson (dates, times, enums natively)
+    Falls back to the standard encoder when orjson is not installed
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return super().render(jsonable_encoder(content))
+
+def rows_to_dicts(rows: Iterable) -> list:
+    """Convert SQLAlchemy result rows (column selects) to plain dicts"""
+    return [dict(row._mapping) for row in rows]
+
+def orm_list_response(adapter: TypeAdapter, items: Iterable, status_code: int = 200) -> Response:
+    """
+    Validate ORM objects against a schema and dump them to JSON inside pydantic-core
+    Use for nested schemas that can't be built from flat rows
+    """
+    validated = adapter.validate_python(list(items), from_attributes=True)
+    return Response(content=adapter.dump_json(validated), media_type="application/json", status_code=status_code)
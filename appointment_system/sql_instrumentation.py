@@ -0,0 +1,218 @@
+"""
+Per-request SQL instrumentation
+Counts and times every statement issued while serving a request, reports
+them in response headers and the log, logs slow queries with their plan,
+and (optionally) fails requests that repeat a statement N+1 style
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter as CountMap
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from metrics import Histogram
+
+_logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with their EXPLAIN plan
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+EXPLAIN_SLOW_QUERIES = os.getenv('EXPLAIN_SLOW_QUERIES', 'True').lower() == 'true'
+
+# Development aid: raise when one request runs the same statement more than N times (0 = off)
+SQL_REPEAT_LIMIT = int(os.getenv('SQL_REPEAT_LIMIT', '0'))
+
+# Statements repeated at least this often are reported as possible N+1 queries
+REPEAT_REPORT_THRESHOLD = int(os.getenv('SQL_REPEAT_REPORT_THRESHOLD', '3'))
+
+db_queries_per_request = Histogram(
+    "db_queries_per_request", "SQL statements issued per HTTP request",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "SQL statement latency",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+class RepeatedQueryError(RuntimeError):
+    """Raised in development when a request repeats a statement more than SQL_REPEAT_LIMIT times"""
+
+class RequestQueryStats:
+    """SQL statements seen while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints: CountMap = CountMap()
+        self.statements: Dict[str, str] = {}
+
+    def record(self, fingerprint: str, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        self.fingerprints[fingerprint] += 1
+        self.statements.setdefault(fingerprint, statement)
+
+    def repeated(self, threshold: int = REPEAT_REPORT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Fingerprints executed at least threshold times, most repeated first"""
+        return [(fingerprint, count) for fingerprint, count in self.fingerprints.most_common() if count >= threshold]
+
+_current_stats: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar("sql_request_stats", default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETERS = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+_VALUE_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> Tuple[str, str]:
+    """
+    Normalize a statement so executions that differ only in values match
+    Returns (short id, normalized statement)
+    """
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _LITERALS.sub("?", normalized)
+    normalized = _PARAMETERS.sub("?", normalized)
+    normalized = _VALUE_LISTS.sub("(...)", normalized)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:10], normalized
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """EXPLAIN a statement on the same connection, inside a savepoint so a failure can't abort the transaction"""
+    if conn.dialect.name != "postgresql":
+        return None
+
+    dbapi_connection = conn.connection.dbapi_connection
+    # Savepoints only exist inside a transaction block; without one, skip rather than risk the caller's query
+    if not conn.in_transaction() or getattr(dbapi_connection, "autocommit", False):
+        return None
+
+    cursor = dbapi_connection.cursor()
+    savepoint = False
+    try:
+        cursor.execute("SAVEPOINT sql_explain")
+        savepoint = True
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        cursor.execute("RELEASE SAVEPOINT sql_explain")
+        return plan
+    except Exception as e:
+        if savepoint:
+            try:
+                cursor.execute("ROLLBACK TO SAVEPOINT sql_explain")
+            except Exception:
+                pass
+        return f"(EXPLAIN failed: {e})"
+    finally:
+        cursor.close()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_query_started", []).append(time.perf_counter())
+    stats = _current_stats.get()
+    if stats is not None and SQL_REPEAT_LIMIT:
+        fingerprint_id, normalized = fingerprint(statement)
+        if stats.fingerprints[fingerprint_id] >= SQL_REPEAT_LIMIT:
+            raise RepeatedQueryError(
+                f"Statement repeated more than {SQL_REPEAT_LIMIT} times in one request "
+                f"(likely N+1, eager-load it): {normalized}"
+            )
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["sql_query_started"].pop()
+    db_query_duration_seconds.observe(elapsed)
+
+    stats = _current_stats.get()
+    if stats is not None:
+        fingerprint_id, _ = fingerprint(statement)
+        stats.record(fingerprint_id, statement, elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan = _explain(conn, statement, parameters) if EXPLAIN_SLOW_QUERIES and not executemany else None
+        _logger.warning(
+            "Slow query (%.1f ms): %s%s",
+            elapsed * 1000, _WHITESPACE.sub(" ", statement).strip(),
+            f"\n{plan}" if plan else ""
+        )
+
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("sql_query_started"):
+        connection.info["sql_query_started"].pop()
+
+def instrument_engine(engine: Engine):
+    """Attach the instrumentation hooks to an engine"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+def current_stats() -> Optional[RequestQueryStats]:
+    """Stats of the request being served, if any"""
+    return _current_stats.get()
+
+class SQLStatsMiddleware:
+    """
+    Report per-request SQL counts and time:
+      X-DB-Query-Count, X-DB-Time-Ms, Server-Timing: db;dur=...,
+      X-DB-Repeated: <fingerprint>x<count>,... (possible N+1 queries)
+    and log a JSON summary line per request that touched the database
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["X-DB-Time-Ms"] = f"{stats.total_time * 1000:.1f}"
+                headers.append("Server-Timing", f"db;dur={stats.total_time * 1000:.1f}")
+                repeated = stats.repeated()
+                if repeated:
+                    headers["X-DB-Repeated"] = ",".join(f"{fp}x{count}" for fp, count in repeated)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            if stats.count:
+                db_queries_per_request.observe(stats.count)
+                self._log(scope, status_code, stats)
+
+    @staticmethod
+    def _log(scope: Scope, status_code: int, stats: RequestQueryStats):
+        repeated = stats.repeated()
+        summary = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "db_queries": stats.count,
+            "db_time_ms": round(stats.total_time * 1000, 1),
+            "repeated": [
+                {"fingerprint": fp, "count": count, "statement": fingerprint(stats.statements[fp])[1]}
+                for fp, count in repeated
+            ],
+        }
+        if repeated:
+            _logger.warning(json.dumps(summary))
+        else:
+            _logger.info(json.dumps(summary))
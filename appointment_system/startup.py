@@ -0,0 +1,169 @@
+"""
+Application startup: schema check, connection pool and cache warmup, readiness
+In production (APP_ENV=production) create_all only runs when the models no longer
+match the schema fingerprint recorded in the database. The app reports ready once
+the pool is connected and the caches are warm.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex, CreateTable
+import models
+from assets import load_assets
+from database import SessionLocal, engine, read_engine
+from doctor_search_service import DoctorSearchService
+from location_utils import seed_location_data, warm_location_cache
+from partitioning import ensure_partitions
+from metrics import Gauge
+from templating import precompile_templates, prerender_pages
+
+_logger = logging.getLogger(__name__)
+
+_IMPORTED_AT = time.time()
+
+def process_start_time() -> float:
+    """
+    Wall-clock time this process started (Linux), so interpreter and import time count too
+    For a forked worker this is the fork time
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError):
+        return _IMPORTED_AT
+
+APP_ENV = os.getenv('APP_ENV', 'development').lower()
+PRODUCTION = APP_ENV == 'production'
+
+# Connections opened before reporting ready (defaults to the pool size)
+POOL_WARM_CONNECTIONS = int(os.getenv('POOL_WARM_CONNECTIONS', str(getattr(engine.pool, 'size', lambda: 1)())))
+
+app_startup_seconds = Gauge("app_startup_seconds", "Seconds from process start until the app reported ready")
+app_ready = Gauge("app_ready", "1 once startup finished and the app accepts traffic")
+
+class StartupState:
+    """What the health endpoints report"""
+
+    def __init__(self):
+        self.shared_ready = False
+        self.schema_created = False
+        self.ready = False
+        self.startup_seconds = None
+        self.steps = {}
+
+state = StartupState()
+
+def schema_fingerprint() -> str:
+    """Hash of the DDL the models compile to on this engine's dialect"""
+    statements = []
+    for table in models.Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        statements.extend(sorted(str(CreateIndex(index).compile(dialect=engine.dialect)) for index in table.indexes))
+    return hashlib.sha256("\n".join(statements).encode("utf-8")).hexdigest()
+
+def _recorded_fingerprint():
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(models.SchemaVersion.fingerprint).order_by(models.SchemaVersion.id.desc()).limit(1)
+            ).scalar()
+    except SQLAlchemyError:
+        # No schema_version table yet
+        return None
+
+def prepare_schema() -> bool:
+    """
+    Create missing tables; in production skip it when the recorded fingerprint matches
+    Returns True when create_all ran
+    """
+    fingerprint = schema_fingerprint()
+    recorded = _recorded_fingerprint()
+    if PRODUCTION and recorded == fingerprint:
+        return False
+
+    models.Base.metadata.create_all(bind=engine)
+    if recorded != fingerprint:
+        with engine.begin() as conn:
+            conn.execute(models.SchemaVersion.__table__.insert().values(fingerprint=fingerprint))
+    return True
+
+def warm_pool(connections: int = POOL_WARM_CONNECTIONS):
+    """Open connections up front so the first requests don't pay for connect and auth"""
+    opened = []
+    try:
+        for pool_engine in (engine, read_engine):
+            if pool_engine is None:
+                continue
+            for _ in range(connections):
+                conn = pool_engine.connect()
+                opened.append(conn)
+                conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in opened:
+            conn.close()
+
+def _timed(name: str, step):
+    started = time.perf_counter()
+    result = step()
+    state.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def prepare_shared():
+    """
+    Process-independent warmup: templates, schema, location data and caches
+    Under a pre-forking server this runs once in the master and the workers inherit it
+    """
+    if state.shared_ready:
+        return
+
+    _timed("assets", load_assets)
+    _timed("templates", precompile_templates)
+    _timed("pages", prerender_pages)
+    state.schema_created = _timed("schema", prepare_schema)
+    _timed("partitions", lambda: ensure_partitions(engine))
+
+    db = SessionLocal()
+    try:
+        _timed("locations_seed", lambda: seed_location_data(db))
+        _timed("locations_cache", lambda: warm_location_cache(db))
+        _timed("search_index", lambda: DoctorSearchService.ensure_index(db))
+    finally:
+        db.close()
+    state.shared_ready = True
+
+def release_connections():
+    """Drop pooled connections before forking; a socket must never be shared between processes"""
+    engine.dispose()
+    if read_engine is not None:
+        read_engine.dispose()
+
+def run_startup():
+    """Bring this process up and mark it ready"""
+    prepare_shared()
+    _timed("pool", warm_pool)
+
+    state.startup_seconds = time.time() - process_start_time()
+    state.ready = True
+    app_startup_seconds.set(state.startup_seconds)
+    app_ready.set(1)
+    _logger.info(
+        "Ready in %.2fs (%s, create_all %s): %s",
+        state.startup_seconds, APP_ENV, "ran" if state.schema_created else "skipped",
+        ", ".join(f"{name}={ms}ms" for name, ms in state.steps.items())
+    )
+
+def check_database() -> bool:
+    """One round trip on a pooled connection"""
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+        return True
+    except SQLAlchemyError:
+        return False
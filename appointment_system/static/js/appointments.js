@@ -50,7 +50,7 @@ class AppointmentManager {
 
         try {
             console.log('Loading doctors...');
-            const response = await fetch('/api/doctors/', {
+            const response = await fetch('/api/doctors/cards', {
                 headers: {
                     'Authorization': `Bearer ${this.token}`
                 }
@@ -80,12 +80,10 @@ class AppointmentManager {
             select.innerHTML = '<option value="">Choose a doctor...</option>';
 
             doctors.forEach(doctor => {
-                if (doctor.doctor_profile) {
-                    const option = document.createElement('option');
-                    option.value = doctor.doctor_profile.id;
-                    option.textContent = `Dr. ${doctor.full_name} - ${doctor.doctor_profile.license_number} ($${doctor.doctor_profile.consultation_fee})`;
-                    select.appendChild(option);
-                }
+                const option = document.createElement('option');
+                option.value = doctor.doctor_id;
+                option.textContent = `Dr. ${doctor.full_name} - ${doctor.license_number} ($${doctor.consultation_fee})`;
+                select.appendChild(option);
             });
         } catch (error) {
             console.error('Error loading doctors:', error);
@@ -33,7 +33,9 @@ function loadUserInfo() {
         // Create profile image HTML
         let profileImageHtml = '';
         if (userData.profile_image_filename) {
-            const imageUrl = `static/profiles/${userData.profile_image_filename}`;
+            // Prefer the small variant; the avatar is rendered at 80px
+            const imageUrls = userData.profile_image_urls || {};
+            const imageUrl = imageUrls['200'] || userData.profile_image_url;
             console.log('Profile image URL:', imageUrl);
 
             profileImageHtml = `
@@ -200,18 +202,20 @@ function debugUserData() {
 
     if (userData) {
         console.log('Profile image filename:', userData.profile_image_filename);
-        console.log('Profile image URL:', userData.profile_image_filename ? `/static/profiles/${userData.profile_image_filename}` : 'No image');
+        const imageUrls = userData.profile_image_urls || {};
+        const imageUrl = imageUrls['200'] || userData.profile_image_url;
+        console.log('Profile image URL:', imageUrl || 'No image');
 
         // Test if the image file exists
-        if (userData.profile_image_filename) {
+        if (imageUrl) {
             const img = new Image();
             img.onload = function() {
                 console.log('Profile image loaded successfully');
             };
             img.onerror = function() {
-                console.error('Failed to load profile image:', `/static/profiles/${userData.profile_image_filename}`);
+                console.error('Failed to load profile image:', imageUrl);
             };
-            img.src = `/static/profiles/${userData.profile_image_filename}`;
+            img.src = imageUrl;
         }
     }
 
@@ -0,0 +1,92 @@
+"""
+Shared Jinja2 template environment and pre-rendered static pages
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from starlette.requests import Request
+from starlette.responses import Response
+from assets import asset_url, load_assets
+from http_utils import http_date, is_not_modified
+
+BASE_DIR = Path(__file__).parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+
+# Check template files for changes on every render (development only)
+TEMPLATE_AUTO_RELOAD = os.getenv('TEMPLATE_AUTO_RELOAD', os.getenv('DEBUG', 'False')).lower() == 'true'
+
+# Compiled template bytecode survives restarts and is shared by all workers
+TEMPLATE_CACHE_DIR = Path(os.getenv('TEMPLATE_CACHE_DIR', str(Path(tempfile.gettempdir()) / "appointment_system_jinja")))
+
+# Pages that take no per-request data; served from memory
+STATIC_PAGES = ("index.html", "signup.html", "login.html", "dashboard.html", "appointments.html")
+
+def _create_environment() -> Environment:
+    TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        autoescape=True,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        cache_size=-1,  # keep every compiled template, there are only a handful
+        bytecode_cache=FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR))
+    )
+
+template_env = _create_environment()
+template_env.globals["asset_url"] = asset_url
+templates = Jinja2Templates(env=template_env)
+
+class RenderedPage:
+    """A fully rendered page with its cache validators"""
+
+    def __init__(self, body: bytes, rendered_at: float):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.last_modified = rendered_at
+
+_pages: Dict[str, RenderedPage] = {}
+
+def precompile_templates():
+    """Compile every template into the environment cache (and bytecode cache)"""
+    for name in template_env.list_templates(extensions=["html"]):
+        template_env.get_template(name)
+
+def render_page(name: str) -> RenderedPage:
+    """Render a context-free page and keep it in memory"""
+    body = template_env.get_template(name).render().encode("utf-8")
+    page = RenderedPage(body, time.time())
+    _pages[name] = page
+    return page
+
+def prerender_pages():
+    """Render all static pages up front (called on startup)"""
+    for name in STATIC_PAGES:
+        render_page(name)
+
+def page_response(request: Request, name: str) -> Response:
+    """
+    Serve a pre-rendered page with ETag/Last-Modified validation
+    In auto-reload mode the page is re-rendered so template and asset edits show up
+    """
+    page: Optional[RenderedPage] = _pages.get(name)
+    if TEMPLATE_AUTO_RELOAD:
+        load_assets()
+        page = render_page(name)
+    elif page is None:
+        page = render_page(name)
+
+    headers = {
+        "ETag": page.etag,
+        "Last-Modified": http_date(page.last_modified),
+        "Cache-Control": "no-cache",
+    }
+
+    if is_not_modified(request, page.etag, page.last_modified):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=page.body, media_type="text/html", headers=headers)
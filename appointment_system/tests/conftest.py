@@ -0,0 +1,75 @@
+"""
+Shared fixtures: every test runs against a scratch SQLite database
+Run from the repository root or appointment_system/:
+    python -m pytest -q appointment_system/tests
+"""
+
+import os
+import sys
+import tempfile
+
+# Before anything imports database.py, which connects on import
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["EMBEDDED_JOB_WORKERS"] = "0"
+os.environ["EMBEDDED_OUTBOX_RELAY"] = "false"
+os.environ["SCHEDULER_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import models
+from auth_utils import hash_password
+from cache_utils import all_caches
+from database import Base, SessionLocal, engine
+
+Base.metadata.create_all(bind=engine)
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    yield
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    # Row ids are reused once the tables are empty
+    for cache in all_caches().values():
+        cache.clear()
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def _user(db, name: str, user_type: models.UserType) -> models.User:
+    user = models.User(
+        full_name=name,
+        email=f"{name.lower()}@example.com",
+        mobile_number=f"+88017{abs(hash(name)) % 10**8:08d}",
+        hashed_password=hash_password("Test#12345"),
+        user_type=user_type,
+        division_id=1,
+        district_id=1,
+        thana_id=1
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+@pytest.fixture
+def patient(db) -> models.User:
+    user = _user(db, "Patient", models.UserType.PATIENT)
+    db.commit()
+    return user
+
+@pytest.fixture
+def doctor(db) -> models.DoctorProfile:
+    """Doctor profile available 09:00-17:00"""
+    user = _user(db, "Doctor", models.UserType.DOCTOR)
+    profile = models.DoctorProfile(user_id=user.id, license_number="TEST-1", experience_years=5, consultation_fee=500.0)
+    db.add(profile)
+    db.flush()
+    db.add(models.DoctorTimeslot(doctor_id=profile.id, start_time="09:00", end_time="17:00"))
+    db.commit()
+    return profile
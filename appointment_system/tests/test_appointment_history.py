@@ -0,0 +1,54 @@
+from datetime import date, datetime, time, timezone
+
+import models
+from appointment_service import AppointmentService
+
+def _add(db, model, appointment_id: int, day: date, patient, doctor, status=models.AppointmentStatus.COMPLETED):
+    db.add(model(
+        id=appointment_id, patient_id=patient.id, doctor_id=doctor.id, appointment_date=day,
+        appointment_time=time(10, 0), notes=f"#{appointment_id}", status=status,
+        created_at=datetime(2020, 1, 1, tzinfo=timezone.utc)
+    ))
+
+def _seed(db, patient, doctor):
+    _add(db, models.Appointment, 3, date(2030, 1, 7), patient, doctor, models.AppointmentStatus.PENDING)
+    _add(db, models.AppointmentArchive, 1, date(2020, 3, 2), patient, doctor)
+    _add(db, models.AppointmentArchive, 2, date(2021, 6, 1), patient, doctor, models.AppointmentStatus.CANCELLED)
+    db.commit()
+
+def test_live_rows_exclude_archived_appointments(db, patient, doctor):
+    _seed(db, patient, doctor)
+
+    rows = AppointmentService.get_appointment_rows(db, patient_id=patient.id)
+
+    assert [row["id"] for row in rows] == [3]
+
+def test_history_includes_archived_appointments_in_order(db, patient, doctor):
+    _seed(db, patient, doctor)
+
+    rows = AppointmentService.get_appointment_rows(db, patient_id=patient.id, history=True)
+
+    assert [row["id"] for row in rows] == [1, 2, 3]
+    assert rows[0]["patient_name"] == "Patient"
+    assert rows[0]["doctor_license"] == "TEST-1"
+    assert rows[0]["status"] == models.AppointmentStatus.COMPLETED
+
+def test_history_applies_filters_to_archived_rows(db, patient, doctor):
+    _seed(db, patient, doctor)
+
+    rows = AppointmentService.get_appointment_rows(
+        db, doctor_user_id=doctor.user_id, status=models.AppointmentStatus.CANCELLED, history=True
+    )
+    assert [row["id"] for row in rows] == [2]
+
+    rows = AppointmentService.get_appointment_rows(
+        db, date_from=date(2021, 1, 1), date_to=date(2029, 12, 31), history=True
+    )
+    assert [row["id"] for row in rows] == [2]
+
+def test_history_pages_across_both_tables(db, patient, doctor):
+    _seed(db, patient, doctor)
+
+    rows = AppointmentService.get_appointment_rows(db, skip=1, limit=2, history=True)
+
+    assert [row["id"] for row in rows] == [2, 3]
@@ -0,0 +1,29 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from blob_storage import LocalBlobStorage
+
+def test_write_then_stream(tmp_path):
+    storage = LocalBlobStorage(tmp_path)
+    storage.write("profiles/a.jpg", b"x" * 200_000, "image/jpeg")
+
+    assert storage.exists("profiles/a.jpg")
+    assert asyncio.run(storage.read("profiles/a.jpg")) == b"x" * 200_000
+
+def test_concurrent_writes_of_one_key_from_threads(tmp_path):
+    storage = LocalBlobStorage(tmp_path)
+    data = b"same image" * 10_000
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for future in [pool.submit(storage.write, "profiles/a.jpg", data, "image/jpeg") for _ in range(50)]:
+            future.result()
+
+    assert (tmp_path / "profiles" / "a.jpg").read_bytes() == data
+    # No temporary files are left behind
+    assert [path.name for path in (tmp_path / "profiles").iterdir()] == ["a.jpg"]
+
+def test_keys_outside_the_root_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        LocalBlobStorage(tmp_path / "root").write("../escape.jpg", b"", "image/jpeg")
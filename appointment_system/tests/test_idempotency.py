@@ -0,0 +1,91 @@
+import hashlib
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import models
+from auth_utils import create_access_token
+from database import SessionLocal, engine
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+
+ENDPOINT = "POST /api/appointments/"
+
+@pytest.fixture
+def calls():
+    return []
+
+@pytest.fixture
+def client(calls):
+    app = FastAPI()
+
+    @app.post("/api/appointments/")
+    async def create(request: Request):
+        body = await request.json()
+        calls.append(body)
+        if body.get("fail"):
+            return JSONResponse({"detail": "boom"}, status_code=500)
+        return JSONResponse({"call": len(calls)}, status_code=201)
+
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(engine))
+    with TestClient(app) as client:
+        yield client
+
+def _post(client, key: str, body: dict):
+    token = create_access_token({"sub": "patient@example.com", "user_id": 1})
+    return client.post("/api/appointments/", content=json.dumps(body), headers={
+        "Authorization": f"Bearer {token}", "Idempotency-Key": key, "Content-Type": "application/json"
+    })
+
+def _record(key: str):
+    db = SessionLocal()
+    try:
+        return db.get(models.IdempotencyRecord, (1, key))
+    finally:
+        db.close()
+
+def test_retry_replays_the_stored_response(client, calls):
+    first = _post(client, "k1", {"doctor_id": 1})
+    retry = _post(client, "k1", {"doctor_id": 1})
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json() == {"call": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 1
+
+def test_key_reused_for_another_request_is_rejected(client, calls):
+    _post(client, "k1", {"doctor_id": 1})
+    response = _post(client, "k1", {"doctor_id": 2})
+
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+def test_retry_while_first_request_runs_gets_409(client, calls):
+    body = json.dumps({"doctor_id": 1}).encode()
+    assert IdempotencyStore(engine).begin(1, "k1", ENDPOINT, hashlib.sha256(body).hexdigest()) == ("proceed", None)
+
+    response = _post(client, "k1", {"doctor_id": 1})
+
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+    assert calls == []
+
+def test_server_error_releases_the_key(client, calls):
+    failed = _post(client, "k1", {"fail": True})
+    assert failed.status_code == 500
+    assert _record("k1") is None
+
+    retry = _post(client, "k1", {"fail": True})
+    assert retry.status_code == 500
+    assert "idempotent-replayed" not in retry.headers
+    assert len(calls) == 2
+
+def test_requests_without_a_key_are_not_stored(client, calls):
+    token = create_access_token({"sub": "patient@example.com", "user_id": 1})
+    for _ in range(2):
+        client.post("/api/appointments/", json={"doctor_id": 1}, headers={"Authorization": f"Bearer {token}"})
+
+    assert len(calls) == 2
+    assert _record("k1") is None
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+import models
+from database import engine
+from job_queue import JOB_LOCK_TIMEOUT, JobQueue, Worker, enqueue
+
+def _enqueue(db, name: str = "test_job", **kwargs) -> int:
+    job_row = enqueue(db, name, {"n": 1}, **kwargs)
+    db.commit()
+    return job_row.id
+
+def _job(db, job_id: int) -> models.Job:
+    db.expire_all()
+    return db.get(models.Job, job_id)
+
+def test_claim_marks_ready_jobs_running_once(db):
+    job_id = _enqueue(db)
+    queue = JobQueue(engine)
+
+    claimed = queue.claim("worker-1")
+
+    assert [(row.id, row.name, row.payload, row.attempts) for row in claimed] == [(job_id, "test_job", {"n": 1}, 1)]
+    job_row = _job(db, job_id)
+    assert (job_row.status, job_row.locked_by) == ("running", "worker-1")
+    assert queue.claim("worker-2") == []
+
+def test_claim_skips_delayed_and_other_jobs(db):
+    _enqueue(db, delay=3600)
+    other_id = _enqueue(db, "other_job")
+    queue = JobQueue(engine)
+
+    assert queue.claim("worker-1", names=["test_job"]) == []
+    assert [row.id for row in queue.claim("worker-1", limit=5)] == [other_id]
+
+def test_claim_takes_higher_priority_first(db):
+    _enqueue(db, priority=5)
+    urgent_id = _enqueue(db, priority=0)
+
+    assert [row.id for row in JobQueue(engine).claim("worker-1")] == [urgent_id]
+
+def test_fail_schedules_a_retry_with_backoff(db):
+    job_id = _enqueue(db, max_attempts=3)
+    queue = JobQueue(engine)
+    row = queue.claim("worker-1")[0]
+
+    assert queue.fail(row.id, row.attempts, row.max_attempts, "ValueError: bad") == "retried"
+
+    job_row = _job(db, job_id)
+    assert (job_row.status, job_row.locked_by, job_row.last_error) == ("queued", None, "ValueError: bad")
+    assert job_row.run_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+    assert queue.claim("worker-1") == []
+
+def test_fail_on_last_attempt_dead_letters_the_job(db):
+    job_id = _enqueue(db, max_attempts=1)
+    queue = JobQueue(engine)
+    row = queue.claim("worker-1")[0]
+
+    assert queue.fail(row.id, row.attempts, row.max_attempts, "ValueError: bad") == "dead"
+    assert _job(db, job_id).status == "dead"
+
+def test_requeue_stale_releases_jobs_of_dead_workers(db):
+    retry_id = _enqueue(db, max_attempts=3)
+    dead_id = _enqueue(db, max_attempts=1)
+    fresh_id = _enqueue(db, max_attempts=3)
+    queue = JobQueue(engine)
+    queue.claim("worker-1", limit=3)
+
+    stale = datetime.now(timezone.utc) - timedelta(seconds=JOB_LOCK_TIMEOUT + 60)
+    db.execute(update(models.Job).where(models.Job.id.in_([retry_id, dead_id])).values(locked_at=stale))
+    db.commit()
+
+    assert queue.requeue_stale() == 2
+    assert [_job(db, job_id).status for job_id in (retry_id, dead_id, fresh_id)] == ["queued", "dead", "running"]
+    assert _job(db, retry_id).last_error == "worker lock timed out"
+
+def test_worker_thread_survives_a_failing_execute(db, monkeypatch):
+    first_id = _enqueue(db)
+    second_id = _enqueue(db)
+    executed = []
+
+    def execute(self, job_row):
+        executed.append(job_row.id)
+        if len(executed) == 1:
+            raise RuntimeError("database went away")
+        self.queue.succeed(job_row.id)
+
+    monkeypatch.setattr(Worker, "execute", execute)
+    worker = Worker(engine, poll_interval=0.01)
+    worker.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(executed) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop(5)
+
+    assert executed == [first_id, second_id]
+    # The first job stays claimed until the reaper requeues it
+    assert _job(db, first_id).status == "running"
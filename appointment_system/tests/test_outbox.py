@@ -0,0 +1,90 @@
+from collections import defaultdict
+from datetime import date, time
+
+import pytest
+
+import models
+import outbox
+from database import SessionLocal
+from outbox import OutboxRelay, record_event
+
+@pytest.fixture
+def subscribers(monkeypatch):
+    """Replace the registered subscribers with the test's own"""
+    registered = defaultdict(list)
+    monkeypatch.setattr(outbox, "_subscribers", registered)
+    return registered
+
+def _record(db, patient, doctor, event_type: str = "created") -> int:
+    appointment = models.Appointment(
+        patient_id=patient.id, doctor_id=doctor.id, appointment_date=date(2030, 1, 7),
+        appointment_time=time(10, 0), status=models.AppointmentStatus.PENDING
+    )
+    db.add(appointment)
+    db.flush()
+    record_event(db, appointment, event_type)
+    db.commit()
+    return appointment.id
+
+def _events(db) -> list:
+    db.expire_all()
+    return db.query(models.AppointmentEvent).order_by(models.AppointmentEvent.id).all()
+
+def test_relay_publishes_and_deletes_events(db, patient, doctor, subscribers):
+    seen = []
+    subscribers["created"].append(lambda session, event: seen.append(event.payload["appointment_id"]))
+    appointment_id = _record(db, patient, doctor)
+
+    assert OutboxRelay(SessionLocal).relay_batch() == 1
+
+    assert seen == [appointment_id]
+    assert _events(db) == []
+    assert OutboxRelay(SessionLocal).relay_batch() == 0
+
+def test_subscriber_writes_commit_with_the_event(db, patient, doctor, subscribers):
+    subscribers["created"].append(
+        lambda session, event: session.add(models.Notification(user_id=event.payload["patient_id"]))
+    )
+    _record(db, patient, doctor)
+
+    OutboxRelay(SessionLocal).relay_batch()
+
+    assert db.query(models.Notification).filter(models.Notification.user_id == patient.id).count() == 1
+
+def test_failed_event_is_kept_without_blocking_the_batch(db, patient, doctor, subscribers):
+    def fail_on_cancel(session, event):
+        session.add(models.Notification(user_id=event.payload["patient_id"]))
+        raise RuntimeError("subscriber down")
+
+    subscribers["cancelled"].append(fail_on_cancel)
+    _record(db, patient, doctor, "cancelled")
+    _record(db, patient, doctor, "created")
+
+    assert OutboxRelay(SessionLocal).relay_batch() == 2
+
+    [event] = _events(db)
+    assert (event.event_type, event.attempts, event.dead) == ("cancelled", 1, False)
+    assert event.last_error == "RuntimeError: subscriber down"
+    # The failed subscriber's writes were rolled back with its savepoint
+    assert db.query(models.Notification).count() == 0
+
+def test_event_is_dead_after_max_attempts(db, patient, doctor, subscribers, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    subscribers["created"].append(lambda session, event: 1 / 0)
+    _record(db, patient, doctor)
+    relay = OutboxRelay(SessionLocal)
+
+    relay.relay_batch()
+    relay.relay_batch()
+
+    [event] = _events(db)
+    assert (event.attempts, event.dead) == (2, True)
+    # Dead events are not picked up again
+    assert relay.relay_batch() == 0
+
+def test_relay_batch_size(db, patient, doctor, subscribers):
+    for _ in range(3):
+        _record(db, patient, doctor)
+
+    assert OutboxRelay(SessionLocal, batch_size=2).relay_batch() == 2
+    assert len(_events(db)) == 1
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import SessionLocal
+from profiling import ProfileStore, ProfilingMiddleware
+
+@pytest.fixture
+def store():
+    return ProfileStore(SessionLocal, maxlen=3)
+
+def _finish(store: ProfileStore, path: str):
+    profile = store.new_profile("GET", path, "sample")
+    profile.status_code, profile.duration_ms = 200, 1.0
+    store.add(profile)
+    return profile
+
+def test_sample_rate_is_shared_between_workers(store):
+    assert store.load_sample_rate() == 0
+
+    store.set_sample_rate(0.25)
+
+    # The writer's cache is evicted on commit; another worker reads the table on its next miss
+    assert store.cached_sample_rate() is None
+    assert ProfileStore(SessionLocal).load_sample_rate() == 0.25
+    assert store.cached_sample_rate() == 0.25
+
+def test_profiles_of_all_workers_are_listed_newest_first(store):
+    for path in ("/a", "/b", "/c", "/d"):
+        _finish(store, path)
+
+    # Another worker's view of the same table
+    profiles = ProfileStore(SessionLocal, maxlen=3).list()
+
+    assert [profile.path for profile in profiles] == ["/d", "/c", "/b"]
+    assert store.get(profiles[0].id).status_code == 200
+
+def test_unfinished_profiles_are_not_listed(store):
+    running = store.new_profile("GET", "/slow", "header")
+
+    assert store.list() == []
+    assert store.get(running.id) is None
+
+def test_sampled_request_is_profiled_and_stored(store):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        time.sleep(0.05)
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, store=store)
+    store.set_sample_rate(1.0)
+    with TestClient(app) as client:
+        response = client.get("/work")
+
+    [profile] = store.list()
+    assert response.headers["X-Profile-Id"] == str(profile.id)
+    assert (profile.path, profile.status_code, profile.trigger) == ("/work", 200, "sample")
+    assert profile.samples > 0
+    assert "work (test_profiling.py" in profile.folded
+
+def test_clear(store):
+    _finish(store, "/a")
+    store.clear()
+
+    assert store.list() == []
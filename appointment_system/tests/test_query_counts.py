@@ -0,0 +1,92 @@
+"""
+Every user-returning endpoint runs a constant number of SQL queries
+List endpoints must issue as many statements for a large page as for a single
+row; single-user endpoints must stay within a fixed budget.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+from auth_utils import hash_password
+from database import count_queries
+from location_utils import seed_location_data, warm_location_cache
+from main import app
+from profiling import profile_store
+
+DOCTORS = 25
+
+# Maximum statements for endpoints that return a single user
+SINGLE_USER_BUDGETS = {
+    "GET /api/users/{id}": 1,
+    "GET /api/auth/dashboard": 3,
+    "POST /api/auth/login": 1,
+}
+
+PASSWORD = "Check#12345"
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        # Each worker reads the profiling sample rate once, not per request
+        profile_store.load_sample_rate()
+        yield client
+
+@pytest.fixture
+def doctor_user_ids(client, db) -> list:
+    """Doctors with a profile and two timeslots each"""
+    # Startup seeds locations once per process; earlier tests may have emptied the tables since
+    seed_location_data(db)
+    warm_location_cache(db)
+    thana = db.query(models.Thana).first()
+    district = db.query(models.District).filter(models.District.id == thana.district_id).first()
+    hashed_password = hash_password(PASSWORD)
+    user_ids = []
+    for i in range(DOCTORS):
+        user = models.User(
+            full_name=f"Check Doctor {i}",
+            email=f"check-doctor-{i}@example.com",
+            mobile_number=f"+8801900{i:06d}",
+            hashed_password=hashed_password,
+            user_type=models.UserType.DOCTOR,
+            division_id=district.division_id,
+            district_id=district.id,
+            thana_id=thana.id
+        )
+        db.add(user)
+        db.flush()
+        profile = models.DoctorProfile(user_id=user.id, license_number=f"CHK-{i}", experience_years=i, consultation_fee=500.0)
+        db.add(profile)
+        db.flush()
+        db.add(models.DoctorTimeslot(doctor_id=profile.id, start_time="10:00", end_time="12:00"))
+        db.add(models.DoctorTimeslot(doctor_id=profile.id, start_time="16:00", end_time="18:00"))
+        user_ids.append(user.id)
+    db.commit()
+    return user_ids
+
+def measure(request) -> int:
+    with count_queries() as counter:
+        response = request()
+    assert response.status_code < 400, response.text
+    return counter.count
+
+@pytest.mark.parametrize("path", ["/api/doctors/", "/api/doctors/cards"])
+def test_doctor_lists_run_the_same_queries_for_any_page_size(client, doctor_user_ids, path):
+    small = measure(lambda: client.get(path, params={"limit": 1}))
+    large = measure(lambda: client.get(path, params={"limit": DOCTORS}))
+
+    assert len(client.get(path, params={"limit": DOCTORS}).json()) == DOCTORS
+    assert small == large
+
+def test_single_user_endpoints_stay_within_budget(client, doctor_user_ids):
+    credentials = {"email": "check-doctor-0@example.com", "password": PASSWORD}
+    token = client.post("/api/auth/login", json=credentials).json()["access_token"]
+    requests = {
+        "GET /api/users/{id}": lambda: client.get(f"/api/users/{doctor_user_ids[0]}"),
+        "GET /api/auth/dashboard": lambda: client.get("/api/auth/dashboard", headers={"Authorization": f"Bearer {token}"}),
+        "POST /api/auth/login": lambda: client.post("/api/auth/login", json=credentials),
+    }
+
+    counts = {name: measure(request) for name, request in requests.items()}
+
+    assert counts == {name: min(counts[name], budget) for name, budget in SINGLE_USER_BUDGETS.items()}
@@ -0,0 +1,33 @@
+import pytest
+
+import rate_limit
+from database import engine
+from rate_limit import DatabaseRateLimitBackend, RateLimit, RateLimitExceeded, check_rate_limit, set_backend
+
+@pytest.fixture
+def database_backend():
+    set_backend(DatabaseRateLimitBackend(engine))
+    yield
+    set_backend(None)
+
+def test_database_buckets_are_shared_between_workers():
+    limit = RateLimit(2, 60)
+    # Two processes, one table
+    first, second = DatabaseRateLimitBackend(engine), DatabaseRateLimitBackend(engine)
+
+    assert first.hit("login:email:a", limit, 1000.0)[0]
+    assert second.hit("login:email:a", limit, 1000.0)[0]
+    assert not first.hit("login:email:a", limit, 1000.0)[0]
+    # Refilled after half the period
+    assert second.hit("login:email:a", limit, 1030.0)[0]
+
+def test_check_rate_limit_raises_with_retry_after(database_backend, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    for _ in range(5):
+        check_rate_limit("login", ip="10.0.0.1", email="a@example.com")
+
+    with pytest.raises(RateLimitExceeded) as raised:
+        check_rate_limit("login", ip="10.0.0.1", email="A@example.com")
+
+    assert raised.value.status_code == 429
+    assert int(raised.value.headers["Retry-After"]) >= 1
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import models
+import scheduler
+from database import SessionLocal, engine
+from scheduler import PeriodicTask, Scheduler
+
+@pytest.fixture
+def runs(monkeypatch):
+    """A single registered task, due now, that records its runs"""
+    runs = []
+    task = PeriodicTask("test_task", lambda db: runs.append(time.time()), interval=3600, jitter=0, timeout=60)
+    monkeypatch.setattr(scheduler, "_tasks", {task.name: task})
+    with engine.begin() as conn:
+        conn.execute(models.ScheduledTaskState.__table__.insert().values(name=task.name, next_run_at=0.0))
+    return runs
+
+def _run_due(instance: Scheduler):
+    instance.run_due()
+    for future, _ in list(instance._running.values()):
+        future.result(timeout=10)
+
+def test_due_task_runs_once_across_processes(db, runs):
+    first, second = Scheduler(engine, SessionLocal), Scheduler(engine, SessionLocal)
+    try:
+        _run_due(first)
+        _run_due(second)
+    finally:
+        first.stop()
+        second.stop()
+
+    assert len(runs) == 1
+    state = db.get(models.ScheduledTaskState, "test_task")
+    # Start of the next hour (no jitter)
+    assert state.next_run_at == (time.time() // 3600 + 1) * 3600
+    assert state.last_status == "succeeded"
+
+def test_claim_with_a_stale_due_time_fails(runs):
+    instance = Scheduler(engine, SessionLocal)
+    task = scheduler.get_tasks()["test_task"]
+    try:
+        assert instance._claim(task, time.time(), 0.0) is True
+        # A leader that read next_run_at before the first claim
+        assert instance._claim(task, time.time(), 0.0) is False
+    finally:
+        instance.stop()
+
+def test_next_run_stays_in_the_following_interval():
+    task = PeriodicTask("daily", lambda db: None, interval=86400, jitter=0.1, timeout=60)
+    due = 86400 * 100 + 3600
+
+    for _ in range(200):
+        # However late a run starts within its day, the next one is in the next day
+        due = task.next_run(due + 8640 * 2)
+        day, offset = divmod(due, 86400)
+        assert offset <= 8640
+
+    assert day == 100 + 200
@@ -2,12 +2,15 @@
 User service layer for handling registration and user management
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
 from typing import Optional
 import logging
 from models import User, DoctorProfile, DoctorTimeslot, Division, District, Thana
 from schemas import UserCreate, User as UserSchema, DoctorProfileCreate
+from serialization import rows_to_dicts
+from doctor_search_service import DoctorSearchService
+from cache_bus import publish
 from auth_utils import hash_password, process_profile_image, validate_mobile_number, validate_password_strength
 
 _logger = logging.getLogger(__name__)
@@ -78,12 +81,14 @@ class UserService:
                 doctor_profile = UserService._create_doctor_profile(
                     db, db_user.id, user_data.doctor_profile
                 )
+                db.flush()
+                DoctorSearchService.refresh_doctor(db, doctor_profile.id)
 
             db.commit()
 
-            # Return user with relationships
-            db.refresh(db_user)
-            return UserSchema.from_orm(db_user)
+            # Return user with relationships, loaded in a single query
+            db_user = UserService.get_user_by_id(db, db_user.id)
+            return UserSchema.model_validate(db_user)
 
         except IntegrityError as e:
             db.rollback()
@@ -96,6 +101,8 @@ class UserService:
             else:
                 raise ValueError("Registration failed due to data constraint violation")
 
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             _logger.info(f"Registration failed: {str(e)}")
             db.rollback()
@@ -168,6 +175,7 @@ class UserService:
             )
             db.add(timeslot)
 
+        publish(db, "doctor_timeslots", doctor_profile.id)
         return doctor_profile
 
     @staticmethod
@@ -196,10 +204,39 @@ class UserService:
             raise ValueError("Minimum consultation time is 30 minutes")
 
     @staticmethod
+    def user_detail_options():
+        """
+        Loader options for reading a single user serialized with UserSchema
+        Everything UserSchema nests is joined into the one user query
+        """
+        return (
+            joinedload(User.division),
+            joinedload(User.district),
+            joinedload(User.thana),
+            joinedload(User.doctor_profile).joinedload(DoctorProfile.available_timeslots),
+        )
+
+    @staticmethod
+    def user_list_options():
+        """
+        Loader options for reading many users serialized with UserSchema
+        Locations are joined; doctor profiles and their timeslots take one extra
+        query each, however many users are returned
+        """
+        return (
+            joinedload(User.division),
+            joinedload(User.district),
+            joinedload(User.thana),
+            selectinload(User.doctor_profile).selectinload(DoctorProfile.available_timeslots),
+        )
+
     @staticmethod
-    def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    def get_user_by_email(db: Session, email: str, load_relationships: bool = False) -> Optional[User]:
         """Get user by email"""
-        return db.query(User).filter(User.email == email).first()
+        query = db.query(User)
+        if load_relationships:
+            query = query.options(*UserService.user_detail_options())
+        return query.filter(User.email == email).first()
 
     @staticmethod
     def get_user_by_mobile(db: Session, mobile: str) -> Optional[User]:
@@ -209,12 +246,49 @@ class UserService:
     @staticmethod
     def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
         """Get user by ID with all relationships"""
-        return db.query(User).filter(User.id == user_id).first()
+        return db.query(User).options(
+            *UserService.user_detail_options()
+        ).filter(User.id == user_id).first()
+
+    @staticmethod
+    def get_profile_image_filename(db: Session, user_id: int) -> Optional[tuple]:
+        """Get (profile_image_filename,) for a user, or None if the user doesn't exist"""
+        return db.query(User.profile_image_filename).filter(User.id == user_id).first()
 
     @staticmethod
     def get_doctors(db: Session, skip: int = 0, limit: int = 100):
         """Get all doctors with their profiles"""
-        return db.query(User).filter(User.user_type == "DOCTOR").offset(skip).limit(limit).all()
+        return db.query(User).options(
+            *UserService.user_list_options()
+        ).filter(User.user_type == "DOCTOR").order_by(User.id).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def get_doctor_cards(db: Session, skip: int = 0, limit: int = 100) -> list:
+        """
+        Lean doctor listing: one flat row per doctor, no nested objects
+        """
+        rows = db.query(
+            User.id,
+            DoctorProfile.id.label('doctor_id'),
+            User.full_name,
+            DoctorProfile.license_number,
+            DoctorProfile.experience_years,
+            DoctorProfile.consultation_fee,
+            Division.name.label('division_name'),
+            District.name.label('district_name'),
+            Thana.name.label('thana_name'),
+            User.profile_image_filename
+        ).join(
+            DoctorProfile, DoctorProfile.user_id == User.id
+        ).join(
+            Division, User.division_id == Division.id
+        ).join(
+            District, User.district_id == District.id
+        ).join(
+            Thana, User.thana_id == Thana.id
+        ).order_by(User.id).offset(skip).limit(limit).all()
+
+        return rows_to_dicts(rows)
 
     @staticmethod
     def update_doctor_timeslots(db: Session, doctor_id: int, timeslots: list) -> bool:
@@ -239,9 +313,15 @@ class UserService:
                 )
                 db.add(new_slot)
 
+            db.flush()
+            DoctorSearchService.refresh_doctor(db, doctor_profile.id)
+            publish(db, "doctor_timeslots", doctor_profile.id)
+
             db.commit()
             return True
 
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             db.rollback()
             raise ValueError(f"Failed to update timeslots: {str(e)}")